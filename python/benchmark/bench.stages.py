@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Pipeline stage benchmark.
+
+Generates synthetic corpora of several sizes (see corpusgen.py) and times
+linemapper.read_file, indexer.update_index_from_linemaps, scanner.parse_file,
+and fort2hip.generate_hip_files separately, summed over all files of a corpus.
+Results can be written to a JSON file and compared against a previous result.
+"""
+import os, sys
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import addtoplevelpath
+import corpusgen
+import utils.logging
+import linemapper.linemapper as linemapper
+import indexer.indexer as indexer
+import indexer.scoper as scoper
+import scanner.scanner as scanner
+import fort2hip.fort2hip as fort2hip
+
+PYTHON_DIR  = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+INCLUDE_DIR = os.path.abspath(os.path.join(PYTHON_DIR,"..","include"))
+
+STAGES = ["linemapper.read_file","indexer.update_index_from_linemaps","scanner.parse_file","fort2hip.generate_hip_files"]
+
+def parse_size(size):
+    """:param str size: '<modules>x<kernels per module>', e.g. '8x4'."""
+    num_modules, num_kernels = size.lower().split("x")
+    return int(num_modules), int(num_kernels)
+
+def run_stages(filepaths,options=""):
+    """
+    Run the stages on the files of a corpus, which must be in module dependency order.
+    :return: dict that maps each stage to the time in seconds it took for all files.
+    """
+    timings    = { stage: 0.0 for stage in STAGES }
+    all_linemaps = []
+    for filepath in filepaths:
+        start = time.time()
+        linemaps = linemapper.read_file(filepath,options)
+        timings["linemapper.read_file"] += time.time() - start
+        all_linemaps.append(linemaps)
+        index = []
+        start = time.time()
+        indexer.update_index_from_linemaps(linemaps,index)
+        timings["indexer.update_index_from_linemaps"] += time.time() - start
+        indexer.write_gpufort_module_files(index,os.path.dirname(filepath))
+    for filepath, linemaps in zip(filepaths,all_linemaps):
+        index = []
+        indexer.load_gpufort_module_files([INCLUDE_DIR,os.path.dirname(filepath)],index)
+        scoper.invalidate_scopes()
+        start = time.time()
+        stree = scanner.parse_file(linemaps,index,filepath)
+        timings["scanner.parse_file"] += time.time() - start
+        start = time.time()
+        fort2hip.generate_hip_files(stree,index,["*"],filepath,generate_code=True)
+        timings["fort2hip.generate_hip_files"] += time.time() - start
+    return timings
+
+def run(sizes,dialects,num_repetitions,num_declarations,macro_density,type_depth):
+    """
+    :return: Tuple of a dict that maps each timing label to the median, min, and max over the repetitions,
+             and of a dict with the number of files and lines per corpus.
+    """
+    samples = {}
+    corpora = {}
+    tmp_dir = tempfile.mkdtemp(prefix="gpufort-bench-")
+    try:
+        for dialect in dialects:
+            for size in sizes:
+                num_modules, num_kernels = parse_size(size)
+                corpus    = "{}:{}x{}".format(dialect,num_modules,num_kernels)
+                filepaths = corpusgen.generate_corpus(os.path.join(tmp_dir,dialect+"-"+size),\
+                  num_modules,num_kernels,dialect,num_declarations,macro_density,type_depth)
+                num_lines = 0
+                for filepath in filepaths:
+                    with open(filepath,"r") as infile:
+                        num_lines += len(infile.readlines())
+                corpora[corpus] = { "files": len(filepaths), "lines": num_lines }
+                for i in range(0,num_repetitions):
+                    for stage, elapsed in run_stages(filepaths).items():
+                        samples.setdefault(corpus+":"+stage,[]).append(elapsed)
+    finally:
+        shutil.rmtree(tmp_dir,ignore_errors=True)
+    results = { label: { "median": statistics.median(values), "min": min(values), "max": max(values) }\
+                for label, values in samples.items() }
+    return results, corpora
+
+def git_commit():
+    """:return: The current commit of the repository or None."""
+    try:
+        return subprocess.check_output(["git","rev-parse","--short","HEAD"],cwd=PYTHON_DIR,\
+          stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def print_results(results,baseline=None):
+    for label in sorted(results):
+        line = "{:<55} {:>9.1f} ms".format(label,1000*results[label]["median"])
+        if baseline != None and label in baseline:
+            previous = baseline[label]["median"]
+            if previous > 0:
+                line += "  ({:+.1f}%)".format(100*(results[label]["median"]-previous)/previous)
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the throughput of GPUFORT's pipeline stages on synthetic corpora.")
+    parser.add_argument("-s","--sizes",dest="sizes",type=str,nargs="+",default=["2x2","8x4","16x8"],help="Corpus sizes as '<modules>x<kernels per module>' [default: 2x2 8x4 16x8].")
+    parser.add_argument("-E","--dialects",dest="dialects",type=str,nargs="+",default=corpusgen.DIALECTS,help="Corpus dialects [default: {}].".format(" ".join(corpusgen.DIALECTS)))
+    parser.add_argument("-n","--repetitions",dest="repetitions",type=int,default=3,help="Number of repetitions per corpus [default: 3].")
+    parser.add_argument("--declarations",dest="declarations",type=int,default=4,help="Additional declarations per kernel [default: 4].")
+    parser.add_argument("--macro-density",dest="macro_density",type=float,default=0.25,help="Fraction of the additional declarations wrapped into '#ifdef' blocks [default: 0.25].")
+    parser.add_argument("--type-depth",dest="type_depth",type=int,default=2,help="Nesting depth of the derived types per module [default: 2].")
+    parser.add_argument("-o","--output",dest="output",type=str,default=None,help="Write the results to this JSON file.")
+    parser.add_argument("-b","--baseline",dest="baseline",type=str,default=None,help="Compare against the results in this JSON file.")
+    args = parser.parse_args()
+
+    for dialect in args.dialects:
+        if dialect not in corpusgen.DIALECTS:
+            msg = "unsupported dialect '{}'; must be one of: {}".format(dialect,", ".join(corpusgen.DIALECTS))
+            print("ERROR: "+msg,file=sys.stderr)
+            sys.exit(2)
+    utils.logging.init_logging("log-bench-stages.log",utils.logging.LOG_FORMAT,"error")
+    scanner.DESTINATION_DIALECT = "hip-gpufort-rt"
+
+    baseline = None
+    if args.baseline != None:
+        with open(args.baseline,"r") as infile:
+            baseline = json.load(infile)["results"]
+    results, corpora = run(args.sizes,args.dialects,args.repetitions,\
+                           args.declarations,args.macro_density,args.type_depth)
+    print_results(results,baseline)
+    if args.output != None:
+        with open(args.output,"w") as outfile:
+            json.dump({ "benchmark": "stages", "python": sys.version.split()[0], "commit": git_commit(),\
+                        "repetitions": args.repetitions, "corpora": corpora,\
+                        "parameters": { "declarations": args.declarations, "macro_density": args.macro_density,\
+                                        "type_depth": args.type_depth },\
+                        "results": results },outfile,indent=2)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Cold startup benchmark.
+
+Imports GPUFORT's components in fresh interpreter processes and records
+how long the imports and the grammar variant builds took. Each of the indexer, scanner,
+and translator builds its own grammar variant, see grammar.factory; the imports
+thus include three grammar builds.
+Results can be written to a JSON file and compared against a previous result.
+"""
+import os, sys
+import argparse
+import json
+import statistics
+import subprocess
+
+PYTHON_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+
+# runs in a fresh interpreter; prints the timings as JSON
+PROBE = r"""
+import sys, time, json
+start = time.time()
+sys.path.insert(1,{python_dir!r})
+timings = {{}}
+for component in ["pyparsing","translator.translator","indexer.indexer","scanner.scanner","fort2hip.fort2hip"]:
+    t = time.time()
+    __import__(component)
+    timings["import:"+component] = time.time() - t
+import grammar.factory
+for (consumer,caseless), elapsed in grammar.factory.BUILD_TIMES.items():
+    timings["grammar:{{}}:caseless={{}}".format(consumer,caseless)] = elapsed
+timings["total"] = time.time() - start
+print(json.dumps(timings))
+"""
+
+def run_probe():
+    output = subprocess.check_output([sys.executable,"-W","ignore","-c",PROBE.format(python_dir=PYTHON_DIR)],\
+      cwd=PYTHON_DIR)
+    return json.loads(output.decode("utf-8").splitlines()[-1])
+
+def run(num_repetitions):
+    """:return: dict that maps each timing label to the median, min, and max over the repetitions."""
+    samples = {}
+    for i in range(0,num_repetitions):
+        for label, elapsed in run_probe().items():
+            samples.setdefault(label,[]).append(elapsed)
+    return { label: { "median": statistics.median(values), "min": min(values), "max": max(values) }\
+             for label, values in samples.items() }
+
+def print_results(results,baseline=None):
+    for label in sorted(results):
+        line = "{:<45} {:>8.1f} ms".format(label,1000*results[label]["median"])
+        if baseline != None and label in baseline:
+            previous = baseline[label]["median"]
+            if previous > 0:
+                line += "  ({:+.1f}%)".format(100*(results[label]["median"]-previous)/previous)
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure GPUFORT's cold startup time.")
+    parser.add_argument("-n","--repetitions",dest="repetitions",type=int,default=5,help="Number of fresh interpreter processes [default: 5].")
+    parser.add_argument("-o","--output",dest="output",type=str,default=None,help="Write the results to this JSON file.")
+    parser.add_argument("-b","--baseline",dest="baseline",type=str,default=None,help="Compare against the results in this JSON file.")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline != None:
+        with open(args.baseline,"r") as infile:
+            baseline = json.load(infile)["results"]
+    results = run(args.repetitions)
+    print_results(results,baseline)
+    if args.output != None:
+        with open(args.output,"w") as outfile:
+            json.dump({ "benchmark": "startup", "python": sys.version.split()[0],\
+                        "repetitions": args.repetitions, "results": results },outfile,indent=2)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Synthetic Fortran corpus generator.
+
+Emits a chain of CUDA Fortran or OpenACC modules plus a main program that uses the last module.
+Module i uses module i-1 so that the corpus has a non-trivial module dependency graph.
+Size and shape of the corpus are controlled by:
+
+* the number of modules and the number of kernels per module,
+* the number of additional declarations per kernel (declaration density),
+* the fraction of declarations that are wrapped into '#ifdef' blocks (macro density),
+* the nesting depth of the derived types that each module defines.
+
+The output only depends on the parameters; the same parameters always result in the same files.
+"""
+import os, sys
+import argparse
+import json
+
+DIALECTS = ["cuf","acc"]
+
+def _intrnl_render_types(i,type_depth):
+    """:return: Lines of the derived types of module 'i'; type j has a component of type j-1."""
+    lines = []
+    for j in range(0,type_depth):
+        lines.append("  type t{}_{}".format(i,j))
+        lines.append("    real :: v(8)")
+        lines.append("    integer :: id")
+        if j > 0:
+            lines.append("    type(t{}_{}) :: inner".format(i,j-1))
+        lines.append("  end type t{}_{}".format(i,j))
+    return lines
+
+def _intrnl_render_declarations(i,k,num_declarations,macro_density):
+    """:return: Lines of the additional local declarations of kernel 'k' of module 'i'."""
+    lines  = []
+    macros = 0
+    for d in range(0,num_declarations):
+        declaration = "    real :: tmp{}_{}".format(k,d)
+        # spread the '#ifdef' blocks evenly over the declarations
+        if int((d+1)*macro_density) > macros:
+            macros += 1
+            lines.append("#ifdef BENCH_MACRO_{}".format(d % 4))
+            lines.append(declaration)
+            lines.append("#else")
+            lines.append(declaration)
+            lines.append("#endif")
+        else:
+            lines.append(declaration)
+    return lines
+
+def _intrnl_render_kernel(i,k,dialect,num_declarations,macro_density):
+    """:return: Lines of kernel 'k' of module 'i'."""
+    lines = []
+    declarations = _intrnl_render_declarations(i,k,num_declarations,macro_density)
+    if dialect == "cuf" and k % 2 == 0:
+        lines.append("  attributes(global) subroutine kernel{}_{}(a,x,y,n)".format(i,k))
+        lines.append("    implicit none")
+        lines.append("    integer, value :: n")
+        lines.append("    real, value :: a")
+        lines.append("    real :: x(n), y(n)")
+        lines.append("    integer :: j")
+        lines += declarations
+        lines.append("    j = threadidx%x + (blockidx%x-1)*blockdim%x")
+        lines.append("    if (j <= n) then")
+        lines.append("      y(j) = y(j) + a*x(j)")
+        lines.append("    endif")
+        lines.append("  end subroutine kernel{}_{}".format(i,k))
+    else:
+        lines.append("  subroutine kernel{}_{}(a,x,y,n)".format(i,k))
+        lines.append("    implicit none")
+        lines.append("    integer :: n")
+        lines.append("    real :: a")
+        if dialect == "cuf":
+            lines.append("    real, device :: x(n), y(n)")
+        else:
+            lines.append("    real :: x(n), y(n)")
+        lines.append("    integer :: j")
+        lines += declarations
+        if dialect == "cuf":
+            lines.append("    !$cuf kernel do(1) <<<*,*>>>")
+        else:
+            lines.append("    !$acc parallel loop copyin(x(1:n)) copy(y(1:n))")
+        lines.append("    do j = 1, n")
+        lines.append("      y(j) = y(j) + a*x(j)")
+        lines.append("    end do")
+        lines.append("  end subroutine kernel{}_{}".format(i,k))
+    return lines
+
+def render_module(i,num_kernels,dialect="cuf",num_declarations=4,macro_density=0.25,type_depth=2):
+    """
+    :param int i: Number of the module; module i uses module i-1 if i > 0.
+    :return: Source code of the module as string.
+    """
+    lines = ["module bench_mod{}".format(i)]
+    if dialect == "cuf":
+        lines.append("  use cudafor")
+    if i > 0:
+        lines.append("  use bench_mod{}".format(i-1))
+    lines.append("  implicit none")
+    lines.append("  integer, parameter :: n{} = {}".format(i,1024*(i+1)))
+    lines += _intrnl_render_types(i,type_depth)
+    if type_depth > 0:
+        lines.append("  type(t{}_{}) :: state{}".format(i,type_depth-1,i))
+    lines.append("contains")
+    for k in range(0,num_kernels):
+        lines += _intrnl_render_kernel(i,k,dialect,num_declarations,macro_density)
+    lines.append("end module bench_mod{}".format(i))
+    return "\n".join(lines) + "\n"
+
+def render_main(num_modules,num_kernels,dialect="cuf"):
+    """:return: Source code of a main program that uses the last module and launches its kernels."""
+    last  = num_modules-1
+    lines = ["program main"]
+    if dialect == "cuf":
+        lines.append("  use cudafor")
+    lines.append("  use bench_mod{}".format(last))
+    lines.append("  implicit none")
+    lines.append("  integer, parameter :: n = 1024")
+    if dialect == "cuf":
+        lines.append("  real, device, allocatable :: x_d(:), y_d(:)")
+        lines.append("  allocate(x_d(n),y_d(n))")
+        for k in range(0,num_kernels):
+            if k % 2 == 0:
+                lines.append("  call kernel{}_{}<<<n/256,256>>>(2.0,x_d,y_d,n)".format(last,k))
+            else:
+                lines.append("  call kernel{}_{}(2.0,x_d,y_d,n)".format(last,k))
+        lines.append("  deallocate(x_d,y_d)")
+    else:
+        lines.append("  real :: x(n), y(n)")
+        lines.append("  x = 1.0; y = 2.0")
+        for k in range(0,num_kernels):
+            lines.append("  call kernel{}_{}(2.0,x,y,n)".format(last,k))
+    lines.append("end program main")
+    return "\n".join(lines) + "\n"
+
+def generate_corpus(output_dir,num_modules,num_kernels,dialect="cuf",\
+                    num_declarations=4,macro_density=0.25,type_depth=2):
+    """
+    Write the corpus to the output directory.
+
+    :param str dialect: One of 'cuf' (CUDA Fortran) or 'acc' (OpenACC).
+    :param int num_declarations: Additional local declarations per kernel.
+    :param float macro_density: Fraction of the additional declarations that are wrapped into '#ifdef' blocks (0 to 1).
+    :param int type_depth: Nesting depth of the derived types per module.
+    :return: The paths of the written files in module dependency order, main program last.
+    """
+    if dialect not in DIALECTS:
+        raise ValueError("unsupported dialect '{}'; must be one of: {}".format(dialect,", ".join(DIALECTS)))
+    os.makedirs(output_dir,exist_ok=True)
+    result = []
+    for i in range(0,num_modules):
+        result.append((os.path.join(output_dir,"bench_mod{}.f90".format(i)),\
+          render_module(i,num_kernels,dialect,num_declarations,macro_density,type_depth)))
+    result.append((os.path.join(output_dir,"main.f90"),render_main(num_modules,num_kernels,dialect)))
+    for filepath, content in result:
+        with open(filepath,"w") as outfile:
+            outfile.write(content)
+    return [filepath for filepath, _ in result]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic CUDA Fortran or OpenACC corpus.")
+    parser.add_argument("output_dir",type=str,help="Output directory.")
+    parser.add_argument("-m","--modules",dest="modules",type=int,default=4,help="Number of modules [default: 4].")
+    parser.add_argument("-k","--kernels",dest="kernels",type=int,default=4,help="Number of kernels per module [default: 4].")
+    parser.add_argument("-E","--dialect",dest="dialect",type=str,default="cuf",help="One of: {} [default: cuf].".format(", ".join(DIALECTS)))
+    parser.add_argument("--declarations",dest="declarations",type=int,default=4,help="Additional declarations per kernel [default: 4].")
+    parser.add_argument("--macro-density",dest="macro_density",type=float,default=0.25,help="Fraction of the additional declarations wrapped into '#ifdef' blocks [default: 0.25].")
+    parser.add_argument("--type-depth",dest="type_depth",type=int,default=2,help="Nesting depth of the derived types per module [default: 2].")
+    args = parser.parse_args()
+
+    if args.dialect not in DIALECTS:
+        msg = "unsupported dialect '{}'; must be one of: {}".format(args.dialect,", ".join(DIALECTS))
+        print("ERROR: "+msg,file=sys.stderr)
+        sys.exit(2)
+    for filepath in generate_corpus(args.output_dir,args.modules,args.kernels,args.dialect,\
+                                    args.declarations,args.macro_density,args.type_depth):
+        print(filepath)
@@ -9,9 +9,11 @@ import fort2hip.model as model
 import translator.translator as translator
 import indexer.indexer as indexer
 import indexer.scoper as scoper
+import indexer.constantfolding as constantfolding
 import scanner.scanner as scanner
 import utils.logging
 import utils.fileutils
+import utils.tracing
 
 INDEXER_ERROR_CODE = 1000
 
@@ -75,15 +77,17 @@ def _intrnl_create_argument_context(ivar,argname,deviceptr_names=[],is_loop_kern
     :rtype: dict
     """
     arg = _intrnl_init_arg(argname,ivar["f_type"],ivar["kind"],[ "value" ],"",ivar["rank"]>0)
-    arg["bytes_per_element"] = ivar["bytes_per_element"] # scope value might be more accurate
-    # TODO more kind and bytes per element should be obtained from scope var ivar as it can resolve them up to selected_kind parameters
-    if "parameter" in ivar["qualifiers"] and not ivar["value"] is None:
+    arg["bytes_per_element"] = ivar["bytes_per_element"] # scope value might be more accurate, see FOLD_CONSTANTS
+    if "parameter" in ivar["qualifiers"] and not ivar["value"] is None and ivar["rank"] == 0\
+       and constantfolding.fold(ivar["value"]) != None: # literal
         arg["c_value"] = ivar["value"] 
     lbound_args = []  # additional arguments that we introduce if variable is an array
     count_args      = []
     macro          = None
     # treat arrays
     rank = ivar["rank"] 
+    constant_shape = FOLD_CONSTANTS and rank > 0 and not ivar["unspecified_bounds"] and\
+      all(constantfolding.fold(bound) != None for bound in ivar["lbounds"] + ivar["counts"])
     if rank > 0:
         if argname in deviceptr_names:
             arg["callarg_name"] = "c_loc({})".format(argname)
@@ -100,19 +104,34 @@ def _intrnl_create_argument_context(ivar,argname,deviceptr_names=[],is_loop_kern
              count_arg = _intrnl_init_arg("{}_n{}".format(argname,d),"integer","c_int",["value","intent(in)"],"const int")
              count_arg["callarg_name"] = "size({},{})".format(argname,d)
              count_args.append(count_arg)
+             if constant_shape: # constants in loop kernels, see _intrnl_derive_kernel_arguments
+                 bound_arg["c_value"] = ivar["lbounds"][d-1]
+                 count_arg["c_value"] = ivar["counts"][d-1]
         # create macro expression
-        if is_loop_kernel_arg and not ivar["unspecified_bounds"]:
+        if constant_shape or (is_loop_kernel_arg and not ivar["unspecified_bounds"]):
             macro = { "expr" : ivar["index_macro"] }
         else:
             macro = { "expr" : ivar["index_macro_with_placeholders"] }
     return arg, lbound_args, count_args, macro
 
+def _intrnl_local_var_c_str(arg):
+    """:return: C declaration of a kernel-local variable; initialized if the argument has a constant value."""
+    if len(arg["c_suffix"]):
+        return "{0} {1}{2}= {3}".format(arg["c_type"],arg["name"],arg["c_size"],arg["c_suffix"])
+    elif len(arg["c_value"]):
+        return "{0} {1}{2} = {3}".format(arg["c_type"],arg["name"],arg["c_size"],arg["c_value"])
+    return "{0} {1}{2}".format(arg["c_type"],arg["name"],arg["c_size"])
+
 def _intrnl_derive_kernel_arguments(scope, varnames, local_vars, loop_vars, is_loop_kernel_arg=False, deviceptr_names=[]):
     """
     Derive code generation contexts for the different interfaces and subroutines that 
     are generated by the fort2hip module.
 
     :param: varnames a list of Fortran varnames or derived type members such as 'a%b%c'
+    :param: is_loop_kernel_arg if the arguments belong to a loop kernel. Only then are the bounds of arrays
+            with constant shape declared as kernel-local constants instead of being passed as arguments,
+            as fort2hip writes the launch call of loop kernels itself. The launch calls of CUDA Fortran
+            kernels are written by the scanner, which passes the bounds of all arrays, see STCudaKernelCall.
     """
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_derive_kernel_arguments",{"varnames":str(varnames)})
     
@@ -138,7 +157,7 @@ def _intrnl_derive_kernel_arguments(scope, varnames, local_vars, loop_vars, is_l
     for name in varnames_lower:
         if include_arg_(name):
             ivar, discovered = scoper.search_scope_for_variable(\
-              scope,name) # TODO treat implicit here
+              scope,name,resolve=FOLD_CONSTANTS) # TODO treat implicit here
             argname = name
             if not discovered:
                 arg = _intrnl_init_arg(name,"TODO declaration not found","",[],"TODO declaration not found")
@@ -153,7 +172,7 @@ def _intrnl_derive_kernel_arguments(scope, varnames, local_vars, loop_vars, is_l
                 elif argname in local_vars:
                     arg["qualifiers"]=[]
                     if ivar["rank"] > 0:
-                        arg["c_size"] = ivar["total_count"]
+                        arg["c_size"] = "[{}]".format(ivar["total_count"])
                     if "shared" in ivar["qualifiers"]:
                         arg["c_type"] = "__shared__ " + arg["c_type"] 
                     local_cpu_routine_args.append(arg)
@@ -161,14 +180,17 @@ def _intrnl_derive_kernel_arguments(scope, varnames, local_vars, loop_vars, is_l
                 else:
                     rank = ivar["rank"]
                     if rank > 0: 
-                        input_arrays.append({ "name" : name, "rank" : rank })
+                        # bounds of arrays with constant shape are known, see _intrnl_create_argument_context
+                        lbounds = [bound_arg["c_value"] or bound_arg["name"] for bound_arg in lower_bound_args]
+                        counts  = [count_arg["c_value"] or count_arg["name"] for count_arg in count_args]
+                        input_arrays.append({ "name" : name, "rank" : rank, "lbounds" : lbounds, "counts" : counts })
                         arg["c_size"]    = ""
                         dimensions = "dimension({0})".format(",".join([":"]*rank))
                         # Fortran size expression for allocate
                         f_size = []
                         for i in range(0,rank):
                             f_size.append("{lb}:{lb}+{siz}-1".format(\
-                                lb=lower_bound_args[i]["name"],siz=count_args[i]["name"]))
+                                lb=lbounds[i],siz=counts[i]))
                         local_cpu_routine_args.append(\
                           { "name" : name,
                             "type" : arg["orig_type"],
@@ -178,10 +200,12 @@ def _intrnl_derive_kernel_arguments(scope, varnames, local_vars, loop_vars, is_l
                           }\
                         )
                     kernel_args.append(arg)
-                    for count_arg in count_args:
-                        kernel_args.append(count_arg)
-                    for bound_arg in lower_bound_args:
-                        kernel_args.append(bound_arg)
+                    for bound_arg in count_args + lower_bound_args:
+                        if is_loop_kernel_arg and len(bound_arg["c_value"]):
+                            bound_arg["qualifiers"] = []
+                            c_kernel_local_vars.append(bound_arg)
+                        else:
+                            kernel_args.append(bound_arg)
                 if not macro is None:
                     macros.append(macro)
 
@@ -210,6 +234,8 @@ def _intrnl_update_context_from_loop_kernels(loop_kernels,index,hip_context,fCon
     
     hip_context["have_reductions"] = False
     for stkernel in loop_kernels:
+        trace_span = utils.tracing.begin_span("loop_kernel","fort2hip",\
+          {"kernel":stkernel.kernel_name(),"lineno":stkernel.min_lineno()})
         parent_tag = stkernel._parent.tag()
         scope     = scoper.create_scope(index,parent_tag)
    
@@ -295,7 +321,7 @@ def _intrnl_update_context_from_loop_kernels(loop_kernels,index,hip_context,fCon
         hip_kernel_dict["kernel_call_arg_names"]     = kernel_call_arg_names
         hip_kernel_dict["cpu_kernel_call_arg_names"] = cpu_kernel_call_arg_names
         hip_kernel_dict["reductions"]                = reduction_vars
-        hip_kernel_dict["kernel_local_vars"]         = ["{} {}{}".format(a["c_type"],a["name"],a["c_size"]) for a in c_kernel_local_vars]
+        hip_kernel_dict["kernel_local_vars"]         = [_intrnl_local_var_c_str(a) for a in c_kernel_local_vars]
         hip_kernel_dict["interface_name"]            = kernel_launcher_name
         hip_kernel_dict["interface_comment"]         = "" # kernel_launch_info.c_str()
         hip_kernel_dict["interface_args"]            = hip_kernel_dict["kernel_args"]
@@ -388,6 +414,7 @@ def _intrnl_update_context_from_loop_kernels(loop_kernels,index,hip_context,fCon
                 # Add all definitions to context
                 fContext["interfaces"].append(f_cpu_interface_dict)
                 fContext["routines"].append(f_cpu_routine_dict)
+        utils.tracing.end_span(trace_span)
     
     utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_update_context_from_loop_kernels")
 
@@ -404,6 +431,8 @@ def _intrnl_update_context_from_device_procedures(device_procedures,index,hip_co
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_update_context_from_device_procedures")
     
     for stprocedure in device_procedures:
+        trace_span = utils.tracing.begin_span("device_procedure","fort2hip",\
+          {"procedure":stprocedure.index_record["name"],"lineno":stprocedure.min_lineno()})
         scope       = scoper.create_scope(index,stprocedure.tag())
         iprocedure  = stprocedure.index_record
         is_function  = iprocedure["kind"] == "function"
@@ -471,7 +500,7 @@ def _intrnl_update_context_from_device_procedures(device_procedures,index,hip_co
             if not stprocedure.is_kernel_subroutine() and not arg["is_array"]:
                 c_type += "&"
             hip_kernel_dict["kernel_args"].append(c_type + " " + arg["name"])
-        hip_kernel_dict["kernel_local_vars"]       = ["{0} {1}{2}{3}".format(a["c_type"],a["name"],a["c_size"],"= " + a["c_suffix"] if len(a["c_suffix"]) else "") for a in c_kernel_local_vars]
+        hip_kernel_dict["kernel_local_vars"]       = [_intrnl_local_var_c_str(a) for a in c_kernel_local_vars]
         hip_kernel_dict["interface_name"]         = kernel_launcher_name
         hip_kernel_dict["interface_args"]         = hip_kernel_dict["kernel_args"]
         hip_kernel_dict["interface_comment"]      = ""
@@ -502,16 +531,22 @@ def _intrnl_update_context_from_device_procedures(device_procedures,index,hip_co
             f_interface_dict_manual["argnames"] = [arg["name"] for arg in f_interface_dict_manual["args"]]
             f_interface_dict_manual["do_test"]   = True
             fContext["interfaces"].append(f_interface_dict_manual)
+        utils.tracing.end_span(trace_span)
     
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_update_context_from_device_procedures")
 
-def _intrnl_write_file(outfile_path,kind,content):
+def _intrnl_write_file(outfile_path,kind,content,prettify_file=None):
+    """:note: Only rewrites the file if its (prettified) content changes."""
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_write_file")
     
-    with open(outfile_path,"w") as outfile:
-        outfile.write(content)
+    if prettify_file != None:
+        content = utils.fileutils.transform_content_via_file(\
+          content,os.path.splitext(outfile_path)[1],prettify_file)
+    if utils.fileutils.write_file_if_changed(outfile_path,content):
         msg = "created {}: ".format(kind).ljust(40) + outfile_path
-        utils.logging.log_info(LOG_PREFIX,"_intrnl_write_file",msg)
+    else:
+        msg = "unchanged {}: ".format(kind).ljust(40) + outfile_path
+    utils.logging.log_info(LOG_PREFIX,"_intrnl_write_file",msg)
     
     utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_write_file")
 
@@ -636,11 +671,13 @@ def generate_hip_files(stree,index,kernels_to_convert_to_hip,translation_source_
             if generate_code:
                 have_reductions = have_reductions or hip_context["have_reductions"]
 
+                if PRETTIFY_EMITTED_C_CODE:
+                    prettify_file = lambda filepath: utils.fileutils.prettify_c_file(filepath,CLANG_FORMAT_STYLE)
+                else:
+                    prettify_file = None
                 _intrnl_write_file(\
                    hip_module_filepath,"HIP C++ implementation file",\
-                   model.HipImplementationModel().generate_code(hip_context))
-                if PRETTIFY_EMITTED_C_CODE:
-                    utils.fileutils.prettify_c_file(hip_module_filepath,CLANG_FORMAT_STYLE)
+                   model.HipImplementationModel().generate_code(hip_context),prettify_file)
                 if len(fContext["interfaces"]):
                    fortran_modules.append(\
                      model.InterfaceModuleModel().generate_code(fContext))
@@ -664,9 +701,8 @@ def generate_hip_files(stree,index,kernels_to_convert_to_hip,translation_source_
             content               = "\n".join(fortran_modules)
             if len(FORTRAN_MODULE_PREAMBLE):
                 content = FORTRAN_MODULE_PREAMBLE + "\n" + content
-            _intrnl_write_file(fortran_module_filepath,"interface/testing module",content)
-            if PRETTIFY_EMITTED_FORTRAN_CODE:
-                utils.fileutils.prettify_f_file(fortran_module_filepath)
+            _intrnl_write_file(fortran_module_filepath,"interface/testing module",content,\
+              utils.fileutils.prettify_f_file if PRETTIFY_EMITTED_FORTRAN_CODE else None)
     
     utils.logging.log_leave_function(LOG_PREFIX,"generate_hip_files")
     
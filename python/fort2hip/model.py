@@ -7,6 +7,7 @@ import jinja2
 
 import addtoplevelpath
 import utils.logging
+import utils.tracing
     
 class BaseModel():
     def __init__(self,template):
@@ -17,7 +18,8 @@ class BaseModel():
 
         template = ENV.get_template(self._template)
         try:
-            return template.render(context)
+            with utils.tracing.span("render_template","fort2hip",{"template":self._template}):
+                return template.render(context)
         except Exception as e:
             utils.logging.log_error("fort2hip.model","BaseModel.generate_code","could not render template '%s'" % self._template)
             raise e
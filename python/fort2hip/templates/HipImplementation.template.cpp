@@ -48,10 +48,10 @@
   HIP_CHECK(hipDeviceSynchronize());
   #endif
 {%- endmacro -%}
-{%- macro print_array(krnl_prefix,inout,print_values,print_norms,array,rank) -%}
-  GPUFORT_PRINT_ARRAY{{rank}}("{{krnl_prefix}}:{{inout}}:",{{print_values}},{{print_norms}},{{array}},
-    {%- for i in range(1,rank+1) -%}{{array}}_n{{i}},{%- endfor -%}
-    {%- for i in range(1,rank+1) -%}{{array}}_lb{{i}}{{"," if not loop.last}}{%- endfor -%});
+{%- macro print_array(krnl_prefix,inout,print_values,print_norms,array) -%}
+  GPUFORT_PRINT_ARRAY{{array.rank}}("{{krnl_prefix}}:{{inout}}:",{{print_values}},{{print_norms}},{{array.name}},
+    {%- for count in array.counts -%}{{count}},{%- endfor -%}
+    {%- for lbound in array.lbounds -%}{{lbound}}{{"," if not loop.last}}{%- endfor -%});
 {%- endmacro -%}
 {# REDUCTION MACROS #}
 {%- macro reductions_prepare(kernel,star) -%}
@@ -108,11 +108,11 @@ extern "C" void {{iface_prefix}}(
   #endif
   #if defined(GPUFORT_PRINT_INPUT_ARRAYS_ALL) || defined(GPUFORT_PRINT_INPUT_ARRAYS_{{krnl_prefix}})
   {% for array in kernel.input_arrays %}
-  {{ print_array(krnl_prefix+":gpu","in","true","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","in","true","true",array) }}
   {% endfor %}
   #elif defined(GPUFORT_PRINT_INPUT_ARRAY_NORMS_ALL) || defined(GPUFORT_PRINT_INPUT_ARRAY_NORMS_{{krnl_prefix}})
   {% for array in kernel.input_arrays %}
-  {{ print_array(krnl_prefix+":gpu","in","false","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","in","false","true",array) }}
   {% endfor %}
   #endif{% endif +%}
   // launch kernel
@@ -122,11 +122,11 @@ extern "C" void {{iface_prefix}}(
   {{ synchronize(krnl_prefix) }}
   #if defined(GPUFORT_PRINT_OUTPUT_ARRAYS_ALL) || defined(GPUFORT_PRINT_OUTPUT_ARRAYS_{{krnl_prefix}})
   {% for array in kernel.output_arrays %}
-  {{ print_array(krnl_prefix+":gpu","out","true","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","out","true","true",array) }}
   {% endfor %}
   #elif defined(GPUFORT_PRINT_OUTPUT_ARRAY_NORMS_ALL) || defined(GPUFORT_PRINT_OUTPUT_ARRAY_NORMS_{{krnl_prefix}})
   {% for array in kernel.output_arrays %}
-  {{ print_array(krnl_prefix+":gpu","out","false","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","out","false","true",array) }}
   {% endfor %}
   #endif
 {% endif %}
@@ -147,11 +147,11 @@ extern "C" void {{iface_prefix}}_auto(
   #endif
   #if defined(GPUFORT_PRINT_INPUT_ARRAYS_ALL) || defined(GPUFORT_PRINT_INPUT_ARRAYS_{{krnl_prefix}})
   {% for array in kernel.input_arrays %}
-  {{ print_array(krnl_prefix+":gpu","in","true","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","in","true","true",array) }}
   {% endfor %}
   #elif defined(GPUFORT_PRINT_INPUT_ARRAY_NORMS_ALL) || defined(GPUFORT_PRINT_INPUT_ARRAY_NORMS_{{krnl_prefix}})
   {% for array in kernel.input_arrays %}
-  {{ print_array(krnl_prefix+":gpu","in","false","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","in","false","true",array) }}
   {% endfor %}
   #endif{% endif +%}
   // launch kernel
@@ -161,11 +161,11 @@ extern "C" void {{iface_prefix}}_auto(
   {{ synchronize(krnl_prefix) }}
   #if defined(GPUFORT_PRINT_OUTPUT_ARRAYS_ALL) || defined(GPUFORT_PRINT_OUTPUT_ARRAYS_{{krnl_prefix}})
   {% for array in kernel.output_arrays %}
-  {{ print_array(krnl_prefix+":gpu","out","true","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","out","true","true",array) }}
   {% endfor %}
   #elif defined(GPUFORT_PRINT_OUTPUT_ARRAY_NORMS_ALL) || defined(GPUFORT_PRINT_OUTPUT_ARRAY_NORMS_{{krnl_prefix}})
   {% for array in kernel.output_arrays %}
-  {{ print_array(krnl_prefix+":gpu","out","false","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":gpu","out","false","true",array) }}
   {% endfor %}
   #endif
 {% endif %}
@@ -191,11 +191,11 @@ extern "C" void {{iface_prefix}}_cpu(
   #endif
   #if defined(GPUFORT_PRINT_INPUT_ARRAYS_ALL) || defined(GPUFORT_PRINT_INPUT_ARRAYS_{{krnl_prefix}})
   {% for array in kernel.input_arrays %}
-  {{ print_array(krnl_prefix+":cpu","in","true","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":cpu","in","true","true",array) }}
   {% endfor %}
   #elif defined(GPUFORT_PRINT_INPUT_ARRAY_NORMS_ALL) || defined(GPUFORT_PRINT_INPUT_ARRAY_NORMS_{{krnl_prefix}})
   {% for array in kernel.input_arrays %}
-  {{ print_array(krnl_prefix+":cpu","in","false","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":cpu","in","false","true",array) }}
   {% endfor %}
   #endif{% endif +%}
   // launch kernel
@@ -203,11 +203,11 @@ extern "C" void {{iface_prefix}}_cpu(
 {% if kernel.generate_debug_code %}
   #if defined(GPUFORT_PRINT_OUTPUT_ARRAYS_ALL) || defined(GPUFORT_PRINT_OUTPUT_ARRAYS_{{krnl_prefix}})
   {% for array in kernel.output_arrays %}
-  {{ print_array(krnl_prefix+":cpu","out","true","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":cpu","out","true","true",array) }}
   {% endfor %}
   #elif defined(GPUFORT_PRINT_OUTPUT_ARRAY_NORMS_ALL) || defined(GPUFORT_PRINT_OUTPUT_ARRAY_NORMS_{{krnl_prefix}})
   {% for array in kernel.output_arrays %}
-  {{ print_array(krnl_prefix+":cpu","out","false","true",array.name,array.rank) }}
+  {{ print_array(krnl_prefix+":cpu","out","false","true",array) }}
   {% endfor %}
   #endif
 {% endif %}
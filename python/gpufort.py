@@ -4,14 +4,25 @@
 import os, sys
 import argparse
 import hashlib
+import time
+import json
+import socket
+import concurrent.futures
+import multiprocessing
 import cProfile,pstats,io
 
 # local imports
 import addtoplevelpath
 import utils.logging
 import utils.fileutils
+import utils.filecache
+import utils.tracing
 import scanner.scanner as scanner
 import indexer.indexer as indexer
+import indexer.modulefile as modulefile
+import indexer.symboldb as symboldb
+import indexer.scoper as scoper
+import indexer.dependencygraph as dependencygraph
 import linemapper.linemapper as linemapper
 import translator.translator as translator
 import fort2hip.fort2hip as fort2hip
@@ -26,6 +37,7 @@ exec(open(os.path.join(__GPUFORT_PYTHON_DIR, "gpufort_options.py.in")).read())
 def create_index(search_dirs,options,filepath,linemaps=None):
     global LOG_PREFIX
     global SKIP_CREATE_GPUFORT_MODULE_FILES
+    global STREAM_LINEMAPS
    
     utils.logging.log_enter_function(LOG_PREFIX,"create_index",\
       {"filepath":filepath,"options":" ".join(options),\
@@ -35,24 +47,37 @@ def create_index(search_dirs,options,filepath,linemaps=None):
     
     index = []
     if not SKIP_CREATE_GPUFORT_MODULE_FILES:
-        if linemaps != None:
-            indexer.update_index_from_linemaps(linemaps,index)
-        else:
-            indexer.scan_file(filepath,options_as_str,index)
-        output_dir = os.path.dirname(filepath)
-        indexer.write_gpufort_module_files(index,output_dir)
+        with utils.tracing.span("indexing","gpufort",{"file":filepath}):
+            if linemaps != None:
+                indexer.update_index_from_linemaps(linemaps,index)
+            elif STREAM_LINEMAPS:
+                indexer.update_index_from_linemaps(_intrnl_iterate_file(filepath,options_as_str),index)
+            else:
+                indexer.scan_file(filepath,options_as_str,index)
+            output_dir = os.path.dirname(filepath)
+            indexer.write_gpufort_module_files(index,output_dir,search_dirs)
+    names = [mod["name"] for mod in index]
     index.clear()
-    indexer.load_gpufort_module_files(search_dirs,index)
+    with utils.tracing.span("load_module_files","gpufort",{"search_dirs":search_dirs}):
+        if SKIP_CREATE_GPUFORT_MODULE_FILES: # program units of the file are unknown
+            indexer.load_gpufort_module_files(search_dirs,index)
+        else:
+            indexer.load_used_gpufort_module_files(search_dirs,names,index)
     
     utils.logging.log_leave_function(LOG_PREFIX,"create_index")
     return index
 
-def _intrnl_translate_source(infilepath,stree,linemaps,index,preamble):
+def _intrnl_translate_source(infilepath,stree,linemaps,index,preamble,streamed=False):
+    """
+    :param bool streamed: The linemaps have been streamed; only the blank-line linemaps 
+                          have been retained, the others are taken from the scanner tree.
+    """
     global LOG_PREFIX
     global MODIFIED_FILE_EXT
     global PRETTIFY_MODIFIED_TRANSLATION_SOURCE
     
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_translate_source",{"infilepath":infilepath})
+    trace_span = utils.tracing.begin_span("modify_translation_source","gpufort",{"file":infilepath})
     
     # post process
     scanner.postprocess(stree,index,fort2hip.FORTRAN_MODULE_SUFFIX)
@@ -63,19 +88,586 @@ def _intrnl_translate_source(infilepath,stree,linemaps,index,preamble):
         for child in stnode._children:
             transform_(child)
     transform_(stree)
+    if streamed:
+        linemaps = _intrnl_collect_tree_linemaps(stree,linemaps)
 
-    # write the file
+    # write the file; prettify the file
     outfilepath = infilepath + MODIFIED_FILE_EXT
-    linemapper.write_modified_file(outfilepath,infilepath,linemaps,preamble)
-
-    # prettify the file
     if PRETTIFY_MODIFIED_TRANSLATION_SOURCE:
-        utils.fileutils.prettify_f_file(outfilepath)
+        content = linemapper.render_modified_file(infilepath,linemaps,preamble)
+        content = utils.fileutils.transform_content_via_file(\
+          content,os.path.splitext(outfilepath)[1],utils.fileutils.prettify_f_file)
+        utils.fileutils.write_file_if_changed(outfilepath,content)
+    else:
+        linemapper.write_modified_file(outfilepath,infilepath,linemaps,preamble)
     msg = "created hipified input file: ".ljust(40) + outfilepath
     utils.logging.log_info(LOG_PREFIX,"_intrnl_translate_source",msg)
     
+    utils.tracing.end_span(trace_span)
     utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_translate_source")
 
+# translation cache
+
+__CONFIG_FINGERPRINT = None # computed once per process, config does not change after parsing the command line
+__CACHE_TIERS        = {}   # subdirectory of CACHE_DIR -> fingerprint in use, see utils.filecache.evict
+
+def _intrnl_config_fingerprint():
+    """
+    :return: Digest of the GPUFORT sources and of all config values of GPUFORT's components
+             that can be serialized, including the destination dialect.
+    """
+    global __CONFIG_FINGERPRINT
+    global __GPUFORT_PYTHON_DIR
+    if __CONFIG_FINGERPRINT == None:
+        hasher = hashlib.sha256()
+        for root, dirs, files in os.walk(__GPUFORT_PYTHON_DIR):
+            dirs[:] = sorted(d for d in dirs if d not in ["test","__pycache__"])
+            for filename in sorted(files):
+                stat = os.stat(os.path.join(root,filename))
+                hasher.update("{}:{}:{};".format(os.path.join(root,filename),stat.st_mtime_ns,stat.st_size).encode())
+        ignored_prefixes = { "gpufort": ("CACHE_","LOG_","PROFILING_","TRACE_","BATCH_","SERVE_","POST_CLI_ACTIONS","INCLUDE_DIRS"),
+                             "linemapper": ("INCLUDE_CACHE_",),
+                             "indexer": ("PARSE_VARIABLE_DECLARATIONS_","DECLARATION_CACHE_","SYMBOL_DATABASE","WRITE_EXPORT_SNAPSHOTS"),
+                             "scoper": ("SCOPE_CACHE_","USE_EXPORT_SNAPSHOTS"),
+                             "scanner": ("CLASSIFY_STATEMENTS","__STATEMENT_STATISTICS") }
+        components = [("gpufort",globals()),("linemapper",vars(linemapper)),("indexer",vars(indexer)),\
+          ("scoper",vars(scoper)),("scanner",vars(scanner)),("translator",vars(translator)),("fort2hip",vars(fort2hip))]
+        for component, variables in components:
+            for name in sorted(variables):
+                if name.isupper() and not name.startswith(ignored_prefixes.get(component,())):
+                    try:
+                        hasher.update("{}.{}={};".format(component,name,\
+                          json.dumps(variables[name],sort_keys=True)).encode())
+                    except (TypeError,ValueError): # not serializable, e.g. grammar objects
+                        pass
+        __CONFIG_FINGERPRINT = hasher.hexdigest()
+    return __CONFIG_FINGERPRINT
+
+def _intrnl_translation_cache_key(input_filepath,linemaps,index,options):
+    """
+    :return: Digest of the translation source and its included files, the preprocessor options,
+             the config fingerprint, and the index records of all (transitively) used modules.
+    """
+    hasher = hashlib.sha256()
+    hasher.update("{};{};{};".format(input_filepath,options,_intrnl_config_fingerprint()).encode())
+    used_modules     = []
+    source_filepaths = []
+    def traverse_(linemaps): # single pass, linemaps might be streamed
+        for linemap in linemaps:
+            source_filepaths.append(linemap["file"])
+            if linemap["is_active"]:
+                for statement in linemap["statements"]:
+                    match = dependencygraph.p_use_statement.match(statement) # same modules as in the dependency graph
+                    if match:
+                        used_modules.append(match.group(1).lower())
+            traverse_(linemap["included_linemaps"])
+    traverse_(linemaps)
+    for filepath in dict.fromkeys(source_filepaths):
+        with open(filepath,"rb") as infile:
+            hasher.update(hashlib.sha256(infile.read()).digest())
+    # modules used by the used modules, top-level subprograms
+    records = {}
+    while len(used_modules):
+        name = used_modules.pop()
+        if name not in records:
+            record = next((irecord for irecord in index if irecord["name"] == name),None)
+            records[name] = record
+            if record != None:
+                used_modules += [used_module["name"] for used_module in record["used_modules"]]
+    for record in index:
+        if record["kind"] in ["subroutine","function"]:
+            records[record["name"]] = record
+    for name in sorted(records):
+        hasher.update(name.encode())
+        if records[name] != None:
+            if isinstance(records[name],modulefile.ModuleRecord): # do not load the record
+                hasher.update(records[name].digest().encode())
+            else:
+                hasher.update(json.dumps(records[name],sort_keys=True).encode())
+    return hasher.hexdigest()
+
+def translate_file(input_filepath,linemaps,index,options=""):
+    """
+    Scan the linemaps of a single file, generate the HIP files
+    and modify the translation source.
+    If the translation cache is enabled, translation is skipped and the
+    output files are restored from the cache if there is an entry for the file.
+
+    :param str input_filepath: Absolute path of the translation source.
+    :param list linemaps: Linemaps of the translation source, see linemapper.read_file, or None
+                          if the linemaps shall be streamed from the file, see _intrnl_read_file.
+    :param list index: Index that contains the records of all modules the file depends on.
+    :param str options: Preprocessor options that were used to create the linemaps.
+    """
+    global LOG_PREFIX
+    global CACHE_ENABLE
+    global CACHE_DIR
+    global CACHE_MAX_SIZE
+    global __CACHE_TIERS
+
+    utils.logging.log_enter_function(LOG_PREFIX,"translate_file",{"input_filepath":input_filepath})
+
+    if CACHE_ENABLE:
+        trace_span = utils.tracing.begin_span("cache_lookup","gpufort",{"file":input_filepath})
+        cache_key  = _intrnl_translation_cache_key(input_filepath,\
+          linemaps if linemaps != None else _intrnl_iterate_file(input_filepath,options),index,options)
+        outputs    = utils.filecache.lookup(CACHE_DIR,cache_key)
+        utils.tracing.end_span(trace_span,{"hit":outputs != None})
+        if outputs != None:
+            utils.filecache.restore(outputs)
+            msg = "restored {} output file(s) from cache entry {}".format(len(outputs),cache_key)
+            utils.logging.log_info(LOG_PREFIX,"translate_file",msg)
+        else:
+            utils.fileutils.begin_recording_output_files()
+            try:
+                _intrnl_translate_file(input_filepath,linemaps,index,options)
+            finally:
+                output_filepaths = utils.fileutils.end_recording_output_files()
+            utils.filecache.store(CACHE_DIR,cache_key,output_filepaths,CACHE_MAX_SIZE,__CACHE_TIERS)
+    else:
+        _intrnl_translate_file(input_filepath,linemaps,index,options)
+
+    utils.logging.log_leave_function(LOG_PREFIX,"translate_file")
+
+def _intrnl_translate_file(input_filepath,linemaps,index,options):
+    global ONLY_MODIFY_TRANSLATION_SOURCE
+    global ONLY_EMIT_KERNELS
+    global ONLY_EMIT_KERNELS_AND_LAUNCHERS
+
+    # batch workers and the daemon translate multiple files per process; scopes
+    # must not leak into the next file as program units of different files may have the same name
+    scoper.invalidate_scopes()
+    streamed = linemaps == None
+    if streamed: 
+        # the scanner tree keeps the linemaps it needs, all others are freed while scanning
+        # except those of blank lines, which are needed for grouping the modified lines
+        linemaps = []
+        trace_span = utils.tracing.begin_span("scanning","gpufort",{"file":input_filepath})
+        stree = scanner.parse_file(_intrnl_iterate_file(input_filepath,options,linemaps),index,input_filepath)
+    else:
+        trace_span = utils.tracing.begin_span("scanning","gpufort",{"file":input_filepath})
+        stree = scanner.parse_file(linemaps,index,input_filepath)
+    utils.tracing.end_span(trace_span,{"statement_classifier":scanner.statement_classifier_statistics()})
+
+    # extract kernels
+    if "hip" in scanner.DESTINATION_DIALECT:
+        kernels_to_convert_to_hip = ["*"]
+    else:
+        kernels_to_convert_to_hip = scanner.KERNELS_TO_CONVERT_TO_HIP
+    trace_span = utils.tracing.begin_span("generate_hip_files","gpufort",{"file":input_filepath})
+    fortran_module_filepath, main_hip_filepath =\
+      fort2hip.generate_hip_files(stree,index,kernels_to_convert_to_hip,input_filepath,\
+       generate_code=not ONLY_MODIFY_TRANSLATION_SOURCE)
+    utils.tracing.end_span(trace_span,{"scope_cache":scoper.scope_cache_statistics()})
+    utils.logging.log_debug(LOG_PREFIX,"_intrnl_translate_file","scope cache statistics: {}".format(scoper.scope_cache_statistics()))
+    # modify original file
+    if fortran_module_filepath != None:
+        preamble = "#include \"{}\"".format(\
+          os.path.basename(fortran_module_filepath))
+    else:
+        preamble = None
+    if not (ONLY_EMIT_KERNELS or ONLY_EMIT_KERNELS_AND_LAUNCHERS):
+        _intrnl_translate_source(input_filepath,stree,linemaps,index,preamble,streamed)
+
+def _intrnl_read_file(input_filepath,options):
+    """Create the linemaps of the file, see linemapper.read_file; traced as phase 'linemapping'.
+    :return: The linemaps or None if STREAM_LINEMAPS is enabled. In this case, the consumers
+             stream the linemaps from the file, see _intrnl_iterate_file.
+    """
+    global STREAM_LINEMAPS
+    if STREAM_LINEMAPS:
+        return None
+    with utils.tracing.span("linemapping","gpufort",{"file":input_filepath}):
+        return linemapper.read_file(input_filepath,options)
+
+def _intrnl_iterate_file(input_filepath,options,blank_linemaps=None):
+    """:return: Generator of the linemaps of the file, see linemapper.iterate_file.
+    :note: Linemapping is interleaved with the consumer of the generator; hence, no separate 'linemapping' span is recorded.
+    """
+    return linemapper.iterate_file(input_filepath,options,blank_linemaps)
+
+def _intrnl_collect_tree_linemaps(stree,blank_linemaps):
+    """
+    :return: The linemaps referenced by the nodes of the scanner tree and the given blank-line linemaps, 
+             ordered by line number. These are all linemaps that linemapper.render_modified_file 
+             considers when the linemaps have been streamed.
+    """
+    linemaps = { id(linemap): linemap for linemap in blank_linemaps }
+    def traverse_(stnode):
+        for linemap in stnode._linemaps:
+            linemaps[id(linemap)] = linemap
+        for child in stnode._children:
+            traverse_(child)
+    traverse_(stree)
+    return sorted(linemaps.values(),key=lambda linemap: linemap["lineno"])
+
+# batch mode
+
+__BATCH_INDICES = {} # shared indices per input directory; set in the batch worker processes
+
+def _intrnl_read_batch_inputs(batch_args,working_dir):
+    """
+    Collect the input files of a batch run.
+
+    :param list batch_args: File paths. Entries with prefix '@' are manifest files
+                            that list one file path per line. Text after '#' is ignored.
+                            Relative paths in a manifest are relative to the manifest's directory.
+    :return: List of absolute file paths without duplicates, in the order of first appearance.
+    """
+    def make_abs_(path,base_dir):
+        if path[0] != "/":
+            path = base_dir + "/" + path
+        return os.path.abspath(path)
+
+    result = []
+    for arg in batch_args:
+        if arg.startswith("@"):
+            manifest_filepath = make_abs_(arg[1:],working_dir)
+            if not os.path.exists(manifest_filepath):
+                msg = "batch manifest '{}' cannot be found".format(manifest_filepath)
+                print("ERROR: "+msg,file=sys.stderr)
+                sys.exit(2)
+            manifest_dir = os.path.dirname(manifest_filepath)
+            with open(manifest_filepath,"r") as infile:
+                for line in infile.readlines():
+                    entry = line.split("#")[0].strip()
+                    if len(entry):
+                        result.append(make_abs_(entry,manifest_dir))
+        else:
+            result.append(make_abs_(arg,working_dir))
+    for filepath in result:
+        if not os.path.exists(filepath):
+            msg = "input file '{}' cannot be found".format(filepath)
+            print("ERROR: "+msg,file=sys.stderr)
+            sys.exit(2)
+    return list(dict.fromkeys(result)) # remove duplicates, keep order
+
+def _intrnl_run_batch_task(task,*args):
+    """
+    Runs a batch task and converts its outcome into a status record.
+    :note: Errors in the pipeline typically terminate via sys.exit; hence SystemExit is caught too.
+    """
+    status = { "file": args[0], "status": "ok", "message": "", "elapsed": 0.0, "result": None }
+    start = time.time()
+    trace_span = utils.tracing.begin_span(task.__name__.replace("_intrnl_",""),"gpufort",{"file":args[0]})
+    try:
+        status["result"] = task(*args)
+    except (Exception,SystemExit) as e:
+        status["status"]  = "failed"
+        status["message"] = "{}: {}".format(type(e).__name__,str(e))
+        utils.logging.log_exception(LOG_PREFIX,"_intrnl_run_batch_task",\
+          "failed to process '{}': {}".format(args[0],status["message"]))
+    utils.tracing.end_span(trace_span,{"status":status["status"]})
+    status["elapsed"] = time.time() - start
+    return status
+
+def _intrnl_run_batch_worker_task(task,*args):
+    """
+    Runs a batch task in a worker process.
+    The trace events recorded by the worker are passed back to the parent process via the status record.
+    """
+    status = _intrnl_run_batch_task(task,*args)
+    status["trace_events"] = utils.tracing.pop_events()
+    return status
+
+def _intrnl_batch_scan_file(input_filepath,options):
+    linemaps = _intrnl_read_file(input_filepath,options)
+    return dependencygraph.scan_linemaps(\
+      linemaps if linemaps != None else _intrnl_iterate_file(input_filepath,options))
+
+def _intrnl_batch_index_file(input_filepath,options,search_dirs):
+    linemaps = _intrnl_read_file(input_filepath,options)
+    index    = []
+    with utils.tracing.span("indexing","gpufort",{"file":input_filepath}):
+        indexer.update_index_from_linemaps(\
+          linemaps if linemaps != None else _intrnl_iterate_file(input_filepath,options),index)
+        indexer.write_gpufort_module_files(index,os.path.dirname(input_filepath),search_dirs)
+
+def _intrnl_batch_translate_file(input_filepath,options):
+    global __BATCH_INDICES
+    linemaps = _intrnl_read_file(input_filepath,options)
+    translate_file(input_filepath,linemaps,__BATCH_INDICES[os.path.dirname(input_filepath)],options)
+
+def _intrnl_init_batch_worker(indices):
+    global __BATCH_INDICES
+    __BATCH_INDICES = indices
+    utils.tracing.pop_events() # inherited from the parent process
+
+def _intrnl_create_batch_pool(num_workers,indices={}):
+    """
+    :note: Uses the 'fork' start method so that the workers inherit
+           config values, command line overrides, and the shared index.
+    """
+    return concurrent.futures.ProcessPoolExecutor(max_workers=num_workers,\
+             mp_context=multiprocessing.get_context("fork"),\
+             initializer=_intrnl_init_batch_worker,initargs=(indices,))
+
+def _intrnl_run_batch_phase(executor,phase,task,input_filepaths,options,*args):
+    """
+    Submits one task per input file to the pool of worker processes and waits for all tasks.
+    Additional arguments are passed to every task.
+    """
+    global LOG_PREFIX
+    utils.logging.log_debug(LOG_PREFIX,"_intrnl_run_batch_phase",\
+      "{}: submit {} tasks to process pool".format(phase,len(input_filepaths)))
+    futures = [executor.submit(_intrnl_run_batch_worker_task,task,filepath,options,*args)\
+               for filepath in input_filepaths]
+    statuses = [future.result() for future in futures]
+    for status in statuses:
+        status["phase"] = phase
+        utils.tracing.add_events(status.pop("trace_events"))
+    return statuses
+
+def _intrnl_run_batch_index_phases(executor,input_filepaths,search_dirs,options):
+    """
+    Scans the used and defined modules of all input files, then creates
+    the GPUFORT module files in topological waves of the module dependency graph.
+    Missing modules are reported as warnings, cycles as errors before any module file is written.
+    Files that are part of or depend on a cycle, or that depend on a file that failed, are not indexed.
+    """
+    global LOG_PREFIX
+    statuses = _intrnl_run_batch_phase(executor,"scan",_intrnl_batch_scan_file,input_filepaths,options)
+    file_modules = { status["file"]: status["result"] for status in statuses if status["status"] == "ok" }
+    input_dirs   = [os.path.dirname(filepath) for filepath in input_filepaths]
+    all_search_dirs = list(dict.fromkeys(search_dirs + input_dirs))
+    graph, missing = dependencygraph.create_dependency_graph(file_modules,all_search_dirs)
+    for name, filepaths in missing.items():
+        msg = "module '{}' is neither defined by an input file nor found in a search directory (used in: {})".format(\
+          name,", ".join(filepaths))
+        utils.logging.log_warning(LOG_PREFIX,"_intrnl_run_batch_index_phases",msg)
+    waves, cycle = dependencygraph.schedule_waves(graph)
+    if len(cycle):
+        msg = "module dependency cycle: {}".format(" -> ".join(cycle))
+        utils.logging.log_error(LOG_PREFIX,"_intrnl_run_batch_index_phases",msg)
+    failed = set(filepath for filepath in input_filepaths if filepath not in file_modules)
+    for i, wave in enumerate(waves):
+        ready = []
+        for filepath in wave:
+            failed_dependencies = graph[filepath] & failed
+            if len(failed_dependencies):
+                statuses.append({ "file": filepath, "phase": "index", "status": "failed", "elapsed": 0.0, "result": None,\
+                  "message": "depends on failed file(s): "+", ".join(sorted(failed_dependencies)) })
+                failed.add(filepath)
+            else:
+                ready.append(filepath)
+        wave_statuses = _intrnl_run_batch_phase(executor,"index",_intrnl_batch_index_file,ready,options,all_search_dirs)
+        failed.update(status["file"] for status in wave_statuses if status["status"] != "ok")
+        statuses += wave_statuses
+    scheduled = set(filepath for wave in waves for filepath in wave)
+    for filepath in file_modules:
+        if filepath not in scheduled:
+            statuses.append({ "file": filepath, "phase": "index", "status": "failed", "elapsed": 0.0, "result": None,\
+              "message": "part of or depends on module dependency cycle: {}".format(" -> ".join(cycle)) })
+    return statuses
+
+def run_batch(input_filepaths,search_dirs,options,num_workers):
+    """
+    Translate multiple files in one invocation.
+
+    1. Creates the GPUFORT module files of all input files (unless skipped).
+       Files are processed in parallel in the topological order of their module dependencies.
+    2. Loads the GPUFORT module files once per input directory into a shared index.
+       (Program units in different directories may have the same name.)
+    3. Translates the input files in parallel.
+
+    :param list input_filepaths: Absolute paths of the translation sources.
+    :param list search_dirs: GPUFORT module file search directories.
+    :param str options: Preprocessor options such as '-D<key> -D<key>=<value>'.
+    :param int num_workers: Size of the process pool.
+    :return: A status record per file and phase with entries 'file', 'phase', 'status', 'message', 'elapsed'.
+    """
+    global LOG_PREFIX
+    global ONLY_CREATE_GPUFORT_MODULE_FILES
+    global SKIP_CREATE_GPUFORT_MODULE_FILES
+
+    utils.logging.log_enter_function(LOG_PREFIX,"run_batch",\
+      {"num_files":len(input_filepaths),"options":options,\
+       "search_dirs":" ".join(search_dirs),"num_workers":num_workers})
+
+    statuses = []
+    if not SKIP_CREATE_GPUFORT_MODULE_FILES:
+        with _intrnl_create_batch_pool(num_workers) as executor:
+            statuses += _intrnl_run_batch_index_phases(executor,input_filepaths,search_dirs,options)
+    failed = [status["file"] for status in statuses if status["status"] != "ok"]
+    if not ONLY_CREATE_GPUFORT_MODULE_FILES:
+        indices = {}
+        for filepath in input_filepaths:
+            input_dir = os.path.dirname(filepath)
+            if input_dir not in indices:
+                indices[input_dir] = []
+                indexer.load_gpufort_module_files(\
+                  list(dict.fromkeys(search_dirs + [input_dir])),indices[input_dir])
+        with _intrnl_create_batch_pool(num_workers,indices) as executor:
+            statuses += _intrnl_run_batch_phase(executor,"translate",_intrnl_batch_translate_file,\
+              [filepath for filepath in input_filepaths if filepath not in failed],options)
+    for status in statuses:
+        status.pop("result",None)
+
+    utils.logging.log_leave_function(LOG_PREFIX,"run_batch")
+    return statuses
+
+def print_batch_report(statuses,outfile=sys.stdout):
+    """Print one status line per file and phase, plus a summary line."""
+    for status in statuses:
+        line = "[{}] {} {:>8.2f}s {}".format(status["status"].ljust(6),status["phase"].ljust(9),\
+          status["elapsed"],status["file"])
+        if len(status["message"]):
+            line += ": " + status["message"]
+        print(line,file=outfile)
+    num_failed = len([status for status in statuses if status["status"] != "ok"])
+    print("batch: {} tasks, {} failed".format(len(statuses),num_failed),file=outfile)
+
+# server mode
+
+__SERVE_MODULE_FILE_CACHE = {} # module file path -> (mtime_ns,size,record)
+
+def _intrnl_serve_cache_module_file(filepath,mod):
+    global __SERVE_MODULE_FILE_CACHE
+    stat = os.stat(filepath)
+    __SERVE_MODULE_FILE_CACHE[filepath] = (stat.st_mtime_ns,stat.st_size,mod)
+
+def _intrnl_serve_load_gpufort_module_files(search_dirs,names,index):
+    """
+    Variant of indexer.load_used_gpufort_module_files that keeps the records
+    in memory and only replaces the record of a module file if its modification time or size changed.
+    :param list names: Names of the program units of the translated file, or None if they are unknown;
+                       then all module files are loaded, see indexer.load_gpufort_module_files.
+    :note: Index records are not modified by the translation; the cached records can thus be shared.
+    """
+    global __SERVE_MODULE_FILE_CACHE
+    loaded = []
+    if names == None:
+        indexer.load_gpufort_module_files(search_dirs,loaded)
+    else:
+        indexer.load_used_gpufort_module_files(search_dirs,names,loaded)
+    for mod in loaded:
+        if isinstance(mod,symboldb.DatabaseRecord): # reads the database on access
+            index.append(mod)
+        elif not any(irecord["name"] == mod["name"] for irecord in index):
+            filepath = mod.filepath
+            stat     = os.stat(filepath)
+            cached   = __SERVE_MODULE_FILE_CACHE.get(filepath,None)
+            if cached == None or cached[0:2] != (stat.st_mtime_ns,stat.st_size):
+                _intrnl_serve_cache_module_file(filepath,mod)
+                cached = __SERVE_MODULE_FILE_CACHE[filepath]
+            index.append(cached[2])
+
+def _intrnl_serve_translate_file(input_filepath,options,search_dirs):
+    global SKIP_CREATE_GPUFORT_MODULE_FILES
+    global ONLY_CREATE_GPUFORT_MODULE_FILES
+
+    linemaps = _intrnl_read_file(input_filepath,options)
+    names    = None # program units of the file are unknown
+    if not SKIP_CREATE_GPUFORT_MODULE_FILES:
+        index = []
+        with utils.tracing.span("indexing","gpufort",{"file":input_filepath}):
+            indexer.update_index_from_linemaps(\
+              linemaps if linemaps != None else _intrnl_iterate_file(input_filepath,options),index)
+            output_dir = os.path.dirname(input_filepath)
+            indexer.write_gpufort_module_files(index,output_dir,search_dirs)
+        for mod in index:
+            _intrnl_serve_cache_module_file(\
+              os.path.join(output_dir,mod["name"]+indexer.GPUFORT_MODULE_FILE_SUFFIX),mod)
+        names = [mod["name"] for mod in index]
+    if not ONLY_CREATE_GPUFORT_MODULE_FILES:
+        index = []
+        with utils.tracing.span("load_module_files","gpufort",{"search_dirs":search_dirs}):
+            _intrnl_serve_load_gpufort_module_files(search_dirs,names,index)
+        translate_file(input_filepath,linemaps,index,options)
+
+def _intrnl_serve_handle_request(request,search_dirs):
+    """
+    :param dict request: Request with entry 'command' and, if the command is 'translate',
+                         entries 'input', 'working_dir', 'defines', and 'search_dirs'.
+    :return: A status record with entries 'file', 'status', 'message', 'elapsed'.
+    """
+    if not isinstance(request,dict):
+        msg = "request must be a JSON object"
+        return { "file": "", "status": "failed", "message": msg, "elapsed": 0.0 }
+    command = request.get("command","translate")
+    if command == "ping":
+        return { "file": "", "status": "ok", "message": "pong", "elapsed": 0.0 }
+    elif command == "translate":
+        working_dir = request.get("working_dir",os.getcwd())
+        input_filepath = request.get("input",None)
+        if not isinstance(input_filepath,str) or not len(input_filepath):
+            msg = "request entry 'input' must be a non-empty string"
+            return { "file": "", "status": "failed", "message": msg, "elapsed": 0.0 }
+        if input_filepath[0] != "/":
+            input_filepath = working_dir + "/" + input_filepath
+        input_filepath = os.path.abspath(input_filepath)
+        request_search_dirs = []
+        for directory in request.get("search_dirs",[]):
+            if not isinstance(directory,str) or not len(directory):
+                continue
+            if directory[0] != "/":
+                directory = working_dir + "/" + directory
+            request_search_dirs.append(directory)
+        all_search_dirs = [d for d in request_search_dirs + search_dirs + [working_dir]\
+                           if os.path.exists(d)]
+        status = _intrnl_run_batch_task(_intrnl_serve_translate_file,\
+          input_filepath," ".join(request.get("defines",[])),list(dict.fromkeys(all_search_dirs)))
+        status.pop("result")
+        return status
+    else:
+        msg = "unknown command '{}'".format(command)
+        return { "file": "", "status": "failed", "message": msg, "elapsed": 0.0 }
+
+def serve(socket_path,search_dirs):
+    """
+    Run GPUFORT as daemon that translates files on request.
+    Grammar, translator and the loaded GPUFORT module files stay in memory
+    between requests. Requests are read from a Unix domain socket, one JSON
+    object per connection, and are processed one after another.
+    The daemon stops when it receives the command 'shutdown'.
+
+    :param str socket_path: Path of the Unix domain socket.
+    :param list search_dirs: GPUFORT module file search directories that are used for every request.
+    """
+    global LOG_PREFIX
+
+    utils.logging.log_enter_function(LOG_PREFIX,"serve",{"socket_path":socket_path})
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    os.makedirs(os.path.dirname(socket_path),exist_ok=True)
+    server = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    msg = "listening on socket '{}'".format(socket_path)
+    utils.logging.log_info(LOG_PREFIX,"serve",msg)
+    try:
+        shutdown = False
+        while not shutdown:
+            connection, _ = server.accept()
+            # a bad request or a client that disconnects early must not stop the daemon
+            try:
+                with connection, connection.makefile("rw") as stream:
+                    try:
+                        try:
+                            request = json.loads(stream.readline())
+                        except ValueError as e:
+                            request = { "command": "invalid" }
+                        if isinstance(request,dict) and request.get("command",None) == "shutdown":
+                            shutdown = True
+                            response = { "file": "", "status": "ok", "message": "shutdown", "elapsed": 0.0 }
+                        else:
+                            response = _intrnl_serve_handle_request(request,search_dirs)
+                    except Exception as e:
+                        msg = "failed to handle request: {}: {}".format(type(e).__name__,str(e))
+                        utils.logging.log_error(LOG_PREFIX,"serve",msg)
+                        response = { "file": "", "status": "failed", "message": msg, "elapsed": 0.0 }
+                    stream.write(json.dumps(response)+"\n")
+                    stream.flush()
+            except Exception as e:
+                msg = "failed to answer request: {}: {}".format(type(e).__name__,str(e))
+                utils.logging.log_warning(LOG_PREFIX,"serve",msg)
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+    utils.logging.log_leave_function(LOG_PREFIX,"serve")
+
 def parse_raw_command_line_arguments():
     """
     Parse command line arguments before using argparse.
@@ -151,6 +743,8 @@ def parse_command_line_arguments():
     global LOG_PREFIX
     global PROFILING_ENABLE
     global PROFILING_OUTPUT_NUM_FUNCTIONS
+    global TRACE_FILE
+    global STREAM_LINEMAPS
     global ONLY_CREATE_GPUFORT_MODULE_FILES
     global SKIP_CREATE_GPUFORT_MODULE_FILES
     global ONLY_MODIFY_TRANSLATION_SOURCE
@@ -159,6 +753,10 @@ def parse_command_line_arguments():
     global POST_CLI_ACTIONS
     global PRETTIFY_MODIFIED_TRANSLATION_SOURCE
     global INCLUDE_DIRS
+    global BATCH_WORKER_POOL_SIZE
+    global SERVE_SOCKET_PATH
+    global CACHE_ENABLE
+    global CACHE_DIR
 
     # parse command line arguments
     parser = argparse.ArgumentParser(description="S2S translation tool for CUDA Fortran and Fortran+X")
@@ -172,6 +770,18 @@ def parse_command_line_arguments():
     parser.add_argument("-d","--search-dirs", dest="search_dirs", help="Module search dir. Alternative -I<path> can be used (multiple times).", nargs="*",  required=False, default=[], type=str)
     parser.add_argument("-w","--wrap-in-ifdef",dest="wrap_in_ifdef",action="store_true",help="Wrap converted lines into ifdef in host code.")
     parser.add_argument("-E","--dest-dialect",dest="destination_dialect",default=None,type=str,help="One of: {}".format(", ".join(scanner.SUPPORTED_DESTINATION_DIALECTS)))
+    parser.add_argument("-b","--batch",dest="batch",nargs="+",required=False,default=None,type=str,help="Translate multiple input files in one invocation. "+\
+            "Entries with prefix '@' are manifest files that list one input file per line. The index is only created once and shared by all files.")
+    parser.add_argument("-j","--jobs",dest="jobs",required=False,type=int,default=None,help="Number of worker processes in batch mode [default: (default) config value].")
+    parser.add_argument("--serve",dest="serve",nargs="?",required=False,default=None,const="",type=str,help="Run as daemon that keeps grammar, translator, and loaded GPUFORT module files in memory "+\
+            "and translates the files sent via 'gpufort-client' [default socket: (default) config value].")
+    parser.add_argument("--cache",dest="cache_enable",action="store_true",help="Cache translation outputs and restore them if input, config, and used GPUFORT modules did not change [default: (default) config value].")
+    parser.add_argument("--no-cache",dest="cache_disable",action="store_true",help="Do not use the translation cache [default: (default) config value].")
+    parser.add_argument("--cache-dir",dest="cache_dir",default=None,type=str,help="Directory of the translation cache [default: (default) config value].")
+    parser.add_argument("--symbol-db",dest="symbol_database",default=None,type=str,help="Also store the records of created GPUFORT module files in this SQLite file and take records of modules without module file from it; "+\
+      "see gpufort-symbols for queries [default: (default) indexer config value].")
+    parser.add_argument("--stream",dest="stream_linemaps",action="store_true",help="Stream the linemaps of the input files through indexer and scanner instead of creating them for the whole file first; "+\
+            "reduces peak memory for large files [default: (default) config value].")
     parser.add_argument("--gfortran_config",dest="print_gfortran_config",action="store_true",help="Print include and compile flags.")
     parser.add_argument("--cpp_config",dest="print_cpp_config",action="store_true",help="Print include and compile flags.")
     # config options: shadow arguments that are actually taken care of by raw argument parsing
@@ -200,6 +810,7 @@ def parse_command_line_arguments():
     group_developer.add_argument("--log-traceback",dest="log_traceback",required=False,action="store_true",help="Append gpufort traceback information to the log when encountering warning/error.")
     group_developer.add_argument("--prof",dest="profiling_enable",required=False,action="store_true",help="Profile gpufort.")
     group_developer.add_argument("--prof-num-functions",dest="profiling_num_functions",required=False,type=int,default=50,help="The number of python functions to include into the summary [default=50].")
+    group_developer.add_argument("--trace",dest="trace_file",required=False,type=str,default=None,help="Write a timeline of the pipeline phases, translated kernels, and file writes to this file (Chrome trace event JSON; view with chrome://tracing or ui.perfetto.dev).")
     group_developer.add_argument("--create-gpufort-headers",dest="create_gpufort_headers",action="store_true",help="Generate the GPUFORT header files.")
 
     parser.set_defaults(print_config_defaults=False,dump_index=False,\
@@ -208,7 +819,7 @@ def parse_command_line_arguments():
       emit_cpu_implementation=False,emit_debug_code=False,\
       create_gpufort_headers=False,print_gfortran_config=False,print_cpp_config=False,\
       only_create_gpufort_module_files=False,skip_create_gpufort_module_files=False,verbose=False,\
-      log_traceback=False,profiling_enable=False)
+      log_traceback=False,profiling_enable=False,cache_enable=False,cache_disable=False)
     args, unknown_args = parser.parse_known_args()
 
     ## Simple output commands
@@ -277,16 +888,49 @@ def parse_command_line_arguments():
         msg = "unknown arguments (may be used by registered actions): {}".format(" ".join(unknown_args))
         print("WARNING: "+msg,file=sys.stderr)
     # check if input is set
-    if args.input is None:
-        msg = "no input file"
-        print("ERROR: "+msg,file=sys.stderr)
-        sys.exit(2)
-    if args.input[0] != "/":
-        args.input = args.working_dir + "/" + args.input 
-    if not os.path.exists(args.input):
-        msg = "input file '{}' cannot be found".format(args.input)
-        print("ERROR: "+msg,file=sys.stderr)
-        sys.exit(2)
+    if args.serve != None:
+        if not len(args.serve):
+            args.serve = SERVE_SOCKET_PATH
+        args.serve = os.path.abspath(os.path.join(args.working_dir,args.serve))
+        if args.input != None or args.batch != None:
+            msg = "daemon mode (--serve) does not accept input files"
+            print("ERROR: "+msg,file=sys.stderr)
+            sys.exit(2)
+    elif args.batch != None:
+        if args.input != None:
+            args.batch.insert(0,args.input)
+        args.batch = _intrnl_read_batch_inputs(args.batch,args.working_dir)
+        if not len(args.batch):
+            msg = "no input files in batch"
+            print("ERROR: "+msg,file=sys.stderr)
+            sys.exit(2)
+        args.input = args.batch[0]
+    if args.serve == None:
+        if args.input is None:
+            msg = "no input file"
+            print("ERROR: "+msg,file=sys.stderr)
+            sys.exit(2)
+        if args.input[0] != "/":
+            args.input = args.working_dir + "/" + args.input 
+        if not os.path.exists(args.input):
+            msg = "input file '{}' cannot be found".format(args.input)
+            print("ERROR: "+msg,file=sys.stderr)
+            sys.exit(2)
+    if args.jobs != None:
+        if args.jobs < 1:
+            msg = "number of jobs must be at least 1"
+            print("ERROR: "+msg,file=sys.stderr)
+            sys.exit(2)
+        BATCH_WORKER_POOL_SIZE = args.jobs
+    # translation cache
+    if args.cache_enable:
+        CACHE_ENABLE = True
+    if args.cache_disable:
+        CACHE_ENABLE = False
+    if args.cache_dir != None:
+        CACHE_DIR = os.path.abspath(os.path.join(args.working_dir,args.cache_dir))
+    if args.symbol_database != None:
+        indexer.SYMBOL_DATABASE = os.path.abspath(os.path.join(args.working_dir,args.symbol_database))
     ## OVERWRITE CONFIG VALUES
     # parse file and create index in parallel
     if args.destination_dialect != None:
@@ -305,6 +949,8 @@ def parse_command_line_arguments():
         ONLY_EMIT_KERNELS = True
     if args.only_modify_translation_source:
         ONLY_MODIFY_TRANSLATION_SOURCE = True
+    if args.stream_linemaps:
+        STREAM_LINEMAPS = True
     # wrap modified lines in ifdef
     if args.wrap_in_ifdef:
         linemapper.LINE_GROUPING_WRAP_IN_IFDEF = True
@@ -321,6 +967,9 @@ def parse_command_line_arguments():
     if args.profiling_enable:
         PROFILING_ENABLE = True
         PROFILING_OUTPUT_NUM_FUNCTIONS = args.profiling_num_functions
+    # developer: tracing
+    if args.trace_file != None:
+        TRACE_FILE = args.trace_file
     # CUDA Fortran
     if args.cublasV2:
         scanner.CUBLAS_VERSION = 2
@@ -357,8 +1006,13 @@ if __name__ == "__main__":
                 action(args,unknown_args)
 
     # init logging
-    input_filepath = os.path.abspath(args.input)
-    log_filepath   = init_logging(input_filepath)
+    if args.serve != None:
+        log_filepath = init_logging(args.serve)
+    elif args.batch != None:
+        batch_hash   = hashlib.md5(":".join(args.batch).encode()).hexdigest()[0:8]
+        log_filepath = init_logging("batch-"+batch_hash)
+    else:
+        log_filepath = init_logging(os.path.abspath(args.input))
     
     # Update INCLUDE_DIRS from all sources    
     INCLUDE_DIRS += args.search_dirs
@@ -375,41 +1029,49 @@ if __name__ == "__main__":
     if one_or_more_search_dirs_not_found:
         sys.exit(2)
 
+    # configure fort2hip
+    if ONLY_EMIT_KERNELS_AND_LAUNCHERS:
+        fort2hip.EMIT_KERNEL_LAUNCHER = True
+    if ONLY_EMIT_KERNELS:
+        fort2hip.EMIT_KERNEL_LAUNCHER = False
+    if args.emit_cpu_implementation:
+        fort2hip.EMIT_CPU_IMPLEMENTATION = True
+    if args.emit_debug_code:
+        fort2hip.EMIT_DEBUG_CODE = True
+
+    # reuse the linemaps of included files and the index records of declarations across runs;
+    # the fingerprint must be computed after the config is complete; the files count towards CACHE_MAX_SIZE
+    if CACHE_ENABLE and linemapper.INCLUDE_CACHE_DIR == None:
+        __CACHE_TIERS["includes"] = _intrnl_config_fingerprint()
+        linemapper.INCLUDE_CACHE_DIR = utils.filecache.use_tier(CACHE_DIR,"includes",__CACHE_TIERS["includes"])
+    if CACHE_ENABLE and indexer.DECLARATION_CACHE_DIR == None:
+        __CACHE_TIERS["declarations"] = _intrnl_config_fingerprint()
+        indexer.DECLARATION_CACHE_DIR = utils.filecache.use_tier(CACHE_DIR,"declarations",__CACHE_TIERS["declarations"])
+
     # scanner must be invoked after index creation
     if PROFILING_ENABLE:
         profiler = cProfile.Profile()
         profiler.enable()
+    if TRACE_FILE != None:
+        if TRACE_FILE[0] != "/":
+            TRACE_FILE = args.working_dir + "/" + TRACE_FILE
+        utils.tracing.enable()
     #
-    linemaps = linemapper.read_file(input_filepath,defines)
-    index   = create_index(INCLUDE_DIRS,defines,input_filepath,linemaps)
-    if not ONLY_CREATE_GPUFORT_MODULE_FILES:
-        # configure fort2hip
-        if ONLY_EMIT_KERNELS_AND_LAUNCHERS:
-            fort2hip.EMIT_KERNEL_LAUNCHER = True
-        if ONLY_EMIT_KERNELS:
-            fort2hip.EMIT_KERNEL_LAUNCHER = False
-        if args.emit_cpu_implementation:
-            fort2hip.EMIT_CPU_IMPLEMENTATION = True
-        if args.emit_debug_code:
-            fort2hip.EMIT_DEBUG_CODE = True
-        stree   = scanner.parse_file(linemaps,index,input_filepath)    
- 
-        # extract kernels
-        if "hip" in scanner.DESTINATION_DIALECT: 
-            kernels_to_convert_to_hip = ["*"]
-        else:
-            kernels_to_convert_to_hip = scanner.KERNELS_TO_CONVERT_TO_HIP
-        fortran_module_filepath, main_hip_filepath =\
-          fort2hip.generate_hip_files(stree,index,kernels_to_convert_to_hip,input_filepath,\
-           generate_code=not ONLY_MODIFY_TRANSLATION_SOURCE)
-        # modify original file
-        if fortran_module_filepath != None:
-            preamble = "#include \"{}\"".format(\
-              os.path.basename(fortran_module_filepath))
-        else:
-            preamble = None
-        if not (ONLY_EMIT_KERNELS or ONLY_EMIT_KERNELS_AND_LAUNCHERS):
-            _intrnl_translate_source(input_filepath,stree,linemaps,index,preamble) 
+    if args.serve != None:
+        serve(args.serve,INCLUDE_DIRS)
+    elif args.batch != None:
+        num_workers = BATCH_WORKER_POOL_SIZE
+        if num_workers < 1:
+            num_workers = os.cpu_count()
+        statuses = run_batch(args.batch,INCLUDE_DIRS," ".join(defines),num_workers)
+        print_batch_report(statuses)
+        batch_failed = len([status for status in statuses if status["status"] != "ok"]) > 0
+    else:
+        input_filepath = os.path.abspath(args.input)
+        linemaps = _intrnl_read_file(input_filepath," ".join(defines))
+        index   = create_index(INCLUDE_DIRS,defines,input_filepath,linemaps)
+        if not ONLY_CREATE_GPUFORT_MODULE_FILES:
+            translate_file(input_filepath,linemaps,index," ".join(defines))
     #
     if PROFILING_ENABLE:
         profiler.disable() 
@@ -418,8 +1080,14 @@ if __name__ == "__main__":
         stats = pstats.Stats(profiler, stream=s).sort_stats(sortby)
         stats.print_stats(PROFILING_OUTPUT_NUM_FUNCTIONS)
         print(s.getvalue())
+    if TRACE_FILE != None:
+        utils.tracing.write_trace(TRACE_FILE)
+        msg = "trace file: {0}".format(TRACE_FILE)
+        utils.logging.log_info(LOG_PREFIX,"__main__",msg)
 
     # shutdown logging
     msg = "log file:   {0} (log level: {1}) ".format(log_filepath,LOG_LEVEL)
     utils.logging.log_info(LOG_PREFIX,"__main__",msg)
-    utils.logging.shutdown()
\ No newline at end of file
+    utils.logging.shutdown()
+    if args.batch != None and batch_failed:
+        sys.exit(1)
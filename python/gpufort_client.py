@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Thin client for a GPUFORT daemon started via 'gpufort --serve'.
+
+Sends a single translation request to the daemon and mirrors its result
+via the exit code. Only depends on the python standard library so that
+it starts quickly.
+"""
+import os, sys
+import argparse
+import json
+import socket
+
+DEFAULT_SOCKET_PATH = "/tmp/gpufort/gpufort.sock" # see SERVE_SOCKET_PATH in gpufort_options.py.in
+
+def send_request(socket_path,request):
+    """
+    Send a request to the daemon and return its response.
+
+    :param str socket_path: Path of the daemon's Unix domain socket.
+    :param dict request: Request with entry 'command' ('translate', 'ping', 'shutdown').
+    :return: Status record with entries 'file', 'status', 'message', 'elapsed'.
+    :throws: OSError if the daemon cannot be reached.
+    """
+    with socket.socket(socket.AF_UNIX,socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile("rw") as stream:
+            stream.write(json.dumps(request)+"\n")
+            stream.flush()
+            return json.loads(stream.readline())
+
+def parse_command_line_arguments():
+    defines      = []
+    include_dirs = []
+    for opt in list(sys.argv[1:]):
+        if opt.startswith("-I"):
+            include_dirs.append(opt[2:])
+            sys.argv.remove(opt)
+        elif opt.startswith("-D"):
+            defines.append(opt)
+            sys.argv.remove(opt)
+    parser = argparse.ArgumentParser(description="Client for a GPUFORT daemon (see: gpufort --serve)")
+    parser.add_argument("input",help="The input file.",type=str,nargs="?",default=None)
+    parser.add_argument("--socket",dest="socket_path",default=os.environ.get("GPUFORT_SOCKET",DEFAULT_SOCKET_PATH),type=str,\
+      help="Socket of the daemon [default: environment variable GPUFORT_SOCKET or '{}'].".format(DEFAULT_SOCKET_PATH))
+    parser.add_argument("--working-dir",dest="working_dir",default=os.getcwd(),type=str,help="Set working directory.")
+    parser.add_argument("-d","--search-dirs",dest="search_dirs",help="Module search dir. Alternative -I<path> can be used (multiple times).",nargs="*",required=False,default=[],type=str)
+    parser.add_argument("--ping",dest="ping",action="store_true",help="Check if the daemon is running.")
+    parser.add_argument("--shutdown",dest="shutdown",action="store_true",help="Stop the daemon.")
+    args = parser.parse_args()
+    if args.input is None and not (args.ping or args.shutdown):
+        msg = "no input file"
+        print("ERROR: "+msg,file=sys.stderr)
+        sys.exit(2)
+    return args, defines, include_dirs
+
+if __name__ == "__main__":
+    args, defines, include_dirs = parse_command_line_arguments()
+    if args.shutdown:
+        request = { "command": "shutdown" }
+    elif args.ping:
+        request = { "command": "ping" }
+    else:
+        request = {
+          "command": "translate",
+          "input": args.input,
+          "working_dir": os.path.abspath(args.working_dir),
+          "defines": defines,
+          "search_dirs": args.search_dirs + include_dirs,
+        }
+    try:
+        response = send_request(args.socket_path,request)
+    except OSError as e:
+        msg = "could not connect to GPUFORT daemon via socket '{}': {}".format(args.socket_path,str(e))
+        print("ERROR: "+msg,file=sys.stderr)
+        sys.exit(3)
+    if response["status"] != "ok":
+        print("ERROR: {}: {}".format(response["file"],response["message"]),file=sys.stderr)
+        sys.exit(1)
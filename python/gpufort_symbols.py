@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Ad-hoc queries over a GPUFORT symbol database, see indexer/symboldb.py.
+
+The database is filled by 'gpufort --symbol-db <file>' or by importing
+existing GPUFORT module files via the 'import' command. Does not load
+the translator so that it starts quickly.
+"""
+import os, sys
+import argparse
+import json
+
+# local imports
+import addtoplevelpath
+import indexer.modulefile as modulefile
+import indexer.symboldb as symboldb
+
+GPUFORT_MODULE_FILE_SUFFIX = ".gpufort_mod" # see indexer_options.py.in
+
+def parse_command_line_arguments():
+    parser = argparse.ArgumentParser(description="Query a GPUFORT symbol database (see: gpufort --symbol-db)")
+    parser.add_argument("database",help="The SQLite file.",type=str)
+    parser.add_argument("--working-dir",dest="working_dir",default=os.getcwd(),type=str,help="Set working directory.")
+    commands = parser.add_subparsers(dest="command",metavar="command")
+    commands.required = True
+    command_import = commands.add_parser("import",help="Store the records of GPUFORT module files; only changed records are replaced.")
+    command_import.add_argument("inputs",help="Module files or directories containing module files.",nargs="+",type=str)
+    command_remove = commands.add_parser("remove",help="Remove the named records.")
+    command_remove.add_argument("names",help="Names of modules, programs, or top-level subprograms.",nargs="+",type=str)
+    commands.add_parser("modules",help="List the stored modules, programs, and top-level subprograms.")
+    command_defines = commands.add_parser("defines",help="List the modules that declare the named entry in their specification part.")
+    command_defines.add_argument("name",type=str)
+    command_defines.add_argument("--entry-type",dest="entry_type",default="variables",choices=modulefile.ENTRY_TYPES,\
+      help="Type of the entry [default: variables].")
+    for name, help_text in [("variables","Find variables."),("types","Find derived types."),("subprograms","Find subroutines and functions.")]:
+        command = commands.add_parser(name,help=help_text)
+        command.add_argument("--name",dest="name",default=None,type=str)
+        command.add_argument("--module",dest="module",default=None,type=str,help="Only consider this module, program, or top-level subprogram.")
+        command.add_argument("--top-level",dest="top_level",action="store_true",help="Only consider entries of the specification part of modules, programs, and top-level subprograms.")
+        command.add_argument("--json",dest="json",action="store_true",help="Print the matching index records as JSON.")
+        if name == "variables":
+            command.add_argument("--type",dest="f_type",default=None,type=str,help="Fortran type, e.g. 'real' or 'type'.")
+            command.add_argument("--kind",dest="kind",default=None,type=str,help="Kind, or the name of the derived type if the type is 'type'.")
+            command.add_argument("--qualifier",dest="qualifier",default=None,type=str,help="Qualifier, e.g. 'device', 'pointer', 'allocatable'.")
+            command.add_argument("--min-rank",dest="min_rank",default=None,type=int,help="Minimum rank, e.g. 1 for arrays.")
+        elif name == "subprograms":
+            command.add_argument("--kind",dest="kind",default=None,choices=["subroutine","function"])
+            command.add_argument("--attribute",dest="attribute",default=None,type=str,help="Attribute, e.g. 'global', 'device', 'host'.")
+    return parser.parse_args()
+
+def import_module_files(database,inputs):
+    """:return: Number of inserted or replaced records."""
+    records = []
+    for path in inputs:
+        if os.path.isdir(path):
+            filepaths = [os.path.join(path,child) for child in sorted(os.listdir(path)) if child.endswith(GPUFORT_MODULE_FILE_SUFFIX)]
+        else:
+            filepaths = [path]
+        for filepath in filepaths:
+            records.append(modulefile.ModuleRecord(filepath,os.path.basename(filepath)[0:-len(GPUFORT_MODULE_FILE_SUFFIX)]))
+    return symboldb.upsert_records(database,records)
+
+def print_results(results,print_json):
+    if print_json:
+        print(json.dumps(results,indent=2))
+    else:
+        for result in results:
+            print("{}\t{}".format(result["parent_tag"],result["record"]["name"]))
+
+if __name__ == "__main__":
+    args     = parse_command_line_arguments()
+    database = os.path.abspath(os.path.join(args.working_dir,args.database))
+    if args.command != "import" and not os.path.exists(database):
+        msg = "symbol database '{}' does not exist".format(database)
+        print("ERROR: "+msg,file=sys.stderr)
+        sys.exit(2)
+    if args.command == "import":
+        inputs = [os.path.join(args.working_dir,path) for path in args.inputs]
+        for path in inputs:
+            if not os.path.exists(path):
+                msg = "input '{}' does not exist".format(path)
+                print("ERROR: "+msg,file=sys.stderr)
+                sys.exit(2)
+        print("updated {} records".format(import_module_files(database,inputs)))
+    elif args.command == "remove":
+        symboldb.delete_records(database,args.names)
+    elif args.command == "modules":
+        for name, kind in symboldb.list_records(database):
+            print("{}\t{}".format(name,kind))
+    elif args.command == "defines":
+        for name in symboldb.find_defining_modules(database,args.entry_type,args.name):
+            print(name)
+    elif args.command == "variables":
+        print_results(symboldb.find_variables(database,args.name,args.f_type,args.kind,args.qualifier,args.min_rank,\
+          args.module,args.top_level),args.json)
+    elif args.command == "types":
+        print_results(symboldb.find_types(database,args.name,args.module,args.top_level),args.json)
+    else:
+        print_results(symboldb.find_subprograms(database,args.name,args.kind,args.attribute,\
+          args.module,args.top_level),args.json)
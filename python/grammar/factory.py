@@ -0,0 +1,53 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Builds the variants of the GPUFORT grammar lazily and caches them per process.
+grammar.py is compiled once per process; each variant is built when it is requested
+for the first time and then reused by later requests for the same variant.
+
+Usage from a component module:
+
+  globals().update(grammar.factory.get_grammar("translator",caseless=True))
+
+:note: pyparsing parse actions are attached to the grammar elements themselves.
+       The indexer, scanner, and translator attach different parse actions to the same elements
+       and thus request different variants via the 'consumer' argument; each of them
+       builds its own variant. A variant always contains the elements of all dialects,
+       independent of scanner.SOURCE_DIALECTS.
+"""
+import os
+import time
+
+GRAMMAR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+__GRAMMAR_CODE = None # compiled grammar.py
+__GRAMMARS     = {}   # (consumer,caseless) -> namespace
+
+BUILD_TIMES = {} # (consumer,caseless) -> time in seconds it took to build the variant
+
+def _intrnl_compile_grammar():
+    global __GRAMMAR_CODE
+    if __GRAMMAR_CODE == None:
+        filepath = os.path.join(GRAMMAR_DIR,"grammar.py")
+        with open(filepath,"r") as infile:
+            __GRAMMAR_CODE = compile(infile.read(),filepath,"exec")
+    return __GRAMMAR_CODE
+
+def get_grammar(consumer,caseless=False):
+    """
+    :param str consumer: Name of the component that uses the variant.
+    :param bool caseless: If keywords should be matched case-insensitively.
+    :return: dict with the grammar elements, helper functions and (star-imported) pyparsing
+             and CUDA Fortran names of the variant. Names with leading '__' are excluded.
+    :note: The variant is built when it is requested for the first time.
+    """
+    global __GRAMMARS
+    global BUILD_TIMES
+    key = (consumer,caseless)
+    if key not in __GRAMMARS:
+        start = time.time()
+        namespace = { "CASELESS": caseless, "GRAMMAR_DIR": GRAMMAR_DIR }
+        exec(_intrnl_compile_grammar(),namespace)
+        __GRAMMARS[key]  = { name: value for name, value in namespace.items() if not name.startswith("__") }
+        BUILD_TIMES[key] = time.time() - start
+    return __GRAMMARS[key]
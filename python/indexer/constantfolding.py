@@ -0,0 +1,248 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Evaluation of Fortran constant expressions, e.g. the right-hand sides of parameter declarations,
+array bounds, and kinds.
+
+Supports integer and real literals (with kind suffix and exponent letters 'e' and 'd'),
+named constants via a lookup function, unary and binary '+', '-', '*', '/', '**' with Fortran
+precedence and integer semantics, and the intrinsics in INTRINSICS. Expressions that contain
+anything else, e.g. variables that are not constant, are not folded.
+"""
+import re
+
+import addtoplevelpath
+import utils.logging
+
+LOG_PREFIX = "indexer.constantfolding"
+
+__TOKEN = re.compile(r"\s*(?:(?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eEdD][+-]?\d+)?(?:_\w+)?)|(?P<name>[a-zA-Z]\w*)|(?P<op>\*\*|[-+*/(),=]))")
+
+class _NotConstant(Exception):
+    pass
+
+def _intrnl_tokenize(expression):
+    """:return: List of pairs of token kind ('number','name','op') and token; names in lower case."""
+    global __TOKEN
+    tokens = []
+    pos    = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = __TOKEN.match(expression,pos)
+        if not match:
+            raise _NotConstant(expression[pos:])
+        kind = match.lastgroup
+        tokens.append((kind,match.group(kind).lower() if kind == "name" else match.group(kind)))
+        pos = match.end()
+    return tokens
+
+def _intrnl_literal(token,lookup):
+    """:return: Pair of value and kind of an integer or real literal."""
+    text, _, suffix = token.partition("_")
+    is_real = "." in text or any(c in text for c in "eEdD")
+    if len(suffix):
+        kind = int(suffix) if suffix.isdigit() else lookup(suffix.lower())
+        if not isinstance(kind,int):
+            raise _NotConstant(token)
+    else:
+        kind = 8 if "d" in text.lower() else 4
+    if is_real:
+        return float(text.lower().replace("d","e")), kind
+    return int(text), kind
+
+def _intrnl_int(value):
+    if not isinstance(value,(int,float)):
+        raise _NotConstant(value)
+    return int(value) # truncates toward zero like Fortran
+
+def _intrnl_divide(a,b):
+    if b == 0:
+        raise _NotConstant("division by zero")
+    if isinstance(a,int) and isinstance(b,int):
+        quotient = abs(a) // abs(b)
+        return quotient if (a < 0) == (b < 0) else -quotient
+    return a / b
+
+def _intrnl_power(a,b):
+    if isinstance(a,int) and isinstance(b,int) and b < 0:
+        if a in [1,-1]:
+            return a**(-b)
+        raise _NotConstant("negative integer exponent")
+    return a**b
+
+def selected_real_kind(p=0,r=0,radix=2):
+    """:return: Kind of the real type with at least decimal precision p and exponent range r, see gfortran; -1 to -3 if there is none."""
+    for kind, precision, exponent_range in [(4,6,37),(8,15,307),(10,18,4931),(16,33,4931)]:
+        if p <= precision and r <= exponent_range:
+            return kind
+    return -3 if p > 33 and r > 4931 else (-1 if p > 33 else -2)
+
+def selected_int_kind(r):
+    """:return: Kind of the integer type that can represent all values in (-10**r,10**r), see gfortran; -1 if there is none."""
+    for kind, exponent_range in [(1,2),(2,4),(4,9),(8,18),(16,38)]:
+        if r <= exponent_range:
+            return kind
+    return -1
+
+def _intrnl_mod(a,p):
+    return a - _intrnl_int(_intrnl_divide(a,p))*p
+
+def _intrnl_modulo(a,p):
+    if p == 0:
+        raise _NotConstant("division by zero")
+    return a % p # sign of p like Fortran's modulo
+
+# name -> (function, names of the arguments); the functions take values
+INTRINSICS = {
+  "selected_real_kind": (selected_real_kind,["p","r","radix"]),
+  "selected_int_kind":  (selected_int_kind,["r"]),
+  "int":     (lambda a, kind=4: _intrnl_int(a),["a","kind"]),
+  "nint":    (lambda a, kind=4: _intrnl_int(a + (0.5 if a >= 0 else -0.5)),["a","kind"]),
+  "floor":   (lambda a, kind=4: _intrnl_int(a) - (1 if a < 0 and a != int(a) else 0),["a","kind"]),
+  "ceiling": (lambda a, kind=4: _intrnl_int(a) + (1 if a > 0 and a != int(a) else 0),["a","kind"]),
+  "real":    (lambda a, kind=4: float(a),["a","kind"]),
+  "dble":    (lambda a: float(a),["a"]),
+  "float":   (lambda a: float(a),["a"]),
+  "abs":     (abs,["a"]),
+  "mod":     (_intrnl_mod,["a","p"]),
+  "modulo":  (_intrnl_modulo,["a","p"]),
+  "min":     (min,None), # any number of arguments
+  "max":     (max,None),
+}
+
+class _Parser:
+    """Recursive-descent parser that evaluates the expression while parsing it."""
+    def __init__(self,tokens,lookup):
+        self.tokens = tokens
+        self.pos    = 0
+        self.lookup = lookup
+    def peek(self,offset=0):
+        return self.tokens[self.pos+offset] if self.pos+offset < len(self.tokens) else (None,None)
+    def take(self,expected=None):
+        token = self.peek()
+        if token[0] == None or (expected != None and token[1] != expected):
+            raise _NotConstant(expected)
+        self.pos += 1
+        return token
+    def expression(self):
+        sign = 1
+        if self.peek()[1] in ["+","-"]:
+            sign = -1 if self.take()[1] == "-" else 1
+        result = sign*self.term() if sign < 0 else self.term()
+        while self.peek()[1] in ["+","-"]:
+            operator = self.take()[1]
+            operand  = self.term()
+            result   = result + operand if operator == "+" else result - operand
+        return result
+    def term(self):
+        result = self.power()
+        while self.peek()[1] in ["*","/"]:
+            operator = self.take()[1]
+            operand  = self.power()
+            result   = result * operand if operator == "*" else _intrnl_divide(result,operand)
+        return result
+    def power(self):
+        base = self.primary()
+        if self.peek()[1] == "**":
+            self.take()
+            if self.peek()[1] in ["+","-"]: # e.g. 2**-1
+                sign = -1 if self.take()[1] == "-" else 1
+                return _intrnl_power(base,sign*self.power())
+            return _intrnl_power(base,self.power())
+        return base
+    def primary(self):
+        kind, token = self.take()
+        if kind == "number":
+            return _intrnl_literal(token,self.lookup)[0]
+        elif token == "(":
+            result = self.expression()
+            self.take(")")
+            return result
+        elif kind == "name":
+            if self.peek()[1] == "(":
+                return self.call(token)
+            value = self.lookup(token)
+            if not isinstance(value,(int,float)) or isinstance(value,bool):
+                raise _NotConstant(token)
+            return value
+        raise _NotConstant(token)
+    def call(self,name):
+        global INTRINSICS
+        self.take("(")
+        if name == "kind": # kind of a literal
+            kind, token = self.take()
+            if kind != "number":
+                raise _NotConstant(token)
+            self.take(")")
+            return _intrnl_literal(token,self.lookup)[1]
+        if name not in INTRINSICS:
+            raise _NotConstant(name)
+        function, arg_names = INTRINSICS[name]
+        args   = []
+        kwargs = {}
+        while True:
+            if self.peek()[0] == "name" and self.peek(1)[1] == "=":
+                arg_name = self.take()[1]
+                self.take("=")
+                if arg_names == None or arg_name not in arg_names:
+                    raise _NotConstant(arg_name)
+                kwargs[arg_name] = self.expression()
+            elif len(kwargs):
+                raise _NotConstant("positional argument after keyword argument")
+            else:
+                args.append(self.expression())
+            if self.peek()[1] != ",":
+                break
+            self.take(",")
+        self.take(")")
+        try:
+            return function(*args,**kwargs)
+        except (TypeError,ValueError,ZeroDivisionError,OverflowError) as e:
+            raise _NotConstant(str(e))
+
+def fold(expression,lookup=lambda name: None):
+    """
+    :param str expression: Fortran expression.
+    :param lookup: Function that returns the value of a named constant as int or float, or None.
+    :return: The value of the expression as int or float, or None if the expression is not constant.
+    """
+    global LOG_PREFIX
+    try:
+        parser = _Parser(_intrnl_tokenize(expression),lookup)
+        result = parser.expression()
+        if parser.pos != len(parser.tokens):
+            raise _NotConstant(parser.peek()[1])
+        return result
+    except _NotConstant as e:
+        utils.logging.log_debug3(LOG_PREFIX,"fold","expression '{}' is not constant: {}".format(expression,str(e)))
+        return None
+    except (OverflowError,ValueError,RecursionError):
+        return None
+
+def substitute(expression,lookup):
+    """
+    :return: The expression with all named constants that the lookup function knows replaced by their values;
+             other identifiers, e.g. those of variables or functions, are kept.
+    """
+    global __TOKEN
+    result = []
+    pos    = 0
+    while pos < len(expression):
+        match = __TOKEN.match(expression,pos)
+        if not match:
+            return expression
+        text = match.group(0)
+        if match.lastgroup == "name":
+            next_match = __TOKEN.match(expression,match.end())
+            is_call    = next_match != None and next_match.group(0).strip() == "("
+            value      = None if is_call else lookup(match.group("name").lower())
+            if isinstance(value,(int,float)) and not isinstance(value,bool):
+                text = text[0:len(text)-len(text.lstrip())] + to_str(value)
+        result.append(text)
+        pos = match.end()
+    return "".join(result)
+
+def to_str(value):
+    """:return: The value as string that is valid in Fortran and C expressions; negative numbers in parentheses."""
+    text = str(value) if isinstance(value,int) else repr(float(value))
+    return "("+text+")" if value < 0 else text
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Cache for the index records of variable declarations.
+
+An entry is keyed by the normalized declaration statement, see normalize, and
+stores the index records of the declared variables in serialized form.
+Stored records can thus not be modified; every lookup returns new records
+that the caller may modify, e.g. when applying attributes or directives.
+
+Entries are kept in memory (least recently used entries are dropped first) and,
+optionally, in a directory so that they can be reused across runs and by multiple processes.
+Entries in the directory are not invalidated; the directory must be changed
+if the translator or its configuration changes. Files in the directory are never removed
+by this module; gpufort stores them in its cache directory, see utils.filecache.evict.
+"""
+import os
+import hashlib
+import tempfile
+import threading
+
+import orjson
+
+import addtoplevelpath
+import utils.logging
+
+LOG_PREFIX = "indexer.declarationcache"
+
+__ENTRIES = {} # normalized statement -> serialized records, in least-recently-used order
+__LOCK    = threading.Lock()
+
+HITS   = 0
+MISSES = 0
+
+def normalize(statement):
+    """
+    :return: The statement in lower case with surrounding whitespace removed;
+             runs of whitespace are collapsed unless the statement contains a character literal.
+    :note: translator.parse_declaration converts the statement to lower case too.
+    """
+    statement = statement.lower()
+    if "'" in statement or '"' in statement:
+        return statement.strip()
+    return " ".join(statement.split())
+
+def _intrnl_disk_filepath(cache_dir,key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(cache_dir,digest[0:2],digest+".json")
+
+def lookup(statement,cache_dir=None):
+    """
+    :param str statement: The declaration statement.
+    :param str cache_dir: Directory of the on-disk tier or None.
+    :return: List of index records of the declared variables or None.
+    """
+    global __ENTRIES
+    global __LOCK
+    global HITS
+    global MISSES
+    key = normalize(statement)
+    with __LOCK:
+        data = __ENTRIES.pop(key,None)
+    if data == None and cache_dir != None:
+        try:
+            disk_filepath = _intrnl_disk_filepath(cache_dir,key)
+            with open(disk_filepath,"rb") as infile:
+                entry = orjson.loads(infile.read())
+            if entry["statement"] == key: # digest collision otherwise
+                data = orjson.dumps(entry["records"])
+                os.utime(disk_filepath) # mark as recently used, see utils.filecache.evict
+        except (OSError,ValueError,KeyError,TypeError):
+            data = None
+    with __LOCK:
+        if data == None:
+            MISSES += 1
+            return None
+        HITS += 1
+        __ENTRIES[key] = data # mark as recently used
+    return orjson.loads(data)
+
+def store(statement,records,max_entries,cache_dir=None):
+    """
+    :param list records: The index records of the declared variables; a copy is stored.
+    :param int max_entries: Maximum number of entries kept in memory.
+    """
+    global __ENTRIES
+    global __LOCK
+    key = normalize(statement)
+    try:
+        data = orjson.dumps(records)
+    except TypeError as e:
+        msg = "records of declaration '{}' are not cached: {}".format(statement,str(e))
+        utils.logging.log_debug2(LOG_PREFIX,"store",msg)
+        return
+    with __LOCK:
+        __ENTRIES[key] = data
+        while len(__ENTRIES) > max_entries:
+            __ENTRIES.pop(next(iter(__ENTRIES)))
+    if cache_dir != None:
+        disk_filepath = _intrnl_disk_filepath(cache_dir,key)
+        try:
+            os.makedirs(os.path.dirname(disk_filepath),exist_ok=True)
+            fd, tmp_filepath = tempfile.mkstemp(prefix=".tmp-",dir=os.path.dirname(disk_filepath))
+            with os.fdopen(fd,"wb") as outfile:
+                outfile.write(orjson.dumps({ "statement": key, "records": records }))
+            os.replace(tmp_filepath,disk_filepath) # concurrent writers are harmless
+        except OSError as e:
+            msg = "could not write cache entry for declaration '{}': {}".format(statement,str(e))
+            utils.logging.log_warning(LOG_PREFIX,"store",msg)
+
+def clear():
+    """Remove all in-memory entries."""
+    global __ENTRIES
+    global __LOCK
+    with __LOCK:
+        __ENTRIES.clear()
@@ -0,0 +1,141 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Module dependency graph of a set of Fortran files.
+
+Files are scheduled in topological waves: all files of a wave only use
+modules that are defined in files of earlier waves (or in GPUFORT module files that already exist).
+Files of the same wave can thus be indexed in parallel.
+"""
+import os
+import re
+
+import addtoplevelpath
+import utils.logging
+import indexer.indexer as indexer
+import indexer.scoper as scoper
+
+LOG_PREFIX = "indexer.dependencygraph"
+
+__MODULE_STATEMENT  = re.compile(r"^\s*module\s+(?!procedure\b)(\w+)\s*$",re.IGNORECASE)
+p_use_statement     = re.compile(r"^\s*use\b\s*(?:,\s*\w+\s*)?(?:::)?\s*(\w+)",re.IGNORECASE) # group 1: used module
+
+def scan_linemaps(linemaps):
+    """
+    Collect the modules that are defined and used in the active code regions of a file,
+    including the files it includes.
+
+    :return: dict with entries 'defined' (modules) and 'used' (modules not defined in the file).
+    """
+    defined = []
+    used    = []
+    def traverse_(linemaps):
+        for linemap in linemaps:
+            if linemap["is_active"]:
+                for statement in linemap["statements"]:
+                    for p_statement, names in [(__MODULE_STATEMENT,defined),(p_use_statement,used)]:
+                        match = p_statement.match(statement)
+                        if match:
+                            names.append(match.group(1).lower())
+                            break
+            traverse_(linemap["included_linemaps"])
+    traverse_(linemaps)
+    return { "defined": list(dict.fromkeys(defined)),
+             "used":    [name for name in dict.fromkeys(used) if name not in defined] }
+
+def create_dependency_graph(file_modules,search_dirs=[]):
+    """
+    :param dict file_modules: Maps file paths to the result of scan_linemaps.
+    :param list search_dirs: Directories with GPUFORT module files of modules that are not defined by any of the files.
+    :return: Tuple of the graph, which maps each file to the set of files it depends on,
+             and a dict that maps missing modules to the files that use them.
+    :note: Modules in scoper.MODULE_IGNORE_LIST are never reported as missing.
+    """
+    utils.logging.log_enter_function(LOG_PREFIX,"create_dependency_graph",\
+      {"num_files":len(file_modules),"search_dirs":",".join(search_dirs)})
+
+    definitions = {} # module name -> files
+    for filepath, modules in file_modules.items():
+        for name in modules["defined"]:
+            definitions.setdefault(name,[]).append(filepath)
+    for name, filepaths in definitions.items():
+        if len(filepaths) > 1:
+            msg = "module '{}' is defined in multiple files: {}".format(name,", ".join(filepaths))
+            utils.logging.log_warning(LOG_PREFIX,"create_dependency_graph",msg)
+    graph   = {}
+    missing = {}
+    for filepath, modules in file_modules.items():
+        graph[filepath] = set()
+        for name in modules["used"]:
+            if name in definitions:
+                graph[filepath].update(definitions[name])
+            elif name not in scoper.MODULE_IGNORE_LIST and\
+               not any(os.path.exists(os.path.join(search_dir,name+indexer.GPUFORT_MODULE_FILE_SUFFIX))\
+                       for search_dir in search_dirs):
+                missing.setdefault(name,[]).append(filepath)
+        graph[filepath].discard(filepath)
+
+    utils.logging.log_leave_function(LOG_PREFIX,"create_dependency_graph")
+    return graph, missing
+
+def find_cycle(graph):
+    """:return: A list of files that form a cycle, first file repeated at the end, or an empty list."""
+    visited = set()
+    for start in graph:
+        if start in visited:
+            continue
+        path    = []
+        on_path = {}
+        stack   = [(start,iter(sorted(graph[start])))]
+        visited.add(start)
+        on_path[start] = 0
+        path.append(start)
+        while len(stack):
+            node, children = stack[-1]
+            child = next(children,None)
+            if child == None:
+                stack.pop()
+                path.pop()
+                del on_path[node]
+            elif child in on_path:
+                return path[on_path[child]:] + [child]
+            elif child not in visited:
+                visited.add(child)
+                on_path[child] = len(path)
+                path.append(child)
+                stack.append((child,iter(sorted(graph[child]))))
+    return []
+
+def schedule_waves(graph):
+    """
+    Group the files into topological waves.
+
+    :return: Tuple of the list of waves (lists of files) and of a cycle (see find_cycle)
+             that prevented the files that are not part of any wave from being scheduled.
+    """
+    utils.logging.log_enter_function(LOG_PREFIX,"schedule_waves",{"num_files":len(graph)})
+
+    num_dependencies = { filepath: len(dependencies) for filepath, dependencies in graph.items() }
+    dependents       = { filepath: [] for filepath in graph }
+    for filepath, dependencies in graph.items():
+        for dependency in dependencies:
+            dependents[dependency].append(filepath)
+    waves = []
+    wave  = [filepath for filepath in graph if num_dependencies[filepath] == 0]
+    while len(wave):
+        waves.append(wave)
+        next_wave = []
+        for filepath in wave:
+            for dependent in dependents[filepath]:
+                num_dependencies[dependent] -= 1
+                if num_dependencies[dependent] == 0:
+                    next_wave.append(dependent)
+        wave = next_wave
+    cycle = []
+    if sum(len(wave) for wave in waves) < len(graph):
+        scheduled = set(filepath for wave in waves for filepath in wave)
+        cycle = find_cycle({ filepath: dependencies - scheduled for filepath, dependencies in graph.items()\
+                             if filepath not in scheduled })
+
+    utils.logging.log_leave_function(LOG_PREFIX,"schedule_waves")
+    return waves, cycle
@@ -4,19 +4,26 @@
 import addtoplevelpath
 import os,sys,subprocess
 import re
+import itertools
 import threading
+import multiprocessing
 import concurrent.futures
 
 import orjson
 
 import translator.translator as translator
+import indexer.modulefile as modulefile
+import indexer.symboldb as symboldb
+import indexer.declarationcache as declarationcache
+import indexer.scoper as scoper
+import grammar.factory
 import utils.logging
+import utils.fileutils
 
 GPUFORT_MODULE_FILE_SUFFIX=".gpufort_mod"
 
-CASELESS    = False
-GRAMMAR_DIR = os.path.join(os.path.dirname(__file__),"../grammar")
-exec(open("{0}/grammar.py".format(GRAMMAR_DIR)).read())
+# own grammar variant as parse actions are attached to the grammar elements
+globals().update(grammar.factory.get_grammar("indexer",caseless=False))
 
 # configurable parameters
 indexer_dir = os.path.dirname(__file__)
@@ -103,23 +110,93 @@ class __Node():
         return "{}: {}".format(self._name,self._data)
     __repr__ = __str__
 
-def _intrnl_parse_statements(file_statements,filepath):
+__MODULE_FILE_MANIFESTS = {} # directory -> (modification time, list of module names and file paths)
+__MODULE_FILE_MAPS      = {} # tuple of directories -> (modification times, module name -> file path)
+__MODULE_FILE_KINDS     = {} # file path -> (modification time, size, kind of the record)
+
+__DECLARATION_PARSER_POOL = None # pair of process pool for parsing declarations and id of the creating process; created on first use
+
+def _intrnl_parse_declaration_batch(batch):
+    """
+    Parse a batch of variable declarations; runs in a worker process.
+    :param list batch: Pairs of scope id and declaration statement.
+    :return: Pairs of scope id and the index records of the declared variables.
+    """
+    return [(scope_id,_intrnl_create_index_records_from_declaration(statement)) for scope_id, statement in batch]
+
+def _intrnl_create_index_records_from_declaration(statement):
+    """:return: Index records of the variables declared by the statement; looked up in the declaration cache first."""
+    global DECLARATION_CACHE_ENABLE
+    global DECLARATION_CACHE_MAX_ENTRIES
+    global DECLARATION_CACHE_DIR
+    if DECLARATION_CACHE_ENABLE:
+        records = declarationcache.lookup(statement,DECLARATION_CACHE_DIR)
+        if records != None:
+            return records
+    ttdeclaration = translator.parse_declaration(statement)
+    records       = translator.create_index_records_from_declaration(ttdeclaration)
+    if DECLARATION_CACHE_ENABLE:
+        declarationcache.store(statement,records,DECLARATION_CACHE_MAX_ENTRIES,DECLARATION_CACHE_DIR)
+    return records
+
+def _intrnl_get_declaration_parser_pool():
+    """
+    :note: Uses the 'fork' start method so that the workers inherit the grammar
+           and the config values.
+    """
+    global __DECLARATION_PARSER_POOL
     global PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE
-    global PARSE_VARIABLE_MODIFICATION_STATEMENTS_WORKER_POOL_SIZE 
+    if __DECLARATION_PARSER_POOL == None or __DECLARATION_PARSER_POOL[1] != os.getpid(): # not inherited from parent process
+        __DECLARATION_PARSER_POOL = (concurrent.futures.ProcessPoolExecutor(\
+          max_workers=PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE,\
+          mp_context=multiprocessing.get_context("fork")),os.getpid())
+    return __DECLARATION_PARSER_POOL[0]
+
+def _intrnl_parse_declarations(declarations):
+    """
+    Parse variable declarations and append the index records of the declared variables
+    to the 'variables' entry of the respective scope, in the order of the declarations.
+    Batches of declarations are distributed to a process pool if
+    PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE is greater than 1 and 
+    there is more than one batch.
 
+    :param list declarations: Pairs of the scope's index record and the declaration statement.
+    """
+    global PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE
+    global PARSE_VARIABLE_DECLARATIONS_BATCH_SIZE
+    
+    scopes = []
+    scope_ids = {}
+    batch = []
+    for scope, statement in declarations:
+        if id(scope) not in scope_ids:
+            scope_ids[id(scope)] = len(scopes)
+            scopes.append(scope)
+        batch.append((scope_ids[id(scope)],statement))
+    batch_size = max(1,PARSE_VARIABLE_DECLARATIONS_BATCH_SIZE)
+    batches    = [batch[i:i+batch_size] for i in range(0,len(batch),batch_size)]
+    try:
+        if PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE > 1 and len(batches) > 1:
+            utils.logging.log_debug(LOG_PREFIX,"_intrnl_parse_declarations","submit {} batches to process pool of size {}".format(\
+              len(batches),PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE))
+            results = _intrnl_get_declaration_parser_pool().map(_intrnl_parse_declaration_batch,batches)
+        else:
+            results = map(_intrnl_parse_declaration_batch,batches)
+        for result in results: # in order of submission
+            for scope_id, variables in result:
+                scopes[scope_id]["variables"] += variables
+    except Exception as e:
+        utils.logging.log_exception(LOG_PREFIX,"_intrnl_parse_declarations","failed: "+str(e))
+        sys.exit(2)
+
+def _intrnl_parse_statements(file_statements,filepath):
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_parse_statements",{"filepath":filepath})
     # Regex
     datatype_reg = Regex(r"\b(type\s*\(|character|integer|logical|real|complex|double\s+precision)\b")
 
     index = []
 
-    access_lock   = threading.Lock()
-    utils.logging.log_debug(LOG_PREFIX,"_intrnl_parse_statements","create thread pool of size {} for process variable declarations".format(\
-      PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE))
-    task_executor = concurrent.futures.ThreadPoolExecutor(\
-      max_workers=PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE)
-    # statistics
-    total_num_tasks = 0
+    declarations = [] # pairs of index record of parent node and statement; parsed after the file was parsed statement by statement
  
     def log_enter_job_or_task_(parent_node,msg):
         utils.logging.log_debug3(LOG_PREFIX,"_intrnl_parse_statements","[thread-id={3}][parent-node={0}:{1}] {2}".format(\
@@ -127,44 +204,20 @@ def _intrnl_parse_statements(file_statements,filepath):
               threading.get_ident()))
         
     def log_leave_job_or_task_(parent_node,msg):
-        utils.logging.log_debug2(LOG_PREFIX+"_intrnl_parse_statements","[thread-id={3}][parent-node={0}:{1}] {2}".format(\
+        utils.logging.log_debug2(LOG_PREFIX,"_intrnl_parse_statements","[thread-id={3}][parent-node={0}:{1}] {2}".format(\
               parent_node._kind, parent_node._name, msg,\
               threading.get_ident()))
     
-    def ParseDeclarationTask_(parent_node,input_text):
-        """
-        :note: the term 'task' should highlight that this is a function
-        that is directly submitted to a thread in the worker pool.
-        """
-        global LOG_PREFIX
-        nonlocal access_lock
-        msg = "begin to parse variable declaration '{}'".format(input_text)
-        log_enter_job_or_task_(parent_node, msg)
-        #
-        try:
-            ttdeclaration = translator.parse_declaration(input_text)
-            variables = translator.create_index_records_from_declaration(ttdeclaration)
-        except Exception as e:
-            utils.logging.log_exception(LOG_PREFIX,"_intrnl_parse_statements.ParseDeclarationTask_","failed: "+str(e))
-            sys.exit(2)
-        access_lock.acquire()
-        parent_node._data["variables"] += variables
-        access_lock.release()
-        #
-        msg = "parsed variable declaration '{}'".format(input_text)
-        log_leave_job_or_task_(parent_node, msg)
-    
     post_parsing_jobs = [] # jobs to run after the file was parsed statement by statement
     class ParseAttributesJob_:
         """
         :note: the term 'job' should highlight that an object of this class
-        is put into a list that is submitted to a worker thread pool at the end of the parsing.
+        is put into a list of jobs that are run in order after the declarations have been parsed.
         """
         def __init__(self,parent_node,input_text):
             self._parent_node = parent_node
             self._input_text  = input_text
         def run(self):
-            nonlocal access_lock
             msg = "begin to parse attributes statement '{}'".format(self._input_text)
             log_enter_job_or_task_(self._parent_node, msg)
             #
@@ -172,22 +225,19 @@ def _intrnl_parse_statements(file_statements,filepath):
                 translator.parse_attributes(translator.attributes.parseString(self._input_text)[0])
             for var_context in self._parent_node._data["variables"]:
                 if var_context["name"] in modified_vars:
-                    access_lock.acquire()
                     var_context["qualifiers"].append(attribute)
-                    access_lock.release()
             #
             msg = "parsed attributes statement '{}'".format(self._input_text)
             log_leave_job_or_task_(self._parent_node, msg)
     class ParseAccDeclareJob_:
         """
         :note: the term 'job' should highlight that an object of this class
-        is put into a list that is submitted to a worker thread pool at the end of the parsing.
+        is put into a list of jobs that are run in order after the declarations have been parsed.
         """
         def __init__(self,parent_node,input_text):
             self._parent_node = parent_node
             self._input_text  = input_text
         def run(self):
-            nonlocal access_lock
             msg = "begin to parse acc declare directive '{}'".format(self._input_text)
             log_enter_job_or_task_(self._parent_node, msg)
             #
@@ -195,24 +245,16 @@ def _intrnl_parse_statements(file_statements,filepath):
             for var_context in self._parent_node._data["variables"]:
                 for var_name in parse_result.map_alloc_variables():
                     if var_context["name"] == var_name:
-                        access_lock.acquire()
                         var_context["declare_on_target"] = "alloc"
-                        access_lock.release()
                 for var_name in parse_result.map_to_variables():
-                    if var_context["name"] == var_name: 
-                        access_lock.acquire()
+                    if var_context["name"] == var_name:
                         var_context["declare_on_target"] = "to"
-                        access_lock.release()
                 for var_name in parse_result.map_from_variables():
-                    if var_context["name"] == var_name: 
-                        access_lock.acquire()
+                    if var_context["name"] == var_name:
                         var_context["declare_on_target"] = "from"
-                        access_lock.release()
                 for var_name in parse_result.map_tofrom_variables():
-                    if var_context["name"] == var_name: 
-                        access_lock.acquire()
+                    if var_context["name"] == var_name:
                         var_context["declare_on_target"] = "tofrom"
-                        access_lock.release()
             msg = "parsed acc declare directive '{}'".format(self._input_text)
             log_leave_job_or_task_(self._parent_node, msg)
 
@@ -356,13 +398,10 @@ def _intrnl_parse_statements(file_statements,filepath):
         nonlocal root
         nonlocal current_node
         nonlocal current_statement
-        nonlocal task_executor
-        nonlocal total_num_tasks
         #print(current_statement)
         log_detection_("declaration")
         if current_node != root:
-            total_num_tasks += 1
-            task_executor.submit(ParseDeclarationTask_,current_node,current_statement) 
+            declarations.append((current_node._data,current_statement))
     def Attributes(tokens):
         """
         Add attributes to previously declared variables in same scope/declaration list.
@@ -475,44 +514,78 @@ def _intrnl_parse_statements(file_statements,filepath):
                break
         #try_to_parse_string("declaration|type_start|use|attributes|module_start|program_start|function_start|subroutine_start",\
         #  datatype_reg|type_start|use|attributes|module_start|program_start|function_start|subroutine_start)
-    task_executor.shutdown(wait=True) # waits till all tasks have been completed
+    _intrnl_parse_declarations(declarations)
 
     # apply attributes and acc variable modifications
     num_post_parsing_jobs = len(post_parsing_jobs)
     if num_post_parsing_jobs > 0:
-        utils.logging.log_debug(LOG_PREFIX,"_intrnl_parse_statements","apply variable modifications (submit {} jobs to worker pool of size {})".format(\
-          num_post_parsing_jobs,PARSE_VARIABLE_MODIFICATION_STATEMENTS_WORKER_POOL_SIZE))
-        with concurrent.futures.ThreadPoolExecutor(\
-            max_workers=PARSE_VARIABLE_MODIFICATION_STATEMENTS_WORKER_POOL_SIZE)\
-                as job_executor:
-            for job in post_parsing_jobs:
-                job_executor.submit(job.run)
+        utils.logging.log_debug(LOG_PREFIX,"_intrnl_parse_statements","apply variable modifications ({} jobs)".format(\
+          num_post_parsing_jobs))
+        for job in post_parsing_jobs:
+            job.run()
         utils.logging.log_debug(LOG_PREFIX,"_intrnl_parse_statements","apply variable modifications --- done") 
         post_parsing_jobs.clear()
 
     utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_parse_statements") 
     return index
 
-def _intrnl_write_json_file(index,filepath):
+def _intrnl_write_module_file(record,filepath):
     global PRETTY_PRINT_INDEX_FILE
     global LOG_PREFIX    
-    utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_write_json_file",{"filepath":filepath}) 
+    utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_write_module_file",{"filepath":filepath}) 
     
-    with open(filepath,"wb") as outfile:
-         if PRETTY_PRINT_INDEX_FILE:
-             outfile.write(orjson.dumps(index,option=orjson.OPT_INDENT_2))
-         else:
-             outfile.write(orjson.dumps(index))
+    if PRETTY_PRINT_INDEX_FILE:
+        utils.fileutils.write_file_if_changed(filepath,orjson.dumps(record,option=orjson.OPT_INDENT_2))
+    else:
+        utils.fileutils.write_file_if_changed(filepath,modulefile.encode(record))
     
-    utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_write_json_file") 
+    utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_write_module_file") 
 
-def _intrnl_read_json_file(filepath):
-    global LOG_PREFIX    
-    utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_read_json_file",{"filepath":filepath}) 
-    
-    with open(filepath,"rb") as infile:
-         utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_read_json_file") 
-         return orjson.loads(infile.read())
+def _intrnl_list_module_files(input_dir):
+    """
+    :return: Module names and file paths of the GPUFORT module files in the directory.
+    :note: The listing is kept per directory and only renewed if the
+           directory's modification time changed, i.e. if files have been added, removed, or renamed.
+    """
+    global __MODULE_FILE_MANIFESTS
+    mtime_ns = os.stat(input_dir).st_mtime_ns
+    manifest = __MODULE_FILE_MANIFESTS.get(input_dir,None)
+    if manifest == None or manifest[0] != mtime_ns:
+        module_files = [(child[0:-len(GPUFORT_MODULE_FILE_SUFFIX)],os.path.join(input_dir,child))\
+                        for child in sorted(os.listdir(input_dir)) if child.endswith(GPUFORT_MODULE_FILE_SUFFIX)]
+        manifest = (mtime_ns,module_files)
+        __MODULE_FILE_MANIFESTS[input_dir] = manifest
+    return manifest[1]
+
+def _intrnl_get_module_file_map(input_dirs):
+    """
+    :return: dict that maps module names to the module file paths; if multiple directories
+             contain a module file with the same name, the first one is used.
+    :note: Kept per list of directories; renewed if a directory's manifest has been renewed.
+    """
+    global __MODULE_FILE_MAPS
+    key       = tuple(input_dirs)
+    manifests = [_intrnl_list_module_files(input_dir) for input_dir in input_dirs]
+    cached    = __MODULE_FILE_MAPS.get(key,None)
+    if cached == None or len(cached[0]) != len(manifests) or\
+       any(cached_manifest is not manifest for cached_manifest,manifest in zip(cached[0],manifests)):
+        module_files = {}
+        for manifest in manifests:
+            for name, filepath in manifest:
+                module_files.setdefault(name,filepath)
+        cached = (manifests,module_files)
+        __MODULE_FILE_MAPS[key] = cached
+    return cached[1]
+
+def _intrnl_get_module_file_kind(filepath,name):
+    """:return: Kind of the record stored in the module file; only reads the header if the file changed."""
+    global __MODULE_FILE_KINDS
+    stat   = os.stat(filepath)
+    cached = __MODULE_FILE_KINDS.get(filepath,None)
+    if cached == None or cached[0:2] != (stat.st_mtime_ns,stat.st_size):
+        cached = (stat.st_mtime_ns,stat.st_size,modulefile.ModuleRecord(filepath,name)["kind"])
+        __MODULE_FILE_KINDS[filepath] = cached
+    return cached[2]
 
 # API
 def scan_file(filepath,preproc_options,index):
@@ -530,55 +603,137 @@ def scan_file(filepath,preproc_options,index):
     utils.logging.log_leave_function(LOG_PREFIX,"scan_file") 
 
 def update_index_from_linemaps(linemaps,index):
-    """Updates index from a number of linemaps."""
+    """Updates index from a number of linemaps.
+    :param linemaps: A list or any other iterable of linemaps, e.g. the generator returned by linemapper.iterate_file.
+                     The linemaps are traversed only once.
+    """
     global LOG_PREFIX
     utils.logging.log_enter_function(LOG_PREFIX,"update_index_from_linemaps") 
     
-    filtered_statements = _intrnl_collect_statements(linemaps)
-    utils.logging.log_debug2(LOG_PREFIX,"update_index_from_linemaps","extracted the following statements:\n>>>\n{}\n<<<".format(\
-        "\n".join(filtered_statements)))
-    if len(linemaps):
-        index += _intrnl_parse_statements(filtered_statements,filepath=linemaps[0]["file"])
+    linemaps      = iter(linemaps)
+    first_linemap = next(linemaps,None)
+    if first_linemap != None:
+        filtered_statements = _intrnl_collect_statements(itertools.chain([first_linemap],linemaps))
+        utils.logging.log_debug2(LOG_PREFIX,"update_index_from_linemaps","extracted the following statements:\n>>>\n{}\n<<<".format(\
+            "\n".join(filtered_statements)))
+        index += _intrnl_parse_statements(filtered_statements,filepath=first_linemap["file"])
     
     utils.logging.log_leave_function(LOG_PREFIX,"update_index_from_linemaps") 
 
-def write_gpufort_module_files(index,output_dir):
+def _intrnl_write_export_snapshots(index,output_dir,search_dirs):
+    """
+    Write the export snapshots of the modules in the index, whose module files have just been written.
+    The records of the used modules are loaded from the module files in the output and search directories.
+    """
+    global LOG_PREFIX
+    records = [modulefile.ModuleRecord(output_dir + "/" + mod["name"] + GPUFORT_MODULE_FILE_SUFFIX,mod["name"])\
+               for mod in index]
+    used_module_names = [name for mod in index for name in modulefile.collect_used_module_names(mod)]
+    load_used_gpufort_module_files(list(dict.fromkeys([output_dir]+search_dirs)),used_module_names,records)
+    modules = [record for record in records[0:len(index)] if record["kind"] == "module"]
+    for record, snapshot in zip(modules,scoper.create_export_snapshots(records,modules)):
+        utils.fileutils.write_file_if_changed(record.exports_filepath(),modulefile.encode(snapshot))
+        utils.logging.log_debug2(LOG_PREFIX,"_intrnl_write_export_snapshots",\
+          "write export snapshot '{}'".format(record.exports_filepath()))
+
+def write_gpufort_module_files(index,output_dir,search_dirs=[]):
     """
     Per module / program found in the index
-    write a GPUFORT module file.
+    write a GPUFORT module file. If SYMBOL_DATABASE is set, the records
+    are stored in the symbol database too. If WRITE_EXPORT_SNAPSHOTS is set,
+    an export snapshot is written per module too, see scoper.create_export_snapshots.
     
     :param list index:    [in] Empty or non-empty list.
     :param str output_dir: [in] Output directory.
+    :param list search_dirs: [in] Directories with the module files of the used modules, only needed for export snapshots.
     """
     global LOG_PREFIX
+    global SYMBOL_DATABASE
+    global WRITE_EXPORT_SNAPSHOTS
     utils.logging.log_enter_function(LOG_PREFIX,"write_gpufort_module_files",{"output_dir":output_dir})
     
     for mod in index:
         filepath = output_dir + "/" + mod["name"] + GPUFORT_MODULE_FILE_SUFFIX
-        _intrnl_write_json_file(mod,filepath)
+        _intrnl_write_module_file(mod,filepath)
+    if SYMBOL_DATABASE != None:
+        symboldb.upsert_records(SYMBOL_DATABASE,index)
+    if WRITE_EXPORT_SNAPSHOTS:
+        _intrnl_write_export_snapshots(index,output_dir,search_dirs)
     
     utils.logging.log_leave_function(LOG_PREFIX,"write_gpufort_module_files")
 
 def load_gpufort_module_files(input_dirs,index):
     """
-    Load gpufort module files and append to the index.
+    Append records for the gpufort module files to the index.
+    A module file is only read when its record is accessed beyond its name,
+    see modulefile.ModuleRecord. If multiple directories contain a module file with the same name,
+    the first one is used. If SYMBOL_DATABASE is set, records of the database without module file
+    are appended too, see symboldb.DatabaseRecord.
 
     :param list input_dirs: [in] List of input directories (as strings).
     :param list index:     [inout] Empty or non-empty list. Loaded data structure is appended.
     """
     global LOG_PREFIX
+    global SYMBOL_DATABASE
     utils.logging.log_enter_function(LOG_PREFIX,"load_gpufort_module_files",{"input_dirs":",".join(input_dirs)})
     
+    names = set(mod["name"] for mod in index)
     for input_dir in input_dirs:
-         for child in os.listdir(input_dir):
-             if child.endswith(GPUFORT_MODULE_FILE_SUFFIX):
-                 module_already_exists = False
-                 for mod in index:
-                     if mod == child.replace(GPUFORT_MODULE_FILE_SUFFIX,""):
-                         module_already_exists = True
-                         break
-                 if not module_already_exists:
-                     mod_index = _intrnl_read_json_file(os.path.join(input_dir, child))
-                     index.append(mod_index)
+         for name, filepath in _intrnl_list_module_files(input_dir):
+             if name not in names:
+                 names.add(name)
+                 index.append(modulefile.ModuleRecord(filepath,name))
+    if SYMBOL_DATABASE != None:
+        index += [mod for mod in symboldb.load_records(SYMBOL_DATABASE) if mod["name"] not in names]
+    
+    utils.logging.log_leave_function(LOG_PREFIX,"load_gpufort_module_files")
+
+def load_used_gpufort_module_files(input_dirs,names,index):
+    """
+    Append records for the gpufort module files of the named program units and of
+    all modules that these (transitively) use to the index.
+    Records of top-level subroutines and functions are appended too as they can be called
+    without a 'use' statement. Modules without module file are skipped; modules in scoper.MODULE_IGNORE_LIST
+    are loaded like the others if there is a module file as the scoper and fort2hip use their records.
+    If multiple directories contain a module file with the same name, the first one is used.
+    If SYMBOL_DATABASE is set, records of modules without module file are taken from the database.
+
+    :param list input_dirs: [in] List of input directories (as strings).
+    :param list names:     [in] Names of the program units, typically those of the translated file.
+    :param list index:     [inout] Empty or non-empty list. Loaded data structure is appended.
+    :see: load_gpufort_module_files
+    """
+    global LOG_PREFIX
+    global SYMBOL_DATABASE
+    utils.logging.log_enter_function(LOG_PREFIX,"load_used_gpufort_module_files",\
+      {"input_dirs":",".join(input_dirs),"names":",".join(names)})
+    
+    module_files   = _intrnl_get_module_file_map(input_dirs)
+    stored_records = dict(symboldb.list_records(SYMBOL_DATABASE)) if SYMBOL_DATABASE != None else {} # name -> kind
+    num_records    = len(index)
+    loaded         = set(mod["name"] for mod in index)
+    pending        = list(reversed(names))
+    while len(pending):
+        name = pending.pop()
+        if name not in loaded:
+            if name in module_files:
+                mod = modulefile.ModuleRecord(module_files[name],name)
+            elif name in stored_records:
+                mod = symboldb.DatabaseRecord(SYMBOL_DATABASE,name)
+            else:
+                continue
+            loaded.add(name)
+            index.append(mod)
+            pending += reversed(mod.used_module_names())
+    for name, filepath in module_files.items():
+        if name not in loaded and _intrnl_get_module_file_kind(filepath,name) in ["subroutine","function"]:
+            loaded.add(name)
+            index.append(modulefile.ModuleRecord(filepath,name))
+    for name, kind in stored_records.items():
+        if name not in loaded and kind in ["subroutine","function"]:
+            loaded.add(name)
+            index.append(symboldb.DatabaseRecord(SYMBOL_DATABASE,name))
+    utils.logging.log_debug(LOG_PREFIX,"load_used_gpufort_module_files","loaded {} of {} module files".format(\
+      len(index)-num_records,len(module_files)))
     
-    utils.logging.log_leave_function(LOG_PREFIX,"load_gpufort_module_files")
\ No newline at end of file
+    utils.logging.log_leave_function(LOG_PREFIX,"load_used_gpufort_module_files")
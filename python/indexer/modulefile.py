@@ -0,0 +1,235 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Binary GPUFORT module files.
+
+A module file stores the index record of a single module, program, or top-level subprogram.
+It starts with a fixed-size preamble (magic bytes, format version, length of the fields,
+length of the table of contents), followed by
+
+* the fields of the record, i.e. all entries except the entry lists in ENTRY_TYPES, as JSON,
+* the table of contents as JSON, which maps each entry list to its location in the data section
+  and to the name and location of each of its entries; entry 'used_module_names' lists
+  the names of the modules used by the record and its (nested) subprograms,
+* the data section, which stores each entry list as JSON array.
+
+An entry can thus be decoded without decoding the whole list.
+The data section is read via mmap.
+
+A ModuleRecord only knows its name when it is created. It reads the fields and the table of contents
+on first access of any other entry and an entry list on first access of the list.
+Files in the legacy format, a JSON dump of the whole record, are read as a whole on first access.
+"""
+import os, sys
+import mmap
+import struct
+import hashlib
+
+import orjson
+
+import addtoplevelpath
+import utils.logging
+
+LOG_PREFIX = "indexer.modulefile"
+
+ERR_MODULEFILE_VERSION_MISMATCH = 1101
+
+MAGIC       = b"GPUFMOD\0"
+VERSION     = 1
+ENTRY_TYPES = ["variables","types","subprograms"]
+
+EXPORTS_FILE_SUFFIX = ".gpufort_exports" # export snapshots, see scoper.create_export_snapshots
+
+__PREAMBLE = struct.Struct("<8sIII") # magic, version, length of fields, length of table of contents
+
+def collect_used_module_names(record):
+    """:return: Names of the modules used by the record and its (nested) subprograms, without duplicates."""
+    result = []
+    def collect_(record):
+        result.extend(used_module["name"] for used_module in record["used_modules"])
+        for subprogram in record.get("subprograms",[]):
+            collect_(subprogram)
+    collect_(record)
+    return list(dict.fromkeys(result))
+
+def encode(record):
+    """:return: The record in the binary module file format as bytes."""
+    global __PREAMBLE
+    fields = { key: value for key, value in record.items() if key not in ENTRY_TYPES }
+    toc    = {}
+    chunks = []
+    offset = 0
+    def append_(chunk):
+        nonlocal offset
+        chunks.append(chunk)
+        offset += len(chunk)
+    for entry_type in ENTRY_TYPES:
+        if entry_type in record:
+            begin   = offset
+            entries = []
+            append_(b"[")
+            for i, entry in enumerate(record[entry_type]):
+                if i > 0:
+                    append_(b",")
+                data = orjson.dumps(entry)
+                entries.append([entry["name"],offset,len(data)])
+                append_(data)
+            append_(b"]")
+            toc[entry_type] = [begin,offset-begin,entries]
+    toc["used_module_names"] = collect_used_module_names(record)
+    fields_data = orjson.dumps(fields)
+    toc_data    = orjson.dumps(toc)
+    return b"".join([__PREAMBLE.pack(MAGIC,VERSION,len(fields_data),len(toc_data)),fields_data,toc_data]+chunks)
+
+def _intrnl_read_header(filepath):
+    """
+    :return: Tuple of the fields, the undecoded table of contents, the offset of the data section,
+             and the modification time and size of the file; only the fields if the file
+             uses the legacy format.
+    """
+    global __PREAMBLE
+    global LOG_PREFIX
+    with open(filepath,"rb") as infile:
+        stat     = os.fstat(infile.fileno())
+        preamble = infile.read(__PREAMBLE.size)
+        if not preamble.startswith(MAGIC):
+            utils.logging.log_debug2(LOG_PREFIX,"_intrnl_read_header","read legacy module file '{}'".format(filepath))
+            return orjson.loads(preamble + infile.read()), None, None, None
+        _, version, fields_length, toc_length = __PREAMBLE.unpack(preamble)
+        if version != VERSION:
+            msg = "module file '{}' has format version {} but version {} is expected; regenerate the module file".format(\
+              filepath,version,VERSION)
+            utils.logging.log_error(LOG_PREFIX,"_intrnl_read_header",msg)
+            sys.exit(ERR_MODULEFILE_VERSION_MISMATCH)
+        fields   = orjson.loads(infile.read(fields_length))
+        toc_data = infile.read(toc_length)
+    return fields, toc_data, __PREAMBLE.size+fields_length+toc_length, (stat.st_mtime_ns,stat.st_size)
+
+def _intrnl_read_ranges(filepath,ranges):
+    """:return: The byte ranges, given as offset and length, of the memory-mapped file."""
+    with open(filepath,"rb") as infile,\
+         mmap.mmap(infile.fileno(),0,access=mmap.ACCESS_READ) as data:
+        return [data[offset:offset+length] for offset, length in ranges]
+
+class ModuleRecord(dict):
+    """
+    Index record that is loaded lazily from a module file.
+    Behaves like the dict that was written to the file; looking up,
+    iterating, comparing, or copying the record loads what is needed.
+    """
+    def __init__(self,filepath,name):
+        dict.__init__(self,name=name)
+        self.filepath           = filepath
+        self._toc               = None # None: header not read yet
+        self._toc_data          = None
+        self._used_module_names = None
+        self._offset            = None
+        self._stat              = None
+        self._digest            = None # pair of modification time and size of the file, and digest
+    def _load_header(self):
+        if self._toc == None:
+            fields, self._toc_data, self._offset, self._stat = _intrnl_read_header(self.filepath)
+            dict.update(self,fields)
+            self._toc = {}
+    def _load_toc(self):
+        self._load_header()
+        if self._toc_data != None:
+            self._toc      = orjson.loads(self._toc_data)
+            self._toc_data = None
+            self._used_module_names = self._toc.pop("used_module_names",None)
+    def _read_ranges(self,ranges):
+        stat = os.stat(self.filepath)
+        if (stat.st_mtime_ns,stat.st_size) != self._stat:
+            msg = "module file '{}' changed after its header has been read; reread the header".format(self.filepath)
+            utils.logging.log_warning(LOG_PREFIX,"ModuleRecord._read_ranges",msg)
+            _, toc_data, self._offset, self._stat = _intrnl_read_header(self.filepath)
+            self._toc = orjson.loads(toc_data)
+            self._used_module_names = self._toc.pop("used_module_names",None)
+        return _intrnl_read_ranges(self.filepath,[(self._offset+offset,length) for offset, length in ranges])
+    def _load_entries(self,entry_type):
+        self._load_toc()
+        if entry_type in self._toc and not dict.__contains__(self,entry_type):
+            offset, length, _ = self._toc[entry_type]
+            dict.__setitem__(self,entry_type,orjson.loads(self._read_ranges([(offset,length)])[0]))
+    def _load_all(self):
+        self._load_toc()
+        for entry_type in self._toc:
+            self._load_entries(entry_type)
+
+    def find_entries(self,entry_type,name):
+        """
+        :return: The entries of the given entry list with the given name.
+                 Only these entries are decoded if the list has not been loaded yet.
+        """
+        self._load_toc()
+        if dict.__contains__(self,entry_type) or entry_type not in self._toc:
+            return [entry for entry in self[entry_type] if entry["name"] == name]
+        ranges = [(offset,length) for entry_name, offset, length in self._toc[entry_type][2] if entry_name == name]
+        return [orjson.loads(data) for data in self._read_ranges(ranges)] if len(ranges) else []
+    def used_module_names(self):
+        """
+        :return: Names of the modules used by the record and its (nested) subprograms, see collect_used_module_names.
+                 Does not load the entry lists unless the file does not store the names.
+        """
+        self._load_toc()
+        if self._used_module_names == None:
+            self._used_module_names = collect_used_module_names(self)
+        return self._used_module_names
+    def digest(self):
+        """:return: Digest of the module file's content; does not load the record. Only recomputed if the file changed."""
+        with open(self.filepath,"rb") as infile:
+            stat = os.fstat(infile.fileno())
+            if self._digest == None or self._digest[0] != (stat.st_mtime_ns,stat.st_size):
+                self._digest = ((stat.st_mtime_ns,stat.st_size),hashlib.sha256(infile.read()).hexdigest())
+        return self._digest[1]
+    def exports_filepath(self):
+        """:return: Path of the export snapshot that belongs to the module file, see EXPORTS_FILE_SUFFIX."""
+        return os.path.splitext(self.filepath)[0] + EXPORTS_FILE_SUFFIX
+    def to_dict(self):
+        """:return: The fully loaded record as dict."""
+        self._load_all()
+        return dict(dict.items(self))
+
+    # dict interface
+    def __missing__(self,key):
+        self._load_header()
+        if not dict.__contains__(self,key):
+            self._load_entries(key)
+        if not dict.__contains__(self,key):
+            raise KeyError(key)
+        return dict.__getitem__(self,key)
+    def __contains__(self,key):
+        if dict.__contains__(self,key):
+            return True
+        self._load_toc()
+        return dict.__contains__(self,key) or key in self._toc
+    def get(self,key,default=None):
+        return self[key] if key in self else default
+    def keys(self):
+        self._load_all()
+        return dict.keys(self)
+    def values(self):
+        self._load_all()
+        return dict.values(self)
+    def items(self):
+        self._load_all()
+        return dict.items(self)
+    def __iter__(self):
+        self._load_all()
+        return dict.__iter__(self)
+    def __len__(self):
+        self._load_all()
+        return dict.__len__(self)
+    def __eq__(self,other):
+        if isinstance(other,ModuleRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+    def __ne__(self,other):
+        return not self == other
+    __hash__ = None
+    def copy(self):
+        return self.to_dict()
+    def __reduce_ex__(self,protocol):
+        return (dict,(self.to_dict(),))
+    def __repr__(self):
+        return "ModuleRecord({})".format(self.filepath)
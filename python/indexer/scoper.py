@@ -2,12 +2,16 @@
 # Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
 #!/usr/bin/env python3
 import addtoplevelpath
-import os,sys,traceback
+import os,sys
 import copy
 import re
+import collections
+import collections.abc
+import threading
+import hashlib
 
-import orjson
-
+import indexer.modulefile as modulefile
+import indexer.constantfolding as constantfolding
 import utils.logging
 import utils.parsingutils
 
@@ -56,71 +60,358 @@ EMPTY_SUBPROGRAM = {
   "used_modules" : []
 }
 
-EMPTY_SCOPE = { "tag": "", "types" : [], "variables" : [], "subprograms" : [] } 
-
 __SCOPE_ENTRY_TYPES = ["subprograms","variables","types"]
 
+__SCOPE_CACHE      = collections.OrderedDict() # (index generation, id of index, tag) -> (index, number of records, scope), in least-recently-used order
+__SCOPE_CACHE_LOCK = threading.Lock()
+__EXPORT_TABLES    = {} # id of index -> (index, number of records, index records by name, export tables by id of record)
+__INDEX_GENERATION = 0
+__CONSTANTS_LOCK   = threading.RLock() # guards the named constants and resolved variables kept by scopes
+
+SCOPE_CACHE_HITS      = 0
+SCOPE_CACHE_MISSES    = 0
+SCOPE_CACHE_EVICTIONS = 0
+
+class ScopeEntries(collections.abc.Sequence):
+    """
+    Read-only view of the entries of one type of a scope and its parents,
+    in the order of the former scope lists, i.e. parent entries first.
+    """
+    __slots__ = ["_lists"]
+    def __init__(self,lists):
+        self._lists = lists
+    def __len__(self):
+        return sum(len(entries) for entries in self._lists)
+    def __getitem__(self,i):
+        return list(self)[i]
+    def __iter__(self):
+        for entries in self._lists:
+            yield from entries
+    def __reversed__(self):
+        for entries in reversed(self._lists):
+            yield from reversed(entries)
+    def __eq__(self,other):
+        if not isinstance(other,collections.abc.Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+    __hash__ = None
+    def __repr__(self):
+        return repr(list(self))
+
+class Scope:
+    """
+    Variables, types, and subprograms that are visible in a program unit, see create_scope.
+
+    A scope stores the entries it adds itself in a list and in a dict per entry type
+    and refers to its parent scope for all other entries. An entry shadows entries with
+    the same name that have been added before, including those of the parent scopes.
+    Dict-style access with the keys in KEYS is supported: 'tag' and a ScopeEntries view per entry type.
+    The values of named constants and the resolved variables, see search_scope_for_variable,
+    are kept by the scope once they have been computed.
+    """
+    __slots__ = ["tag","parent","_lists","_lookup","_constants","_resolved"]
+    
+    KEYS        = ["tag","types","variables","subprograms"]
+    ENTRY_TYPES = ["subprograms","variables","types"]
+
+    def __init__(self,tag,parent=None):
+        self.tag     = tag
+        self.parent  = parent
+        self._lists  = { entry_type: [] for entry_type in Scope.ENTRY_TYPES }
+        self._lookup = { entry_type: {} for entry_type in Scope.ENTRY_TYPES } # name -> last added entry
+        self._constants = {} # name -> value of the named constant as int or float, or None
+        self._resolved  = {} # variable tag -> resolved index record
+
+    def add_entries(self,entry_type,entries):
+        lookup = self._lookup[entry_type]
+        for entry in entries:
+            lookup[entry["name"]] = entry
+        self._lists[entry_type] += entries
+    def find(self,entry_type,name):
+        """:return: The last added entry of the given type and name in this scope or its parents or None."""
+        scope = self
+        while scope != None:
+            entry = scope._lookup[entry_type].get(name,None)
+            if entry != None:
+                return entry
+            scope = scope.parent
+        return None
+    def entries(self,entry_type):
+        """:return: ScopeEntries view of the entries of the given type."""
+        lists = []
+        scope = self
+        while scope != None:
+            lists.append(scope._lists[entry_type])
+            scope = scope.parent
+        return ScopeEntries(lists[::-1])
+
+    # dict-style access
+    def __getitem__(self,key):
+        if key == "tag":
+            return self.tag
+        elif key in Scope.ENTRY_TYPES:
+            return self.entries(key)
+        raise KeyError(key)
+    def __contains__(self,key):
+        return key in Scope.KEYS
+    def get(self,key,default=None):
+        return self[key] if key in Scope.KEYS else default
+    def keys(self):
+        return list(Scope.KEYS)
+    def items(self):
+        return [(key,self[key]) for key in Scope.KEYS]
+    def __iter__(self):
+        return iter(Scope.KEYS)
+    def __len__(self):
+        return len(Scope.KEYS)
+    def __repr__(self):
+        return "Scope({})".format(self.tag)
+
+    @staticmethod
+    def from_dict(scope):
+        """:return: A Scope created from a dict with the keys in KEYS, e.g. a scope passed as dict to the search functions."""
+        result = Scope(scope["tag"])
+        for entry_type in Scope.ENTRY_TYPES:
+            result.add_entries(entry_type,list(scope[entry_type]))
+        return result
+    def to_dict(self):
+        """:return: A dict with the keys in KEYS and lists of entries."""
+        return dict([("tag",self.tag)]+[(entry_type,list(self.entries(entry_type))) for entry_type in Scope.ENTRY_TYPES])
+
+EMPTY_SCOPE = Scope("")
+
+def _intrnl_as_scope(scope):
+    """:return: The scope as Scope; converts a scope dict, see Scope.from_dict."""
+    return scope if isinstance(scope,Scope) else Scope.from_dict(scope)
+
+def _intrnl_find_entries(record,entry_type,name):
+    """
+    :return: The entries of the given type and name of an index record.
+    :note: Uses the table of contents of records that are loaded lazily from module files,
+           see indexer.modulefile.ModuleRecord.find_entries.
+    """
+    if hasattr(record,"find_entries"):
+        return record.find_entries(entry_type,name)
+    return [entry for entry in record[entry_type] if entry["name"] == name]
+
+class _ExportTable:
+    """
+    Entries that a module (or other index record) makes available via 'use':
+    the entries of the used modules, with 'only' and renamings applied, followed by its own entries.
+    Entry lists and lookups by name are computed on first request and then kept;
+    the table is shared by all scopes that are created for the same index.
+    A lookup by name only loads the entry lists that are needed, see _intrnl_find_entries.
+    """
+    __slots__ = ["record","uses","_entries","_found","_busy"]
+    def __init__(self,record):
+        self.record   = record
+        self.uses     = [] # per 'use' statement: name of the used module, export tables of its index records, and 'only' list or None
+        self._entries = {} # entry type -> list of entries
+        self._found   = {} # (entry type, name) -> list of entries
+        self._busy    = False # cyclic 'use' graphs: no entries are taken from a table that is being computed
+    def entries(self,entry_type):
+        if entry_type not in self._entries:
+            if self._busy:
+                return []
+            self._busy = True
+            try:
+                result = _intrnl_used_entries(self.uses,entry_type)
+                if entry_type in self.record:
+                    result += self.record[entry_type]
+            finally:
+                self._busy = False
+            self._entries[entry_type] = result
+        return self._entries[entry_type]
+    def find(self,entry_type,name):
+        """:return: The entries with the given name that shadow all others with that name."""
+        key = (entry_type,name)
+        if key not in self._found:
+            if self._busy:
+                return []
+            self._busy = True
+            try:
+                result = _intrnl_find_entries(self.record,entry_type,name) if entry_type in self.record else []
+                if not len(result):
+                    result = _intrnl_find_used_entries(self.uses,entry_type,name)
+            finally:
+                self._busy = False
+            self._found[key] = result
+        return self._found[key]
+    def used_entries(self,entry_type):
+        """:return: The entries that the record takes from the used modules, i.e. entries(entry_type) without the record's own entries."""
+        return _intrnl_used_entries(self.uses,entry_type)
+
+class _SnapshotExportTable(_ExportTable):
+    """
+    Export table whose entries are read from an export snapshot, see create_export_snapshots.
+    Does not refer to the export tables of the used modules; the entry lists are
+    only loaded when requested, lookups by name only decode the matching entries.
+    """
+    __slots__ = ["snapshot"]
+    def __init__(self,record,snapshot):
+        _ExportTable.__init__(self,record)
+        self.snapshot = snapshot
+    def entries(self,entry_type):
+        return self.snapshot[entry_type] if entry_type in self.snapshot else []
+    def find(self,entry_type,name):
+        """:return: The last entry with the given name, i.e. the one that shadows all others, as list."""
+        return self.snapshot.find_entries(entry_type,name)[-1:] if entry_type in self.snapshot else []
+    def used_entries(self,entry_type):
+        entries = self.entries(entry_type)
+        return entries[0:len(entries)-self.snapshot["num_own_entries"].get(entry_type,0)]
+
+def _intrnl_rename(entries,name):
+    return [entry if entry["name"] == name else dict(entry,name=name) for entry in entries]
+
+def _intrnl_used_entries(uses,entry_type):
+    """:return: The entries of the given type that the 'use' statements make available, in order of the statements."""
+    result = []
+    for _, tables, only in uses:
+        for table in tables:
+            if only == None:
+                result += table.entries(entry_type)
+            else:
+                for mapping in only:
+                    result += _intrnl_rename(table.find(entry_type,mapping["original"]),mapping["renamed"])
+    return result
+
+def _intrnl_find_used_entries(uses,entry_type,name):
+    """:return: The entries with the given name that the last matching 'use' statement makes available."""
+    for _, tables, only in reversed(uses):
+        for table in reversed(tables):
+            if only == None:
+                result = table.find(entry_type,name)
+                if len(result):
+                    return result
+            else:
+                for mapping in reversed(only):
+                    if mapping["renamed"] == name:
+                        result = table.find(entry_type,mapping["original"])
+                        if len(result):
+                            return _intrnl_rename(result,name)
+    return []
+
+def _intrnl_get_export_context(index):
+    """
+    :return: Pair of a dict that maps names to the index records with that name and
+             a dict that maps ids of index records to their export tables, for the given index.
+             Both are renewed if the number of records of the index changed. Lock must be held.
+    """
+    global __EXPORT_TABLES
+    cached = __EXPORT_TABLES.get(id(index),None)
+    if cached == None or cached[0] is not index or cached[1] != len(index):
+        records_by_name = {}
+        for record in index:
+            records_by_name.setdefault(record["name"],[]).append(record)
+        cached = (index,len(index),records_by_name,{})
+        __EXPORT_TABLES[id(index)] = cached # keeps the index alive, its id is thus not reused
+    return cached[2:4]
+
+def _intrnl_digest(record):
+    """:return: Digest of the record; that of its module file if it is loaded from one, see indexer.modulefile.ModuleRecord.digest."""
+    if hasattr(record,"digest"):
+        return record.digest()
+    return hashlib.sha256(modulefile.encode(record)).hexdigest()
+
+def _intrnl_load_export_snapshot(records_by_name,record):
+    """
+    :return: The export snapshot of the record as modulefile.ModuleRecord, or None if there is none
+             or if the digest of one of the records it has been created from changed.
+    """
+    global LOG_PREFIX
+    global USE_EXPORT_SNAPSHOTS
+    if not USE_EXPORT_SNAPSHOTS or not hasattr(record,"exports_filepath"):
+        return None
+    filepath = record.exports_filepath()
+    if filepath == None or not os.path.exists(filepath):
+        return None
+    snapshot = modulefile.ModuleRecord(filepath,record["name"])
+    try:
+        dependencies = snapshot["dependencies"]
+    except (OSError,ValueError,KeyError) as e:
+        utils.logging.log_warning(LOG_PREFIX,"_intrnl_load_export_snapshot",\
+          "ignore export snapshot '{}': {}".format(filepath,str(e)))
+        return None
+    for name, digests in dependencies.items():
+        if [_intrnl_digest(used_record) for used_record in records_by_name.get(name,[])] != digests:
+            utils.logging.log_debug(LOG_PREFIX,"_intrnl_load_export_snapshot",\
+              "ignore export snapshot '{}' as the record(s) of '{}' changed".format(filepath,name))
+            return None
+    return snapshot
+
+def _intrnl_collect_dependencies(table,records_by_name,visited,dependencies):
+    """Collect the digests of the index records that the export table has been computed from, per name."""
+    if id(table) in visited:
+        return
+    visited.add(id(table))
+    name = table.record["name"]
+    if name not in dependencies:
+        dependencies[name] = [_intrnl_digest(record) for record in records_by_name.get(name,[])]
+    if isinstance(table,_SnapshotExportTable):
+        for name, digests in table.snapshot["dependencies"].items():
+            dependencies.setdefault(name,digests)
+    else:
+        for used_name, tables, _ in table.uses:
+            if not len(tables):
+                dependencies.setdefault(used_name,[])
+            for used_table in tables:
+                _intrnl_collect_dependencies(used_table,records_by_name,visited,dependencies)
+
+def _intrnl_get_export_table(index,record):
+    """
+    :return: The export table of an index record, e.g. of a module or of a subprogram that uses modules.
+    :note: Export tables of the used modules are created too; cycle-safe as a table is registered before its uses are resolved.
+    """
+    global LOG_PREFIX
+    global ERROR_HANDLING
+    global MODULE_IGNORE_LIST
+    records_by_name, tables = _intrnl_get_export_context(index)
+    table = tables.get(id(record),None)
+    if table == None:
+        snapshot = _intrnl_load_export_snapshot(records_by_name,record)
+        if snapshot != None:
+            table = _SnapshotExportTable(record,snapshot)
+            tables[id(record)] = table
+            utils.logging.log_debug2(LOG_PREFIX,"_intrnl_get_export_table",\
+              "load export table for '{}' from snapshot".format(record["name"]))
+            return table
+        table = _ExportTable(record)
+        tables[id(record)] = table
+        utils.logging.log_debug2(LOG_PREFIX,"_intrnl_get_export_table",\
+          "create export table for '{}'".format(record["name"]))
+        for used_module in record["used_modules"]:
+            used_records = records_by_name.get(used_module["name"],[])
+            if not len(used_records) and used_module["name"] not in MODULE_IGNORE_LIST:
+                msg = "no index record for module '{}' could be found".format(used_module["name"])
+                if ERROR_HANDLING == "strict":
+                    utils.logging.log_error(LOG_PREFIX,"_intrnl_get_export_table",msg) 
+                    sys.exit(ERR_SCOPER_RESOLVE_DEPENDENCIES_FAILED)
+                else:
+                    utils.logging.log_warning(LOG_PREFIX,"_intrnl_get_export_table",msg)
+            table.uses.append((used_module["name"],[_intrnl_get_export_table(index,used_record) for used_record in used_records],\
+                               used_module["only"] if len(used_module["only"]) else None))
+    return table
+
 def _intrnl_resolve_dependencies(scope,index_record,index):
     """
     Include variable, type, and subprogram records from modules used
     by the current record (module,program or subprogram).
 
-    :param dict scope: the scope that you updated with information from the used modules.
+    :param Scope scope: the scope that you updated with information from the used modules.
     :param dict index_record: a module/program/subprogram index record
     :param list index: list of module/program index records
-
-    TODO must be recursive!!!
+    :note: 'only' and renamings also apply to entries that a used module takes from the modules it uses in turn.
     """
     global LOG_PREFIX    
-    global ERROR_HANDLING
 
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_resolve_dependencies")
-
-    def handle_use_statements_(scope,imodule):
-        """
-        recursive function
-        :param dict imodule: 
-        """ 
-        nonlocal index
-        for used_module in imodule["used_modules"]:
-            used_module_found = used_module["name"] in MODULE_IGNORE_LIST
-            # include definitions from other modules
-            for module in index:
-                if module["name"] == used_module["name"]:
-                    handle_use_statements_(scope,module) # recursivie call
-
-                    used_module_found   = True
-                    include_all_entries = not len(used_module["only"])
-                    if include_all_entries: # simple include
-                        utils.logging.log_debug2(LOG_PREFIX,"_intrnl_resolve_dependencies.handle_use_statements",
-                          "use all definitions from module '{}'".format(imodule["name"]))
-                        for entry_type in __SCOPE_ENTRY_TYPES:
-                            scope[entry_type] += module[entry_type]
-                    else:
-                        for mapping in used_module["only"]:
-                            for entry_type in __SCOPE_ENTRY_TYPES:
-                                for entry in module[entry_type]:
-                                    if entry["name"] == mapping["original"]:
-                                        utils.logging.log_debug2(LOG_PREFIX,
-                                          "_intrnl_resolve_dependencies.handle_use_statements",\
-                                          "use {} '{}' as '{}' from module '{}'".format(\
-                                          entry_type[0:-1],mapping["original"],mapping["renamed"],\
-                                          imodule["name"]))
-                                        copied_entry = copy.deepcopy(entry)
-                                        copied_entry["name"] = mapping["renamed"]
-                                        scope[entry_type].append(copied_entry)
-            if not used_module_found:
-                msg = "no index record for module '{}' could be found".format(used_module["name"])
-                if ERROR_HANDLING == "strict":
-                    utils.logging.log_error(LOG_PREFIX,"_intrnl_resolve_dependencies",msg) 
-                    sys.exit(ERR_INDEXER_RESOLVE_DEPENDENCIES_FAILED)
-                else:
-                    utils.logging.log_warning(LOG_PREFIX,"_intrnl_resolve_dependencies",msg)
-
-    handle_use_statements_(scope,index_record)
+    
+    table = _intrnl_get_export_table(index,index_record)
+    for entry_type in __SCOPE_ENTRY_TYPES:
+        scope.add_entries(entry_type,table.used_entries(entry_type))
+    
     utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_resolve_dependencies")
 
-
 def _intrnl_search_scope_for_type_or_subprogram(scope,entry_name,entry_type,empty_record):
     """
     :param str entry_type: either 'types' or 'subprograms'
@@ -129,11 +420,8 @@ def _intrnl_search_scope_for_type_or_subprogram(scope,entry_name,entry_type,empt
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_search_scope_for_type_or_subprogram",\
       {"entry_name":entry_name,"entry_type":entry_type})
 
-    # reverse access such that entries from the inner-most scope come first
-    scope_entities = reversed(scope[entry_type])
-
-    entry_name_lower = entry_name.lower()
-    result = next((entry for entry in scope_entities if entry["name"] == entry_name_lower),None)  
+    # entries from the inner-most scope shadow the others
+    result = _intrnl_as_scope(scope).find(entry_type,entry_name.lower())
     if result is None:
         msg = "no entry found for {} '{}'.".format(entry_type[:-1],entry_name)
         if ERROR_HANDLING  == "strict":
@@ -192,132 +480,278 @@ def create_index_search_tag_for_variable(variable_expression):
         result.append(curr)
         return "%".join(result)
 
-def create_scope_from_declaration_statements(declaration_statements=[]):
-    """Create scope from declaration statements.
-    :note: must not contain any line breaks.
+def _intrnl_lookup_cached_scope(index,tag):
+    """:return: The cached scope for the tag or None; marks the scope as recently used. Lock must be held."""
+    global __SCOPE_CACHE
+    global __INDEX_GENERATION
+    key    = (__INDEX_GENERATION,id(index),tag)
+    cached = __SCOPE_CACHE.get(key,None)
+    if cached == None:
+        return None
+    if cached[0] is not index or cached[1] != len(index): # index has been modified
+        del __SCOPE_CACHE[key]
+        return None
+    __SCOPE_CACHE.move_to_end(key)
+    return cached[2]
+
+def _intrnl_cache_scope(index,scope):
+    """Cache the scope; drops the least recently used scopes if there are more than SCOPE_CACHE_MAX_ENTRIES. Lock must be held."""
+    global __SCOPE_CACHE
+    global __INDEX_GENERATION
+    global SCOPE_CACHE_MAX_ENTRIES
+    global SCOPE_CACHE_EVICTIONS
+    # the cache keeps the index alive, its id is thus not reused while the scope is cached
+    __SCOPE_CACHE[(__INDEX_GENERATION,id(index),scope.tag)] = (index,len(index),scope)
+    while len(__SCOPE_CACHE) > SCOPE_CACHE_MAX_ENTRIES:
+        _, (_, _, evicted) = __SCOPE_CACHE.popitem(last=False)
+        SCOPE_CACHE_EVICTIONS += 1
+        utils.logging.log_debug2(LOG_PREFIX,"_intrnl_cache_scope","evict scope with tag '{}'".format(evicted.tag))
+
+def _intrnl_create_scope(index,tag,existing_scope,nesting_level):
     """
-
-
+    :param Scope existing_scope: Scope for the first nesting_level+1 tokens of the tag or None.
+    :param int nesting_level: -1 if there is no existing scope.
+    """
+    tag_tokens = tag.split(":")
+    new_scope  = Scope(tag,parent=existing_scope)
+ 
+    # we already have a scope for this record
+    if nesting_level >= 0:
+        base_record_tag = ":".join(tag_tokens[0:nesting_level+1])
+        utils.logging.log_debug(LOG_PREFIX,"_intrnl_create_scope",\
+          "create scope for tag '{}' based on existing scope with tag '{}'".format(tag,base_record_tag))
+        base_record = next((module for module in index if module["name"] == tag_tokens[0]),None)  
+        for l in range(1,nesting_level+1):
+            base_record = next((subprogram for subprogram in base_record["subprograms"] if subprogram["name"] == tag_tokens[l]),None)
+        current_record_list = base_record["subprograms"]
+    else:
+        utils.logging.log_debug(LOG_PREFIX,"_intrnl_create_scope",\
+          "create scope for tag '{}'".format(tag))
+        current_record_list = index
+        # add top-level subprograms to scope of top-level entry
+        new_scope.add_entries("subprograms",[index_entry for index_entry in index\
+                if index_entry["kind"] in ["subroutine","function"] and\
+                   index_entry["name"] != tag_tokens[0]])
+        utils.logging.log_debug(LOG_PREFIX,"_intrnl_create_scope",\
+          "add {} top-level subprograms to scope".format(len(new_scope["subprograms"])))
+    begin = nesting_level + 1 # 
+    
+    for d in range(begin,len(tag_tokens)):
+        searched_name = tag_tokens[d]
+        for current_record in current_record_list:
+            if current_record["name"] == searched_name:
+                # 1. first include variables from included
+                _intrnl_resolve_dependencies(new_scope,current_record,index) 
+                # 2. now include the current record's   
+                for entry_type in __SCOPE_ENTRY_TYPES:
+                    if entry_type in current_record:
+                        new_scope.add_entries(entry_type,current_record[entry_type])
+                current_record_list = current_record["subprograms"]
+                break
+    return new_scope
+
+def invalidate_scopes():
+    """
+    Remove all cached scopes and export tables of modules and start a new index generation.
+    Must be called if records of an index have been modified in place;
+    appending or removing records is detected by create_scope.
+    """
+    global __SCOPE_CACHE
+    global __SCOPE_CACHE_LOCK
+    global __EXPORT_TABLES
+    global __INDEX_GENERATION
+    with __SCOPE_CACHE_LOCK:
+        __INDEX_GENERATION += 1
+        __SCOPE_CACHE.clear()
+        __EXPORT_TABLES.clear()
+    utils.logging.log_debug(LOG_PREFIX,"invalidate_scopes","scope cache statistics: {}".format(scope_cache_statistics()))
+
+def scope_cache_statistics():
+    """:return: dict with the number of hits, misses, and evictions of the scope cache, the number of cached scopes, and the index generation."""
+    global __SCOPE_CACHE
+    global __INDEX_GENERATION
+    return { "hits": SCOPE_CACHE_HITS, "misses": SCOPE_CACHE_MISSES, "evictions": SCOPE_CACHE_EVICTIONS,
+             "entries": len(__SCOPE_CACHE), "generation": __INDEX_GENERATION }
 
 def create_scope(index,tag):
     """
     :param str tag: a colon-separated list of strings. Ex: mymod:mysubroutine or mymod.
-    :note: not thread-safe
-    :note: tries to reuse existing scopes.
-    :note: assumes that number of scopes will be small per file. Hence, uses list instead of tree data structure
-           for storing scopes.
+    :return: A Scope; derived from the cached scope of the longest higher-level tag, which becomes its parent, if there is one.
+    :note: Scopes are cached per index generation, index, and tag, see invalidate_scopes.
+           The least recently used scopes are dropped if there are more than SCOPE_CACHE_MAX_ENTRIES.
+    :note: thread-safe
     """
-    global SCOPES
-    global REMOVE_OUTDATED_SCOPES
-    global MODULE_IGNORE_LIST
+    global __SCOPE_CACHE_LOCK
+    global SCOPE_CACHE_HITS
+    global SCOPE_CACHE_MISSES
     global LOG_PREFIX    
     utils.logging.log_enter_function(LOG_PREFIX,"create_scope",{"tag":tag,"ERROR_HANDLING":ERROR_HANDLING})
     
-    # check if already a scope exists for the tag or if
-    # it can be derived from a higher-level scope
-    existing_scope   = EMPTY_SCOPE
-    nesting_level    = -1 # -1 implies that nothing has been found
-    scopes_to_delete  = []
-    for s in SCOPES:
-        existing_tag = s["tag"]
-        if existing_tag == tag[0:len(existing_tag)]:
-            existing_scope = s
-            nesting_level  = len(existing_tag.split(":"))-1
-        else:
-            scopes_to_delete.append(s)
-    # clean up scopes that are not used anymore 
-    if REMOVE_OUTDATED_SCOPES and len(scopes_to_delete):
-        utils.logging.log_debug(LOG_PREFIX,"create_scope",\
-          "delete outdated scopes with tags '{}'".format(\
-            ", ".join([s["tag"] for s in scopes_to_delete])))
-        for s in scopes_to_delete:
-            SCOPES.remove(s)
-
-    # return existing existing_scope or create it
-    tag_tokens = tag.split(":")
-    if len(tag_tokens)-1 == nesting_level:
-        utils.logging.log_debug(LOG_PREFIX,"create_scope",\
-          "found existing scope for tag '{}'".format(tag))
-        utils.logging.log_leave_function(LOG_PREFIX,"create_scope")
-        return existing_scope
-    else:
-        new_scope = copy.deepcopy(existing_scope)
-        new_scope["tag"] = tag 
- 
-        # we already have a scope for this record
-        if nesting_level >= 0:
-            base_record_tag = ":".join(tag_tokens[0:nesting_level+1])
+    with __SCOPE_CACHE_LOCK:
+        scope = _intrnl_lookup_cached_scope(index,tag)
+        if scope != None:
+            SCOPE_CACHE_HITS += 1
             utils.logging.log_debug(LOG_PREFIX,"create_scope",\
-              "create scope for tag '{}' based on existing scope with tag '{}'".format(tag,base_record_tag))
-            base_record = next((module for module in index if module["name"] == tag_tokens[0]),None)  
-            for l in range(1,nesting_level+1):
-                base_record = next((subprogram for subprogram in base_record["subprograms"] if subprogram["name"] == tag_tokens[l]),None)
-            current_record_list = base_record["subprograms"]
+              "found existing scope for tag '{}'".format(tag))
         else:
-            utils.logging.log_debug(LOG_PREFIX,"create_scope",\
-              "create scope for tag '{}'".format(tag))
-            current_record_list = index
-            # add top-level subprograms to scope of top-level entry
-            new_scope["subprograms"] += [index_entry for index_entry in index\
-                    if index_entry["kind"] in ["subroutine","function"] and\
-                       index_entry["name"] != tag_tokens[0]]
-            utils.logging.log_debug(LOG_PREFIX,"create_scope",\
-              "add {} top-level subprograms to scope".format(len(new_scope["subprograms"])))
-        begin = nesting_level + 1 # 
-        
-        for d in range(begin,len(tag_tokens)):
-            searched_name = tag_tokens[d]
-            for current_record in current_record_list:
-                if current_record["name"] == searched_name:
-                    # 1. first include variables from included
-                    _intrnl_resolve_dependencies(new_scope,current_record,index) 
-                    # 2. now include the current record's   
-                    for entry_type in __SCOPE_ENTRY_TYPES:
-                        if entry_type in current_record:
-                            new_scope[entry_type] += current_record[entry_type]
-                    current_record_list = current_record["subprograms"]
+            SCOPE_CACHE_MISSES += 1
+            # check if the scope can be derived from a higher-level scope
+            existing_scope = None
+            nesting_level  = -1 # -1 implies that nothing has been found
+            tag_tokens     = tag.split(":")
+            for level in range(len(tag_tokens)-2,-1,-1):
+                existing_scope = _intrnl_lookup_cached_scope(index,":".join(tag_tokens[0:level+1]))
+                if existing_scope != None:
+                    nesting_level = level
                     break
-        SCOPES.append(new_scope)
-        utils.logging.log_leave_function(LOG_PREFIX,"create_scope")
-        return new_scope
+            scope = _intrnl_create_scope(index,tag,existing_scope,nesting_level)
+            _intrnl_cache_scope(index,scope)
+    
+    utils.logging.log_leave_function(LOG_PREFIX,"create_scope")
+    return scope
+
+def create_export_snapshots(index,records):
+    """
+    :param list index: Index that contains the records and the records of all modules that they (transitively) use.
+    :param list records: Index records of modules.
+    :return: Per record, its export snapshot: a record with the entries that the module makes available via 'use',
+             with those of all (transitively) used modules flattened, and the digests of the records it has been created from.
+             Write it to the path given by the exports_filepath method of the module's modulefile.ModuleRecord, encoded
+             via modulefile.encode; it is then used instead of resolving the module's dependencies as long as the digests match.
+    :note: The export tables of the index are not kept.
+    :note: thread-safe
+    """
+    global __SCOPE_CACHE_LOCK
+    global __SCOPE_ENTRY_TYPES
+    global __EXPORT_TABLES
+    result = []
+    with __SCOPE_CACHE_LOCK:
+        records_by_name, _ = _intrnl_get_export_context(index)
+        for record in records:
+            table        = _intrnl_get_export_table(index,record)
+            dependencies = {}
+            _intrnl_collect_dependencies(table,records_by_name,set(),dependencies)
+            snapshot = { "name": record["name"], "kind": "exports", "used_modules": [], "dependencies": dependencies,
+                         "num_own_entries": { entry_type: len(record[entry_type]) if entry_type in record else 0\
+                                              for entry_type in __SCOPE_ENTRY_TYPES } }
+            for entry_type in __SCOPE_ENTRY_TYPES:
+                snapshot[entry_type] = list(table.entries(entry_type))
+            result.append(snapshot)
+        __EXPORT_TABLES.pop(id(index),None)
+    return result
+
+def _intrnl_lookup_constant(scope,name):
+    """
+    :return: The value of the named integer or real constant as int or float, or None if the name
+             does not refer to a parameter of the scope or if its value is not constant. Lock must be held.
+    """
+    constants = scope._constants
+    if name not in constants:
+        constants[name] = None # cyclic definitions are not constant
+        ivar  = scope.find("variables",name)
+        value = None
+        if ivar != None and "parameter" in ivar["qualifiers"] and ivar.get("value") != None and ivar["rank"] == 0\
+           and ivar["f_type"].replace(" ","") in ["integer","real","doubleprecision"]:
+            value = constantfolding.fold(ivar["value"],lambda other: _intrnl_lookup_constant(scope,other))
+            if value != None:
+                value = int(value) if ivar["f_type"] == "integer" else float(value)
+        constants[name] = value
+    return constants[name]
+
+def _intrnl_create_index_macro(variable_name,lbounds,counts):
+    """
+    :return: Index macro as created by the translator for arrays with specified bounds;
+             strides are constants if all counts are integer literals.
+    """
+    macro_args = [chr(ord('a')+i) for i in range(0,len(lbounds))]
+    constant   = all(count.isdigit() for count in counts)
+    index  = ""
+    stride = ""
+    prod   = 1 if constant else ""
+    for i, macro_arg in enumerate(macro_args):
+        index += "{0}({1}-({2}))".format(stride,macro_arg,lbounds[i])
+        if constant:
+            prod  *= int(counts[i])
+            stride = "+{}*".format(prod)
+        else:
+            prod   = "{}{}*".format(prod,counts[i])
+            stride = "+{0}".format(prod)
+    return "#undef _idx_{0}\n#define _idx_{0}({1}) ({2})".format(variable_name,",".join(macro_args),index)
+
+def _intrnl_resolve_variable(scope,ivar):
+    """
+    :return: Copy of the index record of the variable with the named constants of the scope folded
+             into its value, kind, bytes per element, and, if specified, array bounds, counts, sizes, and index macro.
+             Expressions that are not constant get the values of the named constants substituted. Lock must be held.
+    """
+    lookup = lambda name: _intrnl_lookup_constant(scope,name)
+    def fold_(expression):
+        return constantfolding.fold(expression,lookup) if expression != None else None
+    def resolve_(expression):
+        value = fold_(expression)
+        return constantfolding.to_str(value) if value != None else constantfolding.substitute(expression,lookup)
+    
+    result = copy.deepcopy(ivar) # entries are shared with the index
+    if "parameter" in result["qualifiers"] and result.get("value") != None:
+        result["value"] = resolve_(result["value"])
+    if result["f_type"] not in ["type","character"] and len(result["kind"]):
+        kind = fold_(result["kind"])
+        if isinstance(kind,int) and kind > 0:
+            result["kind"] = str(kind)
+    if result["bytes_per_element"] != None:
+        result["bytes_per_element"] = resolve_(result["bytes_per_element"])
+    if result["rank"] > 0:
+        if not result["unspecified_bounds"]:
+            result["lbounds"] = [resolve_(lbound) for lbound in result["lbounds"]]
+            result["counts"]  = [resolve_(count) for count in result["counts"]]
+            total_count = fold_("*".join("({})".format(count) for count in result["counts"]))
+            result["total_count"] = str(total_count) if total_count != None else "*".join(result["counts"])
+            result["index_macro"] = _intrnl_create_index_macro(result["name"],result["lbounds"],result["counts"])
+        if result["bytes_per_element"] != None:
+            total_bytes = fold_("({})*({})".format(result["bytes_per_element"],result["total_count"]))
+            result["total_bytes"] = str(total_bytes) if total_bytes != None else\
+              result["bytes_per_element"]+"*("+result["total_count"]+")"
+    return result
+
+def fold_constant_expression(scope,expression):
+    """
+    :param str expression: Fortran expression, e.g. an array bound or a kind.
+    :return: The value of the expression as int or float, or None if it is not constant.
+             Supports the named integer and real constants (parameters) of the scope and the
+             intrinsics in constantfolding.INTRINSICS, e.g. 'selected_real_kind'.
+    :note: The values of named constants are computed once per scope.
+    :note: thread-safe
+    """
+    global __CONSTANTS_LOCK
+    scope = _intrnl_as_scope(scope)
+    with __CONSTANTS_LOCK:
+        return constantfolding.fold(expression,lambda name: _intrnl_lookup_constant(scope,name))
 
 def search_scope_for_variable(scope,variable_expression,resolve=False):
     """
     %param str variable_tag% a simple identifier such as 'a' or 'A_d' or a more complicated tag representing a derived-type member, e.g. 'a%b%c' or 'a%b(i,j)%c(a%i5)'.
+    :param bool resolve: Return a copy of the index record with the named constants of the scope folded into
+                         its kind, bytes per element, value, and array bounds, counts, sizes, and index macro, e.g.
+                         constant counts and strides for arrays whose bounds are given by parameters.
+                         The copy is kept by the scope and returned by subsequent lookups; it must not be modified.
     """
     global LOG_PREFIX
+    global __CONSTANTS_LOCK
     utils.logging.log_enter_function(LOG_PREFIX,"search_scope_for_variable",\
       {"variable_expression":variable_expression})
 
-    result = None
-    # reverse access such that entries from the inner-most scope come first
-    scope_types = reversed(scope["types"])
+    scope = _intrnl_as_scope(scope)
 
     variable_tag      = create_index_search_tag_for_variable(variable_expression)
     list_of_var_names = variable_tag.split("%") 
-    def lookup_from_left_to_right_(scope_variables,pos=0):
-        """
-        :note: recursive
-        """
-        nonlocal scope_types
-        nonlocal list_of_var_names
-     
-        var_name = list_of_var_names[pos]
-        if pos == len(list_of_var_names)-1:
-            result = next((var for var in scope_variables if var["name"] == var_name),None)  
+    # entries from the inner-most scope shadow the others
+    result = scope.find("variables",list_of_var_names[0])
+    for var_name in list_of_var_names[1:]: # derived type members
+        matching_type = scope.find("types",result["kind"]) if result != None else None
+        if matching_type != None:
+            result = next((var for var in reversed(matching_type["variables"]) if var["name"] == var_name),None)
         else:
-            try:
-                matching_type_var = next((var for var in scope_variables if var["name"] == var_name),None)
-                if matching_type_var != None:
-                    matching_type    = next((typ for typ in scope_types if typ["name"] == matching_type_var["kind"]),None)
-                    result = lookup_from_left_to_right_(reversed(matching_type["variables"]),pos+1)
-                else:
-                    result = None
-            except Exception as e:
-                raise e
-                result = None
-        return result
-    result = lookup_from_left_to_right_(reversed(scope["variables"]))
+            result = None
     
     if result is None:
         msg       = "no entry found for variable '{}'.".format(variable_tag)
@@ -328,30 +762,13 @@ def search_scope_for_variable(scope,variable_expression,resolve=False):
             utils.logging.log_warning(LOG_PREFIX,"search_scope_for_variable",msg) 
         return EMPTY_VARIABLE, False
     else:
-        # resolve
         if resolve:
-            for ivar in reversed(scope["variables"]):
-                if "parameter" in ivar["qualifiers"]:
-                    for entry in ["kind","unspecified_bounds","lbounds","counts","total_count","total_bytes","index_macro"]:
-                        if entry in result:
-                            dest_tokens = utils.parsingutils.tokenize(result[entry])
-                            modified_entry = ""
-                            # TODO handle selected kind here
-                            for tk in dest_tokens:
-                                modified_entry += tk.replace(ivar["name"],"("+ivar["value"]+")")
-                            result[entry] = modified_entry
-                if "parameter" in result["qualifiers"]:
-                    if not result["f_type"] in ["character","type"]:
-                        result["value"].replace(ivar["value"],"("+ivar["value"]+")")
-            for entry in ["value","kind","unspecified_bounds","lbounds","counts","total_count","total_bytes","index_macro"]:
-                if entry in result:
-                    entry_value = result[entry] 
-                    try:
-                       code = compile(entry_value, "<string>", "eval")
-                       entry_value = str(eval(code, {"__builtins__": {}},{}))
-                    except:
-                        pass
-                    result[entry] = entry_value
+            with __CONSTANTS_LOCK:
+                resolved = scope._resolved.get(variable_tag,None)
+                if resolved == None:
+                    resolved = _intrnl_resolve_variable(scope,result)
+                    scope._resolved[variable_tag] = resolved
+            result = resolved
 
         utils.logging.log_debug2(LOG_PREFIX,"search_scope_for_variable",\
           "entry found for variable '{}'".format(variable_tag)) 
@@ -386,7 +803,7 @@ def search_index_for_variable(index,parent_tag,variable_expression,resolve=False
       {"parent_tag":parent_tag,"variable_expression":variable_expression})
 
     scope = create_scope(index,parent_tag)
-    return search_scope_for_variable(scope,variable_expression,resolve=False)
+    return search_scope_for_variable(scope,variable_expression,resolve)
 
 def search_index_for_type(index,parent_tag,type_name):
     """
@@ -0,0 +1,344 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Symbol database, an SQLite file that stores the index records of many modules.
+
+Compared to a directory of module files, the database allows queries over all
+modules without loading them, e.g. 'which module defines variable x',
+'all device arrays of derived type t', or 'all subprograms with attribute global'.
+
+Table 'modules' stores per module, program, or top-level subprogram the fields of
+its record, see modulefile.encode, the names of the used modules, and the digest of
+the record. Tables 'variables', 'types', and 'subprograms' store one row per entry,
+including the entries of nested subprograms and derived types. Each row stores the tag of
+its parent, e.g. 'mymod:mysubroutine', the position in the parent's entry list, and the entry as JSON.
+Qualifiers of variables and attributes of subprograms are stored in separate tables.
+
+A module is updated as a whole, see upsert_records; unchanged modules are skipped.
+DatabaseRecord behaves like modulefile.ModuleRecord but reads from the database.
+"""
+import os
+import sys
+import sqlite3
+import hashlib
+import threading
+
+import orjson
+
+import addtoplevelpath
+import utils.logging
+import indexer.modulefile as modulefile
+
+LOG_PREFIX = "indexer.symboldb"
+
+ERR_SYMBOLDB_VERSION_MISMATCH = 1201
+ERR_SYMBOLDB_MODULE_NOT_FOUND = 1202
+
+VERSION = 1
+
+__SCHEMA = """
+CREATE TABLE IF NOT EXISTS modules (
+  id                INTEGER PRIMARY KEY,
+  name              TEXT NOT NULL UNIQUE,
+  kind              TEXT NOT NULL,
+  digest            TEXT NOT NULL,
+  fields            BLOB NOT NULL,
+  entry_types       BLOB NOT NULL,
+  used_module_names BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS variables (
+  id         INTEGER PRIMARY KEY,
+  module_id  INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+  parent_tag TEXT NOT NULL,
+  position   INTEGER NOT NULL,
+  name       TEXT NOT NULL,
+  f_type     TEXT,
+  kind       TEXT,
+  rank       INTEGER NOT NULL,
+  data       BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS variable_qualifiers (
+  variable_id INTEGER NOT NULL REFERENCES variables(id) ON DELETE CASCADE,
+  qualifier   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS types (
+  id         INTEGER PRIMARY KEY,
+  module_id  INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+  parent_tag TEXT NOT NULL,
+  position   INTEGER NOT NULL,
+  name       TEXT NOT NULL,
+  data       BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subprograms (
+  id         INTEGER PRIMARY KEY,
+  module_id  INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+  parent_tag TEXT NOT NULL,
+  position   INTEGER NOT NULL,
+  name       TEXT NOT NULL,
+  kind       TEXT NOT NULL,
+  data       BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subprogram_attributes (
+  subprogram_id INTEGER NOT NULL REFERENCES subprograms(id) ON DELETE CASCADE,
+  attribute     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS variables_by_parent       ON variables(module_id,parent_tag,position);
+CREATE INDEX IF NOT EXISTS variables_by_name         ON variables(name);
+CREATE INDEX IF NOT EXISTS variables_by_type         ON variables(f_type,kind);
+CREATE INDEX IF NOT EXISTS qualifiers_by_variable    ON variable_qualifiers(variable_id);
+CREATE INDEX IF NOT EXISTS qualifiers_by_name        ON variable_qualifiers(qualifier);
+CREATE INDEX IF NOT EXISTS types_by_parent           ON types(module_id,parent_tag,position);
+CREATE INDEX IF NOT EXISTS types_by_name             ON types(name);
+CREATE INDEX IF NOT EXISTS subprograms_by_parent     ON subprograms(module_id,parent_tag,position);
+CREATE INDEX IF NOT EXISTS subprograms_by_name       ON subprograms(name);
+CREATE INDEX IF NOT EXISTS attributes_by_subprogram  ON subprogram_attributes(subprogram_id);
+CREATE INDEX IF NOT EXISTS attributes_by_name        ON subprogram_attributes(attribute);
+"""
+
+__CONNECTIONS = threading.local() # per thread: process id, and database file path -> connection
+__INHERITED_CONNECTIONS = [] # connections of the parent process after fork; must neither be used nor closed
+
+def connect(filepath):
+    """
+    :return: Connection to the database, which is created if it does not exist.
+             Connections are kept per process, thread, and database; a forked process,
+             e.g. a batch worker, does not reuse the connections of its parent.
+    """
+    global __CONNECTIONS
+    global __INHERITED_CONNECTIONS
+    global __SCHEMA
+    global LOG_PREFIX
+    if getattr(__CONNECTIONS,"pid",None) != os.getpid():
+        __INHERITED_CONNECTIONS += getattr(__CONNECTIONS,"connections",{}).values()
+        __CONNECTIONS.pid         = os.getpid()
+        __CONNECTIONS.connections = {}
+    connection = __CONNECTIONS.connections.get(filepath,None)
+    if connection == None:
+        connection = sqlite3.connect(filepath,timeout=60)
+        connection.execute("PRAGMA foreign_keys = ON")
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            with connection:
+                connection.executescript(__SCHEMA)
+                connection.execute("PRAGMA user_version = {}".format(VERSION))
+        elif version != VERSION:
+            msg = "symbol database '{}' has schema version {} but version {} is expected; remove the database".format(\
+              filepath,version,VERSION)
+            utils.logging.log_error(LOG_PREFIX,"connect",msg)
+            sys.exit(ERR_SYMBOLDB_VERSION_MISMATCH)
+        __CONNECTIONS.connections[filepath] = connection
+    return connection
+
+def close(filepath):
+    """Close the connection of the current thread to the database, if any."""
+    global __CONNECTIONS
+    if getattr(__CONNECTIONS,"pid",None) != os.getpid():
+        return
+    connection = __CONNECTIONS.connections.pop(filepath,None)
+    if connection != None:
+        connection.close()
+
+def _intrnl_insert_entries(connection,module_id,parent_tag,record):
+    for entry_type in modulefile.ENTRY_TYPES:
+        for position, entry in enumerate(record.get(entry_type,[])):
+            data = orjson.dumps(entry)
+            if entry_type == "variables":
+                cursor = connection.execute(\
+                  "INSERT INTO variables(module_id,parent_tag,position,name,f_type,kind,rank,data) VALUES (?,?,?,?,?,?,?,?)",\
+                  (module_id,parent_tag,position,entry["name"],entry.get("f_type",None),entry.get("kind",None),entry.get("rank",0),data))
+                connection.executemany("INSERT INTO variable_qualifiers(variable_id,qualifier) VALUES (?,?)",\
+                  [(cursor.lastrowid,qualifier) for qualifier in dict.fromkeys(entry.get("qualifiers",[]))])
+            elif entry_type == "types":
+                connection.execute("INSERT INTO types(module_id,parent_tag,position,name,data) VALUES (?,?,?,?,?)",\
+                  (module_id,parent_tag,position,entry["name"],data))
+            else:
+                cursor = connection.execute(\
+                  "INSERT INTO subprograms(module_id,parent_tag,position,name,kind,data) VALUES (?,?,?,?,?,?)",\
+                  (module_id,parent_tag,position,entry["name"],entry["kind"],data))
+                connection.executemany("INSERT INTO subprogram_attributes(subprogram_id,attribute) VALUES (?,?)",\
+                  [(cursor.lastrowid,attribute) for attribute in dict.fromkeys(entry.get("attributes",[]))])
+            if entry_type != "variables": # nested entries
+                _intrnl_insert_entries(connection,module_id,parent_tag+":"+entry["name"],entry)
+
+def upsert_records(filepath,records):
+    """
+    Insert the index records into the database or replace the stored records with the same name.
+    Each record is updated in its own transaction; records whose digest did not change are skipped.
+
+    :param list records: Module, program, or top-level subprogram index records, e.g. the index.
+    :return: Number of inserted or replaced records.
+    """
+    global LOG_PREFIX
+    utils.logging.log_enter_function(LOG_PREFIX,"upsert_records",{"filepath":filepath})
+
+    connection = connect(filepath)
+    num_updated = 0
+    for record in records:
+        data   = modulefile.encode(record)
+        digest = hashlib.sha256(data).hexdigest()
+        row    = connection.execute("SELECT digest FROM modules WHERE name = ?",(record["name"],)).fetchone()
+        if row == None or row[0] != digest:
+            fields = { key: value for key, value in record.items() if key not in modulefile.ENTRY_TYPES }
+            with connection:
+                connection.execute("DELETE FROM modules WHERE name = ?",(record["name"],))
+                cursor = connection.execute(\
+                  "INSERT INTO modules(name,kind,digest,fields,entry_types,used_module_names) VALUES (?,?,?,?,?,?)",\
+                  (record["name"],record["kind"],digest,orjson.dumps(fields),\
+                   orjson.dumps([entry_type for entry_type in modulefile.ENTRY_TYPES if entry_type in record]),\
+                   orjson.dumps(modulefile.collect_used_module_names(record))))
+                _intrnl_insert_entries(connection,cursor.lastrowid,record["name"],record)
+            num_updated += 1
+    utils.logging.log_debug(LOG_PREFIX,"upsert_records","updated {} of {} records".format(num_updated,len(records)))
+
+    utils.logging.log_leave_function(LOG_PREFIX,"upsert_records")
+    return num_updated
+
+def delete_records(filepath,names):
+    """Remove the records with the given names from the database."""
+    connection = connect(filepath)
+    with connection:
+        connection.executemany("DELETE FROM modules WHERE name = ?",[(name,) for name in names])
+
+def list_records(filepath):
+    """:return: List of name and kind of the records in the database, sorted by name."""
+    return [tuple(row) for row in connect(filepath).execute("SELECT name, kind FROM modules ORDER BY name")]
+
+def _intrnl_find(filepath,entry_type,conditions,params):
+    query = "SELECT modules.name, e.parent_tag, e.data FROM {} AS e JOIN modules ON modules.id = e.module_id".format(entry_type)
+    if len(conditions):
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY modules.name, e.parent_tag, e.position"
+    return [{ "module": module, "parent_tag": parent_tag, "record": orjson.loads(data) }\
+            for module, parent_tag, data in connect(filepath).execute(query,params)]
+
+def _intrnl_add_common_conditions(conditions,params,name,module,top_level):
+    if name != None:
+        conditions.append("e.name = ?")
+        params.append(name)
+    if module != None:
+        conditions.append("modules.name = ?")
+        params.append(module)
+    if top_level:
+        conditions.append("e.parent_tag = modules.name")
+
+def find_variables(filepath,name=None,f_type=None,kind=None,qualifier=None,min_rank=None,module=None,top_level=False):
+    """
+    :param str qualifier: Qualifier that the variables must have, e.g. 'device' or 'allocatable'.
+    :param int min_rank: Minimum rank of the variables, e.g. 1 for arrays.
+    :param bool top_level: Only variables declared in the specification part of a module, program, or top-level subprogram.
+    :return: List of dicts with entries 'module', 'parent_tag', and 'record' (the index record of the variable).
+    :note: Derived type variables have f_type 'type' and the name of the type as kind.
+    """
+    conditions, params = [], []
+    _intrnl_add_common_conditions(conditions,params,name,module,top_level)
+    if f_type != None:
+        conditions.append("e.f_type = ?")
+        params.append(f_type)
+    if kind != None:
+        conditions.append("e.kind = ?")
+        params.append(kind)
+    if min_rank != None:
+        conditions.append("e.rank >= ?")
+        params.append(min_rank)
+    if qualifier != None:
+        conditions.append("e.id IN (SELECT variable_id FROM variable_qualifiers WHERE qualifier = ?)")
+        params.append(qualifier)
+    return _intrnl_find(filepath,"variables",conditions,params)
+
+def find_types(filepath,name=None,module=None,top_level=False):
+    """:return: List of dicts with entries 'module', 'parent_tag', and 'record', see find_variables."""
+    conditions, params = [], []
+    _intrnl_add_common_conditions(conditions,params,name,module,top_level)
+    return _intrnl_find(filepath,"types",conditions,params)
+
+def find_subprograms(filepath,name=None,kind=None,attribute=None,module=None,top_level=False):
+    """
+    :param str kind: 'subroutine' or 'function'.
+    :param str attribute: Attribute that the subprograms must have, e.g. 'global' or 'device'.
+    :return: List of dicts with entries 'module', 'parent_tag', and 'record', see find_variables.
+    """
+    conditions, params = [], []
+    _intrnl_add_common_conditions(conditions,params,name,module,top_level)
+    if kind != None:
+        conditions.append("e.kind = ?")
+        params.append(kind)
+    if attribute != None:
+        conditions.append("e.id IN (SELECT subprogram_id FROM subprogram_attributes WHERE attribute = ?)")
+        params.append(attribute)
+    return _intrnl_find(filepath,"subprograms",conditions,params)
+
+def find_defining_modules(filepath,entry_type,name):
+    """:return: Names of the modules, programs, and top-level subprograms whose specification part declares the entry."""
+    return list(dict.fromkeys(result["module"] for result in\
+                _intrnl_find(filepath,entry_type,["e.name = ?","e.parent_tag = modules.name"],[name])))
+
+class DatabaseRecord(modulefile.ModuleRecord):
+    """
+    Index record that is loaded lazily from a symbol database;
+    an entry list is loaded on first access of the list.
+    :see: modulefile.ModuleRecord
+    """
+    def __init__(self,filepath,name):
+        """
+        :param str filepath: Path of the database.
+        :param str name: Name of the record.
+        """
+        modulefile.ModuleRecord.__init__(self,filepath,name)
+        self._module_id = None
+        self._digest    = None
+    def _load_header(self):
+        if self._toc == None:
+            row = connect(self.filepath).execute(\
+              "SELECT id, digest, fields, entry_types, used_module_names FROM modules WHERE name = ?",\
+              (self["name"],)).fetchone()
+            if row == None:
+                msg = "symbol database '{}' does not contain record '{}' anymore".format(self.filepath,self["name"])
+                utils.logging.log_error(LOG_PREFIX,"DatabaseRecord._load_header",msg)
+                sys.exit(ERR_SYMBOLDB_MODULE_NOT_FOUND)
+            self._module_id, self._digest = row[0], row[1]
+            dict.update(self,orjson.loads(row[2]))
+            self._toc               = { entry_type: None for entry_type in orjson.loads(row[3]) }
+            self._used_module_names = orjson.loads(row[4])
+    def _load_toc(self):
+        self._load_header()
+    def _select_entries(self,entry_type,name=None):
+        query  = "SELECT data FROM {} WHERE module_id = ? AND parent_tag = ?".format(entry_type)
+        params = [self._module_id,self["name"]]
+        if name != None:
+            query += " AND name = ?"
+            params.append(name)
+        return [orjson.loads(row[0]) for row in connect(self.filepath).execute(query+" ORDER BY position",params)]
+    def _load_entries(self,entry_type):
+        self._load_header()
+        if entry_type in self._toc and not dict.__contains__(self,entry_type):
+            dict.__setitem__(self,entry_type,self._select_entries(entry_type))
+
+    def find_entries(self,entry_type,name):
+        """
+        :return: The entries of the given entry list with the given name.
+                 Only these entries are loaded if the list has not been loaded yet.
+        """
+        self._load_header()
+        if dict.__contains__(self,entry_type) or entry_type not in self._toc:
+            return [entry for entry in self[entry_type] if entry["name"] == name]
+        return self._select_entries(entry_type,name)
+    def digest(self):
+        """:return: Digest of the record, see upsert_records; does not load the entry lists."""
+        self._load_header()
+        return self._digest
+    def exports_filepath(self):
+        """:return: None; export snapshots are not stored in the database."""
+        return None
+    def __repr__(self):
+        return "DatabaseRecord({}:{})".format(self.filepath,self["name"])
+
+def load_records(filepath,names=None):
+    """
+    :param list names: Names of the records to load or None to load all.
+    :return: List of DatabaseRecords for the records in the database with the given names.
+    """
+    stored = [name for name, _ in list_records(filepath)]
+    if names != None:
+        stored_names = set(stored)
+        stored = [name for name in names if name in stored_names]
+    return [DatabaseRecord(filepath,name) for name in stored]
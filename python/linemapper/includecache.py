@@ -0,0 +1,129 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Cache for the linemaps of included files.
+
+An entry is keyed by the absolute path of the included file and the digest
+of the macro definitions at the point of inclusion. It stores the linemaps,
+the macros that the file (re)defined or removed, and the modification time and
+size of the file and of all files it includes in turn (its dependencies).
+An entry is only used if none of its dependencies changed.
+
+Entries are kept in memory (least recently used entries are dropped first) and,
+optionally, in a directory so that they can be reused across runs and by multiple processes.
+"""
+import os
+import hashlib
+import tempfile
+
+import orjson
+
+import addtoplevelpath
+import utils.logging
+from linemapper.linemap import Linemap
+
+LOG_PREFIX = "linemapper.includecache"
+
+__ENTRIES   = {} # (file path, macro digest) -> entry, in least-recently-used order
+__RECORDERS = [] # stack of dependency lists of the files that are currently processed
+
+HITS   = 0
+MISSES = 0
+
+def copy_linemaps(linemaps):
+    """:return: Copy of the linemaps that shares no mutable list with the original, see linemap.Linemap.copy."""
+    return [linemap.copy() for linemap in linemaps]
+
+def stat_dependency(filepath):
+    """:return: List of file path, modification time, and size."""
+    stat = os.stat(filepath)
+    return [filepath,stat.st_mtime_ns,stat.st_size]
+
+def begin_recording(dependency):
+    """Start recording the dependencies of a file that is going to be processed."""
+    global __RECORDERS
+    __RECORDERS.append([dependency])
+
+def end_recording():
+    """:return: Dependencies of the file that has been processed; also added to the enclosing file's dependencies."""
+    global __RECORDERS
+    dependencies = __RECORDERS.pop()
+    record_dependencies(dependencies)
+    return dependencies
+
+def record_dependencies(dependencies):
+    global __RECORDERS
+    if len(__RECORDERS):
+        __RECORDERS[-1] += dependencies
+
+def _intrnl_is_valid(entry):
+    try:
+        return all(stat_dependency(filepath) == [filepath,mtime_ns,size]\
+                   for filepath, mtime_ns, size in entry["dependencies"])
+    except OSError:
+        return False
+
+def _intrnl_disk_filepath(cache_dir,key):
+    digest = hashlib.sha256("{}\0{}".format(*key).encode()).hexdigest()
+    return os.path.join(cache_dir,digest[0:2],digest+".json")
+
+def lookup(filepath,macro_digest,cache_dir=None):
+    """
+    :param str filepath: Absolute path of the included file.
+    :param str cache_dir: Directory of the on-disk tier or None.
+    :return: Entry with entries 'dependencies', 'linemaps', 'defined', 'undefined' or None.
+             The linemaps are a copy that can be modified by the caller.
+    """
+    global __ENTRIES
+    global HITS
+    global MISSES
+    key   = (filepath,macro_digest)
+    entry = __ENTRIES.pop(key,None)
+    if entry == None and cache_dir != None:
+        try:
+            disk_filepath = _intrnl_disk_filepath(cache_dir,key)
+            with open(disk_filepath,"rb") as infile:
+                entry = orjson.loads(infile.read())
+            entry["linemaps"] = [Linemap.from_dict(linemap) for linemap in entry["linemaps"]]
+            os.utime(disk_filepath) # mark as recently used, see utils.filecache.evict
+        except (OSError,ValueError,KeyError,TypeError):
+            entry = None
+    if entry == None or not _intrnl_is_valid(entry):
+        MISSES += 1
+        return None
+    HITS += 1
+    __ENTRIES[key] = entry # mark as recently used
+    utils.logging.log_debug2(LOG_PREFIX,"lookup","reuse linemaps of included file '{}'".format(filepath))
+    return dict(entry,linemaps=copy_linemaps(entry["linemaps"]))
+
+def store(filepath,macro_digest,dependencies,linemaps,defined,undefined,max_entries,cache_dir=None):
+    """
+    :param list dependencies: Result of end_recording.
+    :param list linemaps: The linemaps of the included file; a copy is stored.
+    :param list defined: Macros (re)defined by the file, see macroexpander.MacroTable.changes_since.
+    :param list undefined: Names of macros removed by the file.
+    :param int max_entries: Maximum number of entries kept in memory.
+    """
+    global __ENTRIES
+    key   = (filepath,macro_digest)
+    entry = { "dependencies": dependencies, "linemaps": copy_linemaps(linemaps),
+              "defined": defined, "undefined": undefined }
+    __ENTRIES[key] = entry
+    while len(__ENTRIES) > max_entries:
+        __ENTRIES.pop(next(iter(__ENTRIES)))
+    if cache_dir != None:
+        disk_filepath = _intrnl_disk_filepath(cache_dir,key)
+        try:
+            os.makedirs(os.path.dirname(disk_filepath),exist_ok=True)
+            fd, tmp_filepath = tempfile.mkstemp(prefix=".tmp-",dir=os.path.dirname(disk_filepath))
+            with os.fdopen(fd,"wb") as outfile:
+                outfile.write(orjson.dumps(dict(entry,linemaps=[linemap.to_dict() for linemap in linemaps])))
+            os.replace(tmp_filepath,disk_filepath) # concurrent writers are harmless
+        except OSError as e:
+            msg = "could not write cache entry for included file '{}': {}".format(filepath,str(e))
+            utils.logging.log_warning(LOG_PREFIX,"store",msg)
+
+def clear():
+    """Remove all in-memory entries."""
+    global __ENTRIES
+    __ENTRIES.clear()
@@ -0,0 +1,164 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Compact representation of a linemap, i.e. of the lines of a single (multi-line)
+statement together with the preprocessed statements and the output of the translation.
+
+Linemaps support dict-style access with the keys in KEYS so that code that
+indexes linemaps like dicts keeps working. Compared to a dict, a Linemap
+does not allocate a hash table per line, stores its lines as tuple,
+and only allocates what is not empty:
+
+* 'included_linemaps' is an empty tuple unless the linemap is an active '#include' directive.
+* 'raw_statements' shares the 'statements' list until the linemap is marked as modified
+  or the statements differ after macro expansion.
+* 'prolog' and 'epilog' are created on first access.
+
+:note: 'statements' must only be changed after the linemap has been marked as 'modified';
+       otherwise, the change also affects 'raw_statements'.
+"""
+
+import sys
+
+KEYS = ["file","lineno","lines","raw_statements","included_linemaps","is_preprocessor_directive",
+        "is_active","statements","modified","prolog","epilog"]
+
+class Linemap:
+    __slots__ = ["file","lineno","lines","statements","is_preprocessor_directive","is_active",
+                 "_raw_statements","_included_linemaps","_modified","_prolog","_epilog"]
+
+    def __init__(self,file,lineno,lines,raw_statements,statements,included_linemaps=(),
+                 is_preprocessor_directive=False,is_active=True):
+        """
+        :param str file: Path of the file; should be the same object for all linemaps of a file.
+        :param int lineno: Number of the first line (starting at 1).
+        :param lines: The lines of the statement(s), terminated with line break characters.
+        :param list raw_statements: Statements before macro expansion.
+        :param list statements: Statements after macro expansion.
+        """
+        self.file                      = file
+        self.lineno                    = lineno
+        self.lines                     = tuple(lines)
+        self.statements                = statements
+        self.is_preprocessor_directive = is_preprocessor_directive
+        self.is_active                 = is_active
+        self._raw_statements           = None if raw_statements == statements else tuple(raw_statements)
+        self._included_linemaps        = included_linemaps if len(included_linemaps) else ()
+        self._modified                 = False
+        self._prolog                   = None
+        self._epilog                   = None
+
+    @property
+    def raw_statements(self):
+        if self._raw_statements == None:
+            return self.statements
+        return self._raw_statements
+    @property
+    def included_linemaps(self):
+        return self._included_linemaps
+    @property
+    def modified(self):
+        return self._modified
+    @modified.setter
+    def modified(self,modified):
+        if modified and self._raw_statements == None:
+            self._raw_statements = tuple(self.statements) # statements are going to be changed
+        self._modified = modified
+    @property
+    def prolog(self):
+        if self._prolog == None:
+            self._prolog = []
+        return self._prolog
+    @property
+    def epilog(self):
+        if self._epilog == None:
+            self._epilog = []
+        return self._epilog
+
+    def has_prolog(self):
+        """:return: If the linemap has a prolog; does not allocate one."""
+        return self._prolog != None and len(self._prolog) > 0
+    def has_epilog(self):
+        """:return: If the linemap has an epilog; does not allocate one."""
+        return self._epilog != None and len(self._epilog) > 0
+
+    # dict-style access
+    def __getitem__(self,key):
+        if key not in KEYS:
+            raise KeyError(key)
+        return getattr(self,key)
+    def __setitem__(self,key,value):
+        if key not in KEYS:
+            raise KeyError(key)
+        if key == "lines":
+            value = tuple(value)
+        elif key == "raw_statements":
+            key, value = "_raw_statements", tuple(value)
+        elif key == "included_linemaps":
+            key, value = "_included_linemaps", value if len(value) else ()
+        elif key in ["prolog","epilog"]:
+            key = "_"+key
+        setattr(self,key,value)
+    def __contains__(self,key):
+        return key in KEYS
+    def get(self,key,default=None):
+        return self[key] if key in KEYS else default
+    def keys(self):
+        return list(KEYS)
+    def items(self):
+        return [(key,self[key]) for key in KEYS]
+    def __eq__(self,other):
+        if isinstance(other,Linemap):
+            other = other.to_dict()
+        elif not isinstance(other,dict):
+            return NotImplemented
+        return self.to_dict() == other
+    __hash__ = None
+    def __repr__(self):
+        return "Linemap({}:{})".format(self.file,self.lineno)
+
+    def copy(self):
+        """:return: Copy that shares no mutable list with this linemap, including the included linemaps."""
+        result = Linemap.__new__(Linemap)
+        result.file                      = self.file
+        result.lineno                    = self.lineno
+        result.lines                     = self.lines
+        result.statements                = list(self.statements)
+        result.is_preprocessor_directive = self.is_preprocessor_directive
+        result.is_active                 = self.is_active
+        result._raw_statements           = self._raw_statements
+        result._included_linemaps        = tuple(linemap.copy() for linemap in self._included_linemaps)\
+                                           if len(self._included_linemaps) else ()
+        result._modified                 = self._modified
+        result._prolog                   = list(self._prolog) if self._prolog != None else None
+        result._epilog                   = list(self._epilog) if self._epilog != None else None
+        return result
+
+    @staticmethod
+    def from_dict(linemap):
+        """:return: A Linemap created from a dict with the keys in KEYS, see to_dict."""
+        result = Linemap(sys.intern(linemap["file"]),linemap["lineno"],linemap["lines"],linemap["raw_statements"],
+                         list(linemap["statements"]),
+                         tuple(Linemap.from_dict(included) for included in linemap["included_linemaps"]),
+                         linemap["is_preprocessor_directive"],linemap["is_active"])
+        result._modified = linemap["modified"]
+        if len(linemap["prolog"]):
+            result._prolog = list(linemap["prolog"])
+        if len(linemap["epilog"]):
+            result._epilog = list(linemap["epilog"])
+        return result
+    def to_dict(self):
+        """:return: A dict with the keys in KEYS (recursively), e.g. for serialization."""
+        return { 
+          "file":                      self.file,
+          "lineno":                    self.lineno,
+          "lines":                     list(self.lines),
+          "raw_statements":            list(self.raw_statements),
+          "included_linemaps":         [linemap.to_dict() for linemap in self._included_linemaps],
+          "is_preprocessor_directive": self.is_preprocessor_directive,
+          "is_active":                 self.is_active,
+          "statements":                list(self.statements),
+          "modified":                  self._modified,
+          "prolog":                    list(self._prolog) if self._prolog != None else [],
+          "epilog":                    list(self._epilog) if self._epilog != None else [],
+        }
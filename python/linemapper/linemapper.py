@@ -1,10 +1,15 @@
 import os,sys
 import re
+import itertools
 
 import addtoplevelpath
 import pyparsing as pyp
 
 import utils.logging
+import utils.fileutils
+import linemapper.macroexpander as macroexpander
+from linemapper.linemap import Linemap
+import linemapper.includecache as includecache
 
 ERR_LINEMAPPER_MACRO_DEFINITION_NOT_FOUND = 11001
 
@@ -12,59 +17,19 @@ linemapper_dir = os.path.dirname(__file__)
 exec(open("{0}/linemapper_options.py.in".format(linemapper_dir)).read())
 exec(open("{0}/grammar.py".format(linemapper_dir)).read())
 
-def _intrnl_evaluate_defined(input_string,macro_stack):
-    # expand macro; one at a time
-    result = input_string
-    macro_names = [ macro["name"] for macro in reversed(macro_stack) ]
-    iterate = True
-    while iterate:
-        iterate   = False
-        for match,start,end in pp_defined.scanString(result):
-            substring = result[start:end].strip(" \t\n")
-            subst = "1" if match.name in macro_names else "0"
-            result = result.replace(substring,subst)
-            iterate = True
-            break
-    return result
-
-def _intrnl_expand_macros(input_string,macro_stack):
-    # expand defined(...) expressions
-    result = _intrnl_evaluate_defined(input_string,macro_stack)
-    # expand macro; one at a time
-    macro_names = [ macro["name"] for macro in macro_stack ]
-    iterate    = True
-    while iterate:
-        iterate = False
-        # finds all identifiers
-        for parse_result,start,end in pp_macro_eval.scanString(result):
-            name = parse_result[0]
-            if name in macro_names:
-                substring = result[start:end].strip(" \t\n")
-                args      = parse_result[1].asList()
-                macro     = next((macro for macro in macro_stack if macro["name"] == name),None)
-                subst     = macro["subst"].strip(" \n\t")
-                for n,placeholder in enumerate(macro["args"]):
-                    subst = re.sub(r"\b{}\b".format(placeholder),args[n],subst)
-                result  = result.replace(substring,subst)
-                iterate = True
-                break
-    return result
-
-def evaluate_condition(input_string,macro_stack):
+def evaluate_condition(input_string,macros):
     """
     Evaluates preprocessor condition.
     :param str input_string: Expression as text.
-    :note: Input validation performed according to:
-           https://realpython.com/python-eval-function/#minimizing-the-security-issues-of-eval
+    :param macros: A macroexpander.MacroTable or a list of macro dicts, see USER_DEFINED_MACROS.
+    :note: Results are memoized per expression and macro table version, see macroexpander.evaluate_condition.
     """
-    transformed_input_string = pp_ops.transformString(_intrnl_expand_macros(input_string,macro_stack))
-    code = compile(transformed_input_string, "<string>", "eval") 
-    return eval(code, {"__builtins__": {}},{}) > 0
+    return macroexpander.evaluate_condition(input_string,macroexpander.create_macro_table(macros))
 
-def _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,region_stack1,region_stack2):
+def _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macros,region_stack1,region_stack2):
     """
     :param str fortran_filepath: needed to load included files where only relative path is specified
-    :param list macro_stack: A stack for storing/removing macro definition based on preprocessor directives.
+    :param MacroTable macros: Table for storing/removing macro definitions based on preprocessor directives.
     :param list region_stack1: A stack that stores if the current code region is active or inactive.
     :param list region_stack2: A stack that stores if any if/elif branch in the current if-elif-else-then
                               construct was active. This info is needed to decide if an else region 
@@ -74,7 +39,7 @@ def _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,reg
     
     def region_stack_format(stack):
         return "-".join([str(int(el)) for el in stack])
-    macro_names = ",".join([macro["name"] for macro in macro_stack])
+    macro_names = ",".join(macros.names())
     
     utils.logging.log_enter_function(LOG_PREFIX,"_intrnl_handle_preprocessor_directive",\
       {"fortran-file-path": fortran_filepath,\
@@ -101,15 +66,12 @@ def _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,reg
                    args = result.args.replace(" ","").split(",")
                else:
                    args = []
-               new_macro = { "name": result.name, "args": args, "subst": subst }
-               macro_stack.append(new_macro)
+               macros.define(result.name,args,subst)
                handled = True
            elif stripped_first_line.startswith("undef"):
                utils.logging.log_debug3(LOG_PREFIX,"_intrnl_handle_preprocessor_directive","found undef in line '{}'".format(lines[0].rstrip("\n")))
                result = pp_dir_define.parseString(single_line_statement,parseAll=True)
-               for macro in list(macro_stack): # shallow copy
-                   if macro["name"] == result.name:
-                       macro_stack.remove(macro)
+               macros.undefine(result.name)
                handled = True
            elif stripped_first_line.startswith("include"):
                utils.logging.log_debug3(LOG_PREFIX,"_intrnl_handle_preprocessor_directive","found include in line '{}'".format(lines[0].rstrip("\n")))
@@ -118,7 +80,7 @@ def _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,reg
                current_dir = os.path.dirname(fortran_filepath)
                if not filename.startswith("/") and len(current_dir):
                    filename = os.path.dirname(fortran_filepath) + "/" + filename
-               included_linemaps = _intrnl_preprocess_and_normalize_fortran_file(filename,macro_stack,region_stack1,region_stack2)
+               included_linemaps = _intrnl_preprocess_and_normalize_included_file(filename,macros,region_stack1,region_stack2)
                handled = True
         # if cond. true, push new region to stack
         if stripped_first_line.startswith("if"):
@@ -134,7 +96,7 @@ def _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,reg
                 condition = result.condition
             else:
                 condition = "0"
-            active = evaluate_condition(condition,macro_stack)
+            active = macroexpander.evaluate_condition(condition,macros)
             region_stack1.append(active)
             any_if_elif_active = active
             region_stack2.append(any_if_elif_active)
@@ -148,7 +110,7 @@ def _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,reg
                 condition = result.condition
             else:
                 condition = "0"
-            active = evaluate_condition(condition,macro_stack)
+            active = macroexpander.evaluate_condition(condition,macros)
             region_stack1.append(active)
             region_stack2[-1] = region_stack2[-1] or active
             handled = True
@@ -219,110 +181,37 @@ def _intrnl_convert_lines_to_statements(lines):
             unrolled_statements.append(indent_offset + stmt.lstrip(indent_char))
     return unrolled_statements
 
-def _intrnl_detect_line_starts(lines):
+def _intrnl_group_lines(lines):
     """Fortran statements can be broken into multiple lines 
-    via the '&'. This routine linemaps in which line a statement
-    (or multiple statements per line) begins.
-    The difference between the line numbers of consecutive entries
-    is the number of lines the first statement occupies.
+    via the '&'. This generator groups the lines that belong
+    to the same statement (or multiple statements per line).
+    :param lines: An iterable of lines, e.g. an open file; consumed lazily.
+    :return: Yields tuples of the (zero-based) index of the first line of a group and the lines of the group.
     """
     p_directive_continuation = re.compile(r"\n[!c\*]\$\w+\&")
 
     # 1. save multi-line statements (&) in buffer
     buffering  = False
-    line_starts = []
+    line_start = 0
+    buffered_lines = []
     for lineno,line in enumerate(lines,start=0):
         # Continue buffering if multiline CUF/ACC/OMP statement
         buffering |= p_directive_continuation.match(line) != None
         if not buffering:
-            line_starts.append(lineno)
+            if len(buffered_lines):
+                yield line_start, buffered_lines
+            line_start     = lineno
+            buffered_lines = []
+        buffered_lines.append(line)
         stripped_line = line.rstrip(" \t\n")  
         if len(stripped_line) and stripped_line[-1] in ['&','\\']:
             buffering = True
         else:
             buffering = False
-    line_starts.append(len(lines))
-    return line_starts
+    if len(buffered_lines):
+        yield line_start, buffered_lines
 
-def preprocess_and_normalize(fortran_file_lines,fortran_filepath,macro_stack,region_stack1,region_stack2):
-    """:param list file_lines: Lines of a file, terminated with line break characters ('\n').
-    :returns: a list of dicts with keys 'lineno', 'original_lines', 'statements'.
-    """
-    global LOG_PREFIX
-    global ERROR_HANDLING
-           
-    global INDENT_WIDTH_WHITESPACE
-    global INDENT_WIDTH_TABS
-           
-    global DEFAULT_INDENT_CHAR
-    global ONLY_APPLY_USER_DEFINED_MACROS
-
-    utils.logging.log_enter_function(LOG_PREFIX,"preprocess_and_normalize",{
-      "fortran_filepath":fortran_filepath
-    })
-    
-    assert DEFAULT_INDENT_CHAR in [' ','\t'], "Indent char must be whitespace ' ' or tab '\\t'"
-
-    # 1. detect line starts
-    line_starts = _intrnl_detect_line_starts(fortran_file_lines)
-
-    # 2. go through the blocks of buffered lines
-    linemaps = []
-    for i,_ in enumerate(line_starts[:-1]):
-        line_start     = line_starts[i]
-        next_line_start = line_starts[i+1]
-        lines         = fortran_file_lines[line_start:next_line_start]
-
-        included_linemaps = []
-        is_preprocessor_directive = lines[0].startswith("#")
-        if is_preprocessor_directive and not ONLY_APPLY_USER_DEFINED_MACROS:
-            try:
-                included_linemaps = _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,region_stack1,region_stack2)
-                statements1 = []
-                statements3 = []
-            except Exception as e:
-                raise e
-        elif region_stack1[-1]: # in_active_region
-            # Convert line to statememts
-            statements1 = _intrnl_convert_lines_to_statements(lines)
-            # 2. Apply macros to statements
-            statements2  = []
-            for stmt1 in statements1:
-                statements2.append(_intrnl_expand_macros(stmt1,macro_stack))
-            # 3. Above processing might introduce multiple statements per line againa.
-            # Hence, convert each element of statements2 to single statements again
-            statements3 = []
-            for stmt2 in statements2:
-                for stmt3 in _intrnl_convert_lines_to_statements([stmt2]):
-                    statements3.append(stmt3)
-                    # TODO(Dominic): In case, we really need to assume that people write Fortran code
-                    # such as `module mymod; integer :: myint; end module` and we therefore might
-                    # require epilog/prolog per line, this will be the place where replace 
-                    # the string stmt3 by a dictionary.
-                    # (If we would do this, we can actually also linemap positional information in a next step.)
-    
-        #if len(included_linemaps) or (not is_preprocessor_directive and region_stack1[-1]):
-        linemap = {
-          "file":                    fortran_filepath,
-          "lineno":                  line_start+1, # key
-          "lines":                   lines,
-          "raw_statements":          statements1,
-          "included_linemaps":         included_linemaps,
-          "is_preprocessor_directive": is_preprocessor_directive,
-          "is_active":                region_stack1[-1],
-          # inout
-          "statements":              statements3,
-          "modified":                False,
-          # out
-          "prolog":                  [],
-          "epilog":                  []
-        }
-        linemaps.append(linemap)
-    
-    utils.logging.log_leave_function(LOG_PREFIX,"preprocess_and_normalize")
-    return linemaps
-
-def _intrnl_preprocess_and_normalize_fortran_file(fortran_filepath,macro_stack,region_stack1,region_stack2):
+def _intrnl_preprocess_and_normalize_fortran_file(fortran_filepath,macros,region_stack1,region_stack2):
     """
     :throws: IOError if the specified file cannot be found/accessed.
     """
@@ -332,28 +221,51 @@ def _intrnl_preprocess_and_normalize_fortran_file(fortran_filepath,macro_stack,r
 
     try:
         with open(fortran_filepath,"r") as infile:
-            linemaps = preprocess_and_normalize(infile.readlines(),fortran_filepath,macro_stack,region_stack1,region_stack2)
+            linemaps = preprocess_and_normalize(infile.readlines(),fortran_filepath,macros,region_stack1,region_stack2)
             utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_preprocess_and_normalize_fortran_file")
             return linemaps
     except Exception as e:
             raise e
 
-def init_macros(options):
-    """init macro stack from compiler options and user-prescribed config values."""
-    global USER_DEFINED_MACROS
-
-    macro_stack = []
-    macro_stack += USER_DEFINED_MACROS
-    for result,_,__ in pp_compiler_option.scanString(options):
-        value = result.value
-        if value == None:
-            value == "1"
-        macro = { "name": result.name, "args": [], "subst": result.value }
-        macro_stack.append(macro)
-    return macro_stack
+def _intrnl_preprocess_and_normalize_included_file(fortran_filepath,macros,region_stack1,region_stack2):
+    """
+    Variant of _intrnl_preprocess_and_normalize_fortran_file for included files
+    that reuses the linemaps of earlier inclusions of the file with the same macro definitions,
+    see includecache. The macro definitions and removals of the file are replayed on a cache hit.
+    """
+    global INCLUDE_CACHE_ENABLE
+    global INCLUDE_CACHE_MAX_ENTRIES
+    global INCLUDE_CACHE_DIR
+
+    if not INCLUDE_CACHE_ENABLE:
+        return _intrnl_preprocess_and_normalize_fortran_file(fortran_filepath,macros,region_stack1,region_stack2)
+    macro_digest = macros.digest()
+    entry = includecache.lookup(fortran_filepath,macro_digest,INCLUDE_CACHE_DIR)
+    if entry != None:
+        includecache.record_dependencies(entry["dependencies"])
+        for macro in entry["defined"]:
+            macros.define(macro["name"],macro["args"],macro["subst"])
+        for name in entry["undefined"]:
+            macros.undefine(name)
+        return entry["linemaps"]
+    snapshot         = macros.snapshot()
+    region_stack_len = len(region_stack1)
+    includecache.begin_recording(includecache.stat_dependency(fortran_filepath))
+    try:
+        linemaps = _intrnl_preprocess_and_normalize_fortran_file(fortran_filepath,macros,region_stack1,region_stack2)
+    finally:
+        dependencies = includecache.end_recording()
+    if len(region_stack1) == region_stack_len: # do not cache files with unbalanced if-endif constructs
+        defined, undefined = macros.changes_since(snapshot)
+        includecache.store(fortran_filepath,macro_digest,dependencies,linemaps,defined,undefined,\
+          INCLUDE_CACHE_MAX_ENTRIES,INCLUDE_CACHE_DIR)
+    return linemaps
 
 def _intrnl_group_modified_linemaps(linemaps):
-    """Find contiguous blocks of modified lines and blank lines between them."""
+    """Find contiguous blocks of modified lines and blank lines between them.
+    :param linemaps: An iterable of linemaps ordered by line number; consumed lazily.
+    :return: Yields every block as soon as it is complete, i.e. as soon as a linemap that does not belong to the block has been seen.
+    """
     global LINE_GROUPING_WRAP_IN_IFDEF
     global LINE_GROUPING_INCLUDE_BLANK_LINES
     
@@ -361,7 +273,6 @@ def _intrnl_group_modified_linemaps(linemaps):
 
     EMPTY_BLOCK    = { "min_lineno": -1, "max_lineno": -1, "orig": "", "subst": "",\
                        "only_prolog": False, "only_epilog": False}
-    blocks         = []
     current_linemaps = []
 
     # auxiliary local functions
@@ -373,20 +284,18 @@ def _intrnl_group_modified_linemaps(linemaps):
             return linemap["lineno"] == max_lineno_(current_linemaps[-1])+1
         else:
             return True
-    def contains_blank_line_(linemap):
-        return len(linemap["lines"]) == 1 and not len(linemap["lines"][0].lstrip(" \t\n"))
     def was_modified_(linemap):
         modified = linemap["modified"]
         for linemap in linemap["included_linemaps"]:
             modified = modified or was_modified_(linemap)
         return modified
     def has_prolog_(linemap):
-        result = len(linemap["prolog"])
+        result = linemap.has_prolog()
         for linemap in linemap["included_linemaps"]:
             result = result or has_prolog_(linemap)
         return result
     def has_epilog_(linemap):
-        result = len(linemap["epilog"])
+        result = linemap.has_epilog()
         for linemap in linemap["included_linemaps"]:
             result = result or has_epilog_(linemap)
         return result
@@ -394,7 +303,7 @@ def _intrnl_group_modified_linemaps(linemaps):
         return "\n".join([el.rstrip("\n") for el in list_of_strings if el is not None]) + "\n"
     def collect_subst_(linemap):
         subst = []
-        if len(linemap["prolog"]):
+        if linemap.has_prolog():
             subst += linemap["prolog"]
         if len(linemap["included_linemaps"]):
             for linemap in linemap["included_linemaps"]:
@@ -403,17 +312,16 @@ def _intrnl_group_modified_linemaps(linemaps):
             subst += linemap["statements"]
         else: # for included linemaps
             subst += linemap["lines"]
-        if len(linemap["epilog"]):
+        if linemap.has_epilog():
             subst += linemap["epilog"]
         return subst
 
-    def append_current_block_if_non_empty_():
-        # append current block if it is not empty
-        # or does only contain blank lines.
-        nonlocal blocks
+    def create_block_if_non_empty_():
+        # create block from current linemaps if they are not empty
+        # or do only contain blank lines.
         nonlocal current_linemaps
         if len(current_linemaps): # remove blank lines
-            while contains_blank_line_(current_linemaps[-1]):
+            while is_blank_linemap(current_linemaps[-1]):
                 current_linemaps.pop()
         if len(current_linemaps): # len might have changed
             block = dict(EMPTY_BLOCK) # shallow copy
@@ -438,7 +346,8 @@ def _intrnl_group_modified_linemaps(linemaps):
                 block["subst"] = to_string_(linemap["prolog"] + linemap["epilog"])
             else:
                 block["subst"] = to_string_(subst)
-            blocks.append(block)
+            return block
+        return None
 
     # 1. find contiguous blocks of modified or blank lines
     # 2. blocks must start with modified lines
@@ -447,68 +356,38 @@ def _intrnl_group_modified_linemaps(linemaps):
         lineno = linemap["lineno"]
         if was_modified_(linemap) or has_prolog_(linemap) or has_epilog_(linemap):
             if not LINE_GROUPING_WRAP_IN_IFDEF or not borders_previous_linemap_(linemap):
-                append_current_block_if_non_empty_()
+                block = create_block_if_non_empty_()
+                if block != None:
+                    yield block
                 current_linemaps = []
             current_linemaps.append(linemap)
-        elif LINE_GROUPING_INCLUDE_BLANK_LINES and len(current_linemaps) and contains_blank_line_(linemap) and borders_previous_linemap_(linemap):
+        elif LINE_GROUPING_INCLUDE_BLANK_LINES and len(current_linemaps) and is_blank_linemap(linemap) and borders_previous_linemap_(linemap):
             current_linemaps.append(linemap)
-    # append last block
-    append_current_block_if_non_empty_()
+    # last block
+    block = create_block_if_non_empty_()
+    if block != None:
+        yield block
     
     utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_group_modified_linemaps")
-    
-    return blocks
 
-# API
-
-def init_macros(options):
-    """init macro stack from compiler options and user-prescribed config values."""
-    global USER_DEFINED_MACROS
-
-    macro_stack = []
-    macro_stack += USER_DEFINED_MACROS
-    for result,_,__ in pp_compiler_option.scanString(options):
-        value = result.value
-        if value == None:
-            value == "1"
-        macro = { "name": result.name, "args": [], "subst": result.value }
-        macro_stack.append(macro)
-    return macro_stack
-
-def preprocess_and_normalize(fortran_file_lines,fortran_filepath,macro_stack=[],region_stack1=[True],region_stack2=[True]):
-    """:param list file_lines: Lines of a file, terminated with line break characters ('\n').
-    :returns: a list of dicts with keys 'lineno', 'original_lines', 'statements'.
+def _intrnl_generate_linemaps(fortran_file_lines,fortran_filepath,macros,region_stack1,region_stack2):
+    """
+    Generator variant of preprocess_and_normalize; the lines are consumed lazily
+    and every linemap is yielded as soon as it is complete.
+    :param MacroTable macros: The macro table, see init_macros.
     """
-    global LOG_PREFIX
-    global ERROR_HANDLING
-           
-    global INDENT_WIDTH_WHITESPACE
-    global INDENT_WIDTH_TABS
-           
-    global DEFAULT_INDENT_CHAR
     global ONLY_APPLY_USER_DEFINED_MACROS
-
-    utils.logging.log_enter_function(LOG_PREFIX,"preprocess_and_normalize",{
-      "fortran_filepath":fortran_filepath
-    })
+    global DEFAULT_INDENT_CHAR
     
     assert DEFAULT_INDENT_CHAR in [' ','\t'], "Indent char must be whitespace ' ' or tab '\\t'"
 
-    # 1. detect line starts
-    line_starts = _intrnl_detect_line_starts(fortran_file_lines)
-
-    # 2. go through the blocks of buffered lines
-    linemaps = []
-    for i,_ in enumerate(line_starts[:-1]):
-        line_start      = line_starts[i]
-        next_line_start = line_starts[i+1]
-        lines           = fortran_file_lines[line_start:next_line_start]
-
+    # go through the groups of buffered lines
+    for line_start, lines in _intrnl_group_lines(fortran_file_lines):
         included_linemaps = []
         is_preprocessor_directive = lines[0].startswith("#")
         if is_preprocessor_directive and not ONLY_APPLY_USER_DEFINED_MACROS:
             try:
-                included_linemaps = _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macro_stack,region_stack1,region_stack2)
+                included_linemaps = _intrnl_handle_preprocessor_directive(lines,fortran_filepath,macros,region_stack1,region_stack2)
                 statements1 = []
                 statements3 = []
             except Exception as e:
@@ -519,7 +398,7 @@ def preprocess_and_normalize(fortran_file_lines,fortran_filepath,macro_stack=[],
             # 2. Apply macros to statements
             statements2  = []
             for stmt1 in statements1:
-                statements2.append(_intrnl_expand_macros(stmt1,macro_stack))
+                statements2.append(macroexpander.expand_macros(stmt1,macros))
             # 3. Above processing might introduce multiple statements per line againa.
             # Hence, convert each element of statements2 to single statements again
             statements3 = []
@@ -531,24 +410,44 @@ def preprocess_and_normalize(fortran_file_lines,fortran_filepath,macro_stack=[],
                     # require epilog/prolog per line, this will be the place where replace 
                     # the string stmt3 by a dictionary.
                     # (If we would do this, we can actually also linemap positional information in a next step.)
+        else: # inactive region
+            statements1 = []
+            statements3 = []
     
-        #if len(included_linemaps) or (not is_preprocessor_directive and region_stack1[-1]):
-        linemap = {
-          "file":                    fortran_filepath,
-          "lineno":                  line_start+1, # key
-          "lines":                   lines,
-          "raw_statements":          statements1,
-          "included_linemaps":         included_linemaps,
-          "is_preprocessor_directive": is_preprocessor_directive,
-          "is_active":                region_stack1[-1],
-          # inout
-          "statements":              statements3,
-          "modified":                False,
-          # out
-          "prolog":                  [],
-          "epilog":                  []
-        }
-        linemaps.append(linemap)
+        yield Linemap(fortran_filepath,line_start+1,lines,statements1,statements3,\
+                included_linemaps,is_preprocessor_directive,region_stack1[-1])
+
+# API
+
+def init_macros(options):
+    """
+    Init macro table from compiler options and user-prescribed config values.
+    :return: A macroexpander.MacroTable.
+    """
+    global USER_DEFINED_MACROS
+
+    macros = macroexpander.MacroTable(USER_DEFINED_MACROS)
+    for result,_,__ in pp_compiler_option.scanString(options):
+        value = result.value
+        if value == None:
+            value = "1"
+        macros.define(result.name,[],value)
+    return macros
+
+def preprocess_and_normalize(fortran_file_lines,fortran_filepath,macros=[],region_stack1=[True],region_stack2=[True]):
+    """:param list file_lines: Lines of a file, terminated with line break characters ('\n').
+    :param macros: A macroexpander.MacroTable, see init_macros, or a list of macro dicts.
+                   Definitions and removals by preprocessor directives are applied to the table.
+    :returns: a list of dicts with keys 'lineno', 'original_lines', 'statements'.
+    """
+    global LOG_PREFIX
+
+    utils.logging.log_enter_function(LOG_PREFIX,"preprocess_and_normalize",{
+      "fortran_filepath":fortran_filepath
+    })
+    
+    linemaps = list(_intrnl_generate_linemaps(fortran_file_lines,fortran_filepath,\
+      macroexpander.create_macro_table(macros),region_stack1,region_stack2))
     
     utils.logging.log_leave_function(LOG_PREFIX,"preprocess_and_normalize")
     return linemaps
@@ -574,71 +473,147 @@ def read_file(fortran_filepath,options=""):
       "options":options
     })
 
-    macro_stack = init_macros(options)
+    macros = init_macros(options)
     try:
-        linemaps = _intrnl_preprocess_and_normalize_fortran_file(fortran_filepath,macro_stack,\
+        linemaps = _intrnl_preprocess_and_normalize_fortran_file(fortran_filepath,macros,\
            region_stack1=[True],region_stack2=[True]) # init value of region_stack[0] can be arbitrary
         utils.logging.log_leave_function(LOG_PREFIX,"read_file")
         return linemaps
     except Exception as e:
         raise e
 
-def write_modified_file(outfile_path,infile_path,linemaps,preamble=""):
-    """TODO docu"""
-    global LINE_GROUPING_WRAP_IN_IFDEF
-    global LINE_GROUPING_MACRO
+def iterate_file(fortran_filepath,options="",blank_linemaps=None):
+    """
+    Streaming variant of read_file. The file is read line by line
+    and every linemap is yielded as soon as it is complete, so that
+    consumers such as indexer.update_index_from_linemaps and scanner.parse_file
+    can process it before the rest of the file has been read.
+    Linemaps that are not referenced anymore by the consumer can be freed.
+
+    :param str options: a sequence of compiler options such as '-D<key> -D<key>=<value>'.
+    :param list blank_linemaps: If not None, the linemaps of blank lines are appended to this list.
+                                Besides the modified linemaps, these are the only ones that 
+                                render_modified_file considers.
+    :throws: IOError if the specified file cannot be found/accessed.
+    """
+    global LOG_PREFIX
+
+    utils.logging.log_enter_function(LOG_PREFIX,"iterate_file",{
+      "fortran_filepath":fortran_filepath,
+      "options":options
+    })
+
+    macros = init_macros(options)
+    with open(fortran_filepath,"r") as infile:
+        for linemap in _intrnl_generate_linemaps(infile,fortran_filepath,macros,\
+          region_stack1=[True],region_stack2=[True]):
+            if blank_linemaps != None and is_blank_linemap(linemap):
+                blank_linemaps.append(linemap)
+            yield linemap
     
-    utils.logging.log_enter_function(LOG_PREFIX,"write_modified_file",\
-      {"infile_path":infile_path,"outfile_path":outfile_path})
+    utils.logging.log_leave_function(LOG_PREFIX,"iterate_file")
 
-    blocks = _intrnl_group_modified_linemaps(linemaps)
-
-    output      = ""
-    block_id     = 0
-    lines_to_skip = -1
-    with open(infile_path,"r") as infile:
-        for lineno,line in enumerate(infile.readlines(),start=1):
-            if block_id < len(blocks) and\
-               lineno == blocks[block_id]["min_lineno"]:
-                block       = blocks[block_id]
-                lines_to_skip = block["max_lineno"] - block["min_lineno"]
-                subst       = block["subst"].rstrip("\n")
-                original    = block["orig"].rstrip("\n")
-                if LINE_GROUPING_WRAP_IN_IFDEF:
-                    if block["only_epilog"]:
-                        output += "{2}\n#ifdef {0}\n{1}\n#endif\n".format(\
-                          LINE_GROUPING_IFDEF_MACRO,subst,original)
-                    elif block["only_prolog"]:
-                        output += "#ifdef {0}\n{1}\n#endif\n{2}\n".format(\
-                          LINE_GROUPING_IFDEF_MACRO,subst,original)
-                    else:
-                        if len(block["subst"].strip(" \n\t")):
-                            output += "#ifdef {0}\n{1}\n#else\n{2}\n#endif\n".format(\
-                              LINE_GROUPING_IFDEF_MACRO,subst,original)
-                        else:
-                            output += "#ifndef {0}\n{2}\n#endif\n".format(\
-                              LINE_GROUPING_IFDEF_MACRO,subst,original)
-                else:
-                    if block["only_epilog"]:
-                        output += original + "\n" + subst + "\n"
-                    elif block["only_prolog"]:
-                        output += subst + "\n" + original + "\n"
-                    else:
-                        output += subst + "\n"
-                block_id +=1
-            elif lines_to_skip > 0:
-                lines_to_skip -= 1
+def is_blank_linemap(linemap):
+    """:return: If the linemap consists of a single blank line."""
+    return len(linemap["lines"]) == 1 and not len(linemap["lines"][0].lstrip(" \t\n"))
+
+def _intrnl_render_block(block):
+    """:return: The text that replaces the lines of a block of modified lines."""
+    global LINE_GROUPING_WRAP_IN_IFDEF
+    global LINE_GROUPING_IFDEF_MACRO
+    subst    = block["subst"].rstrip("\n")
+    original = block["orig"].rstrip("\n")
+    if LINE_GROUPING_WRAP_IN_IFDEF:
+        if block["only_epilog"]:
+            return "{2}\n#ifdef {0}\n{1}\n#endif\n".format(\
+              LINE_GROUPING_IFDEF_MACRO,subst,original)
+        elif block["only_prolog"]:
+            return "#ifdef {0}\n{1}\n#endif\n{2}\n".format(\
+              LINE_GROUPING_IFDEF_MACRO,subst,original)
+        elif len(block["subst"].strip(" \n\t")):
+            return "#ifdef {0}\n{1}\n#else\n{2}\n#endif\n".format(\
+              LINE_GROUPING_IFDEF_MACRO,subst,original)
+        else:
+            return "#ifndef {0}\n{2}\n#endif\n".format(\
+              LINE_GROUPING_IFDEF_MACRO,subst,original)
+    else:
+        if block["only_epilog"]:
+            return original + "\n" + subst + "\n"
+        elif block["only_prolog"]:
+            return subst + "\n" + original + "\n"
+        else:
+            return subst + "\n"
+
+def _intrnl_generate_modified_file(infile_path,linemaps,preamble):
+    """
+    Generator for the content of the modified file. Yields the preamble, 
+    the unmodified line ranges of the input file as they are,
+    and the substitutions of the blocks of modified lines in between.
+    Trailing line breaks are removed at the end.
+    """
+    global LINE_GROUPING_WRAP_IN_IFDEF
+    global LINE_GROUPING_IFDEF_MACRO
+
+    def generate_chunks_():
+        if preamble != None and len(preamble):
+            if LINE_GROUPING_WRAP_IN_IFDEF:
+                yield "#ifdef {}\n{}\n#endif\n".format(\
+                  LINE_GROUPING_IFDEF_MACRO,preamble.rstrip("\n"))
             else:
-                output += line
-    if preamble != None and len(preamble):
-        if LINE_GROUPING_WRAP_IN_IFDEF:
-            preamble2 = "#ifdef {}\n{}\n#endif".format(\
-              LINE_GROUPING_IFDEF_MACRO,preamble.rstrip("\n"))
+                yield preamble.rstrip("\n") + "\n"
+        with open(infile_path,"r") as infile:
+            lineno = 1 # number of the next line to read
+            for block in _intrnl_group_modified_linemaps(linemaps):
+                if block["min_lineno"] < lineno: # overlaps with previous block
+                    continue
+                num_lines = block["min_lineno"] - lineno
+                lines     = list(itertools.islice(infile,num_lines))
+                yield "".join(lines)
+                if len(lines) < num_lines: # block starts after end of file
+                    return
+                yield _intrnl_render_block(block)
+                num_lines = block["max_lineno"] - block["min_lineno"] + 1
+                for _ in itertools.islice(infile,num_lines): # skip the block's lines
+                    pass
+                lineno = block["max_lineno"] + 1
+            for data in iter(lambda: infile.read(1024**2),""):
+                yield data
+
+    # remove trailing line breaks
+    pending = ""
+    for chunk in generate_chunks_():
+        stripped = chunk.rstrip("\n")
+        if len(stripped):
+            yield pending + stripped
+            pending = chunk[len(stripped):]
         else:
-            preamble2 = preamble.rstrip("\n")
-        output = preamble2+"\n" + output
-    with open(outfile_path,"w") as outfile:
-        outfile.write(output.rstrip("\n"))
+            pending += chunk
+
+def render_modified_file(infile_path,linemaps,preamble=""):
+    """
+    :param linemaps: An iterable of linemaps ordered by line number. It suffices to pass
+                     the modified linemaps and those of blank lines, see iterate_file.
+    :return: Content of the input file with the modified linemaps' lines substituted.
+    """
+    utils.logging.log_enter_function(LOG_PREFIX,"render_modified_file",\
+      {"infile_path":infile_path})
+
+    output = "".join(_intrnl_generate_modified_file(infile_path,linemaps,preamble))
+    
+    utils.logging.log_leave_function(LOG_PREFIX,"render_modified_file")
+    return output
+
+def write_modified_file(outfile_path,infile_path,linemaps,preamble=""):
+    """
+    Write the content of the input file with the modified linemaps' lines substituted.
+    The content is streamed to the output file, see utils.fileutils.write_chunks_if_changed.
+    The output file is only rewritten if its content changes.
+    """
+    utils.logging.log_enter_function(LOG_PREFIX,"write_modified_file",\
+      {"infile_path":infile_path,"outfile_path":outfile_path})
+    
+    utils.fileutils.write_chunks_if_changed(outfile_path,\
+      _intrnl_generate_modified_file(infile_path,linemaps,preamble))
     
     utils.logging.log_leave_function(LOG_PREFIX,"write_modified_file")
 
@@ -0,0 +1,271 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Single-pass macro expansion and preprocessor condition evaluation.
+
+A statement is tokenized once. Macros are looked up in a dict.
+Function-like macros are expanded recursively: arguments are fully
+expanded before they are substituted, then the substitution is rescanned
+together with the rest of the statement.
+As in cpp, every token carries the set of macros whose expansion produced it.
+A macro is not expanded again by tokens that it produced itself ('blue paint'),
+which makes self-referential macros such as '#define N N+1' terminate.
+
+Results of condition evaluation are memoized per expression and version of the macro table.
+"""
+import re
+import hashlib
+import itertools
+
+import addtoplevelpath
+import utils.logging
+
+LOG_PREFIX = "linemapper.macroexpander"
+
+CONDITION_CACHE_MAX_SIZE = 4096 # max number of memoized condition results
+
+# identifiers, numbers, string literals, whitespace, multi-char operators, any other char
+__TOKEN = re.compile(r"""[A-Za-z_]\w*|\d\w*|"[^"\n]*"|'[^'\n]*'|\s+|&&|\|\||==|!=|<=|>=|\.(?:and|or|not|true|false)\.|.""",
+                     re.IGNORECASE|re.DOTALL)
+
+__NO_MACROS = frozenset()
+
+__VERSIONS = itertools.count(1) # versions are unique across all macro tables
+
+__CONDITION_CACHE = {} # (expression, macro table version) -> bool
+__CONDITION_CODE  = {} # Python expression -> code object
+
+__PYTHON_OPERATORS = {
+  "&&": " and ", "||": " or ", "!": " not ", "/": "//",
+  ".and.": " and ", ".or.": " or ", ".not.": " not ", ".true.": "1", ".false.": "0",
+  "true": "1", "false": "0",
+}
+
+def tokenize(text):
+    """:return: List of tokens; joining them results in the input text."""
+    return __TOKEN.findall(text)
+
+def _intrnl_next_version():
+    global __VERSIONS
+    return next(__VERSIONS)
+
+def _intrnl_is_identifier(token):
+    return token[0].isalpha() or token[0] == "_"
+
+class MacroTable:
+    """
+    Macros by name. Every definition or removal of a macro
+    changes the table's version.
+    """
+    def __init__(self,macros=[]):
+        """:param list macros: dicts with entries 'name' (str), 'args' (list of str), and 'subst' (str)."""
+        self._macros = {}
+        self._digest = None
+        self.version = _intrnl_next_version()
+        for macro in macros:
+            self.define(macro["name"],macro["args"],macro["subst"])
+    def define(self,name,args,subst):
+        """
+        Define or redefine a macro. Macros with at least one argument are function-like.
+        :param str subst: Replacement text; None is treated as '1' (as for compiler option '-D<name>').
+        """
+        if subst == None:
+            subst = "1"
+        self._macros[name] = { "name": name, "args": list(args), "subst": subst,
+                               "tokens": tokenize(subst.strip(" \t\n")),
+                               "arg_index": { arg: i for i,arg in enumerate(args) } }
+        self.version = _intrnl_next_version()
+    def undefine(self,name):
+        if self._macros.pop(name,None) != None:
+            self.version = _intrnl_next_version()
+    def get(self,name):
+        return self._macros.get(name,None)
+    def digest(self):
+        """:return: Hex digest of all macro definitions; computed once per version."""
+        if self._digest == None or self._digest[0] != self.version:
+            hasher = hashlib.sha256()
+            for name in sorted(self._macros):
+                macro = self._macros[name]
+                hasher.update("{}({})={}\0".format(name,",".join(macro["args"]),macro["subst"]).encode())
+            self._digest = (self.version,hasher.hexdigest())
+        return self._digest[1]
+    def snapshot(self):
+        """:return: An opaque copy of the current definitions, see changes_since."""
+        return dict(self._macros)
+    def changes_since(self,snapshot):
+        """
+        :return: Tuple of the macros (dicts with entries 'name', 'args', 'subst') that have been (re)defined
+                 and the names of the macros that have been removed since the snapshot was taken.
+        """
+        defined = [{ "name": name, "args": macro["args"], "subst": macro["subst"] }\
+                   for name, macro in self._macros.items() if snapshot.get(name,None) is not macro]
+        undefined = [name for name in snapshot if name not in self._macros]
+        return defined, undefined
+    def names(self):
+        return list(self._macros.keys())
+    def __contains__(self,name):
+        return name in self._macros
+    def __len__(self):
+        return len(self._macros)
+
+def create_macro_table(macros):
+    """:return: macros if it is a MacroTable, else a new table with the macros of the given list."""
+    if isinstance(macros,MacroTable):
+        return macros
+    return MacroTable(macros)
+
+def _intrnl_collect_args(pending):
+    """
+    Pop the argument list of a function-like macro invocation from the stack of pending tokens.
+    :return: Tuple of the arguments (lists of tokens with surrounding whitespace removed),
+             the macros of the closing parenthesis, and the popped tokens.
+             The arguments are None if there is no (complete) argument list.
+    """
+    consumed = []
+    while len(pending) and pending[-1][0].isspace():
+        consumed.append(pending.pop())
+    if not len(pending) or pending[-1][0] != "(":
+        return None, None, consumed
+    consumed.append(pending.pop())
+    args  = [[]]
+    depth = 0
+    while len(pending):
+        token = pending.pop()
+        consumed.append(token)
+        text  = token[0]
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            if depth == 0:
+                def strip_(arg):
+                    while len(arg) and arg[0][0].isspace():
+                        arg.pop(0)
+                    while len(arg) and arg[-1][0].isspace():
+                        arg.pop()
+                    return arg
+                return [strip_(arg) for arg in args], token[1], consumed
+            depth -= 1
+        elif text == "," and depth == 0:
+            args.append([])
+            continue
+        args[-1].append(token)
+    return None, None, consumed
+
+def _intrnl_evaluate_defined(pending,macros):
+    """Pop the operand of 'defined' ('defined(NAME)' or 'defined NAME') and return '1' or '0', or None if there is no operand."""
+    consumed = []
+    def next_non_space_():
+        while len(pending) and pending[-1][0].isspace():
+            consumed.append(pending.pop())
+        if len(pending):
+            consumed.append(pending.pop())
+            return consumed[-1][0]
+        return None
+    text = next_non_space_()
+    if text == "(":
+        name = next_non_space_()
+        if name != None and _intrnl_is_identifier(name) and next_non_space_() == ")":
+            return "1" if name in macros else "0"
+    elif text != None and _intrnl_is_identifier(text):
+        return "1" if text in macros else "0"
+    pending.extend(reversed(consumed))
+    return None
+
+def _intrnl_expand(tokens,macros,in_condition):
+    """
+    :param list tokens: Tuples of token text and the set of macros that must not be expanded by the token.
+    :return: The expanded tokens, in the same format.
+    """
+    result  = []
+    pending = tokens[::-1] # the next token is at the end
+    while len(pending):
+        token = pending.pop()
+        text, painted = token
+        if in_condition and text == "defined":
+            value = _intrnl_evaluate_defined(pending,macros)
+            result.append((value,painted) if value != None else token)
+            continue
+        macro = macros.get(text)
+        if macro == None or text in painted:
+            result.append(token)
+        elif not len(macro["args"]):
+            painted = painted | {text}
+            pending.extend((subst_text,painted) for subst_text in reversed(macro["tokens"]))
+        else:
+            args, closing_painted, consumed = _intrnl_collect_args(pending)
+            if args == None or len(args) != len(macro["args"]):
+                if args != None:
+                    msg = "macro '{}' expects {} argument(s) but {} were given".format(\
+                      text,len(macro["args"]),len(args))
+                    utils.logging.log_warning(LOG_PREFIX,"_intrnl_expand",msg)
+                pending.extend(reversed(consumed))
+                result.append(token)
+                continue
+            painted = (painted & closing_painted) | {text}
+            expanded_args = [_intrnl_expand(arg,macros,in_condition) for arg in args]
+            subst = []
+            for subst_text in macro["tokens"]:
+                n = macro["arg_index"].get(subst_text,None)
+                if n != None:
+                    subst += [(arg_text,arg_painted | painted) for arg_text,arg_painted in expanded_args[n]]
+                else:
+                    subst.append((subst_text,painted))
+            pending.extend(reversed(subst))
+    return result
+
+def expand_macros(text,macros):
+    """
+    :param MacroTable macros: The defined macros.
+    :return: The text with all macros expanded. The text is returned as is if it does not use any macro.
+    """
+    if not len(macros):
+        return text
+    tokens = tokenize(text)
+    if not any(token in macros for token in tokens):
+        return text
+    return "".join(token for token,_ in _intrnl_expand([(token,__NO_MACROS) for token in tokens],macros,False))
+
+def _intrnl_convert_condition_to_python(tokens):
+    """
+    Translate an expanded condition into a Python expression.
+    Identifiers that remain after expansion evaluate to 0 as in cpp.
+    """
+    result = []
+    for token in tokens:
+        lower = token.lower()
+        if lower in __PYTHON_OPERATORS:
+            result.append(__PYTHON_OPERATORS[lower])
+        elif _intrnl_is_identifier(token):
+            result.append("0")
+        elif token[0].isdigit():
+            result.append(token.rstrip("uUlL") if not lower.startswith("0x") else token)
+        elif token[0] in "\"'":
+            raise SyntaxError("string literal in preprocessor condition: {}".format(token))
+        else:
+            result.append(token)
+    return "".join(result)
+
+def evaluate_condition(expression,macros):
+    """
+    Evaluate the condition of an '#if' or '#elif' directive.
+
+    :param str expression: Condition as text.
+    :param MacroTable macros: The defined macros.
+    :note: Only numbers, operators, and parentheses remain in the expression that is passed to eval.
+    """
+    global CONDITION_CACHE_MAX_SIZE
+    global __CONDITION_CACHE
+    global __CONDITION_CODE
+
+    key = (expression,macros.version)
+    if key not in __CONDITION_CACHE:
+        tokens = _intrnl_expand([(token,__NO_MACROS) for token in tokenize(expression)],macros,True)
+        python_expression = _intrnl_convert_condition_to_python([token for token,_ in tokens]).strip()
+        if python_expression not in __CONDITION_CODE:
+            if len(__CONDITION_CODE) >= CONDITION_CACHE_MAX_SIZE:
+                __CONDITION_CODE.clear()
+            __CONDITION_CODE[python_expression] = compile(python_expression,"<string>","eval")
+        if len(__CONDITION_CACHE) >= CONDITION_CACHE_MAX_SIZE:
+            __CONDITION_CACHE.clear()
+        __CONDITION_CACHE[key] = eval(__CONDITION_CODE[python_expression],{"__builtins__": {}},{}) > 0
+    return __CONDITION_CACHE[key]
@@ -16,8 +16,10 @@ import re
 # local includes
 import addtoplevelpath
 import translator.translator as translator
+import grammar.factory
 import indexer.scoper as scoper
 import utils.pyparsingutils
+import utils.parsingutils
 #import scanner.normalizer as normalizer
 
 SCANNER_ERROR_CODE = 1000
@@ -25,11 +27,8 @@ SCANNER_ERROR_CODE = 1000
 SUPPORTED_DESTINATION_DIALECTS = []
 RUNTIME_MODULE_NAMES = {}
 
-# dirty hack that allows us to load independent versions of the grammar module
-#from grammar import *
-CASELESS    = True
-GRAMMAR_DIR = os.path.join(os.path.dirname(__file__),"../grammar")
-exec(open("{0}/grammar.py".format(GRAMMAR_DIR)).read())
+# own grammar variant as parse actions are attached to the grammar elements
+globals().update(grammar.factory.get_grammar("scanner",caseless=True))
 scanner_dir = os.path.dirname(__file__)
 exec(open("{0}/scanner_options.py.in".format(scanner_dir)).read())
 exec(open("{0}/scanner_tree.py.in".format(scanner_dir)).read())
@@ -97,12 +96,77 @@ def _intrnl_postprocess_cuf(stree):
             last.add_to_epilog("{0}hipblasDestroy(hipblasHandle)\n".format(indent))
     utils.logging.log_leave_function(LOG_PREFIX,"_intrnl_postprocess_cuf")
 
+# statement classifier, see _intrnl_classify_statement
+__FUNCTION_PREFIXES   = ("pure","recursive","attributes","function","type","character","integer","logical","real","complex","double")
+__SUBROUTINE_PREFIXES = ("attributes","subroutine")
+__DATATYPES           = ["character","integer","logical","real","complex","double"]
+__DATATYPE            = re.compile(r"\s*\b(type\s*\(\s*\w+\s*\)|character|integer|logical|real|complex|double\s+precision)\b")
+__ALLOCATED           = re.compile(r"\ballocated\b",re.IGNORECASE)
+__STRING              = re.compile(r"'[^']*'|\"[^\"]*\"")
+__BRACKETS            = re.compile(r"\([^()]*\)")
+__MEMCPY_VALUE        = r"\s*[a-z_]\w*(?:\s*#)*(?:\s*%\s*[a-z_]\w*(?:\s*#)*)*\s*" # identifiers and derived type elements; '#' stands for bracketed expressions
+__MEMCPY              = re.compile(__MEMCPY_VALUE+"="+__MEMCPY_VALUE)
+__CUDA_LIB_CALL       = re.compile(r"\b(?:cublas|cufft|cusparse|cuda|cusolver)[a-z_]\w*\s*\(",re.IGNORECASE) # see cudaAPI in the grammar
+__STATEMENT_STATISTICS = {} # grammar rule or None -> [number of statements, number of matches]
+
+def _intrnl_is_memcpy_candidate(statement):
+    """:return: If the statement has the shape of a memcpy, i.e. '<value> = <value>' where both values are
+                (derived type elements of) identifiers followed by optional bracketed expressions."""
+    global __STRING
+    global __BRACKETS
+    global __MEMCPY
+    reduced = __STRING.sub("s",statement)
+    num_subs = 1
+    while num_subs:
+        reduced, num_subs = __BRACKETS.subn("#",reduced)
+    return __MEMCPY.fullmatch(reduced) != None
+
+def _intrnl_classify_statement(tokens,statement):
+    """
+    Selects the only grammar rule of parse_file that can match the statement, based on the leading tokens
+    and cheap checks of the statement's shape. Statements that no such rule can match, e.g. most assignments,
+    if statements, and loops, are not classified.
+    :param list tokens: The padded lower-case tokens of the statement, see utils.parsingutils.tokenize.
+    :param str statement: The tokens joined by whitespace, without comment.
+    :return: One of 'memcpy','attributes','cuf_kernel_call','subroutine','function','use','module','program', or None.
+    """
+    global __FUNCTION_PREFIXES
+    global __SUBROUTINE_PREFIXES
+    first = tokens[0]
+    if "=" in tokens and _intrnl_is_memcpy_candidate(statement):
+        return "memcpy"
+    elif first in ["use","module","program"]:
+        return first
+    elif first.startswith("attributes") and "::" in statement.split(" "):
+        return "attributes"
+    elif first.startswith("call") and "<<<" in tokens:
+        return "cuf_kernel_call"
+    elif "subroutine" in tokens and first.startswith(__SUBROUTINE_PREFIXES):
+        return "subroutine"
+    elif "function" in tokens and first.startswith(__FUNCTION_PREFIXES):
+        return "function"
+    return None
+
+def _intrnl_count_statement(rule,matched):
+    global __STATEMENT_STATISTICS
+    counts = __STATEMENT_STATISTICS.setdefault(rule,[0,0])
+    counts[0] += 1
+    counts[1] += int(matched)
+
+def statement_classifier_statistics():
+    """:return: dict that maps each grammar rule selected by the statement classifier, or 'none', to the number of statements and the number of matches."""
+    global __STATEMENT_STATISTICS
+    return { rule if rule != None else "none": { "statements": counts[0], "matched": counts[1] }\
+             for rule, counts in __STATEMENT_STATISTICS.items() }
+
 # API
 
 # Pyparsing actions that create scanner tree (ST)
 def parse_file(linemaps,index,fortran_filepath):
     """
     Generate an object tree (OT). 
+    :param linemaps: A list or any other iterable of linemaps, e.g. the generator returned by linemapper.iterate_file.
+                     The linemaps are traversed only once; the tree only keeps references to the linemaps of its nodes.
     """
     utils.logging.log_enter_function(LOG_PREFIX,"parse_file",
         {"fortran_filepath":fortran_filepath})
@@ -520,6 +584,104 @@ def parse_file(linemaps,index,fortran_filepath):
             result = tokens[0] == "end" and tokens[1] == kind
         return result
     
+    def scan_statement_legacy_():
+        """
+        Tries the grammar rules one after another; reference for scan_statement_.
+        :return: If the remaining statements of the line must be skipped.
+        """
+        if "cuf" in SOURCE_DIALECTS:
+            if "attributes" in current_tokens:
+                try_to_parse_string("attributes",attributes)
+            if "cu" in current_statement_stripped_no_comments:
+                scan_string("cuda_lib_call",cuda_lib_call)
+            if "<<<" in current_tokens:
+                try_to_parse_string("cuf_kernel_call",cuf_kernel_call)
+            for comment_char in "!*c":
+                if current_tokens[0:2]==[comment_char+"$","cuf"]:
+                    CufLoopKernel()
+        if "=" in current_tokens:
+            if not try_to_parse_string("memcpy",memcpy,parseAll=True):
+                try_to_parse_string("assignment",assignment_begin)
+                scan_string("non_zero_check",non_zero_check)
+        if "allocated" in current_tokens:
+            scan_string("allocated",ALLOCATED)
+        if "deallocate" in current_tokens:
+            try_to_parse_string("deallocate",DEALLOCATE) 
+        if "allocate" in current_tokens:
+            try_to_parse_string("allocate",ALLOCATE) 
+        if "function" in current_tokens:
+            try_to_parse_string("function",function_start)
+        if "subroutine" in current_tokens:
+            try_to_parse_string("subroutine",subroutine_start)
+        # 
+        if current_tokens[0] == "use":
+            try_to_parse_string("use",use)
+        elif current_tokens[0] == "implicit":
+            try_to_parse_string("implicit",IMPLICIT)
+        elif current_tokens[0] == "module":
+            try_to_parse_string("module",module_start)
+        elif current_tokens[0] == "program":
+            try_to_parse_string("program",program_start)
+        elif current_tokens[0] == "return":
+             Return()
+        elif current_tokens[0] in ["character","integer","logical","real","complex","double"]:
+            try_to_parse_string("declaration",datatype_reg)
+            return True
+        elif current_tokens[0] == "type" and current_tokens[1] == "(":
+            try_to_parse_string("declaration",datatype_reg)
+        return False
+
+    rules = { "memcpy": (memcpy,True), "attributes": (attributes,False), "cuf_kernel_call": (cuf_kernel_call,False),
+              "subroutine": (subroutine_start,False), "function": (function_start,False),
+              "use": (use,False), "module": (module_start,False), "program": (program_start,False) }
+    def scan_statement_():
+        """
+        Applies only the grammar rule selected by _intrnl_classify_statement, if any, and
+        detects all other statements via their tokens or regular expressions.
+        The scanner tree is the same as the one created by scan_statement_legacy_.
+        :return: If the remaining statements of the line must be skipped.
+        """
+        rule = _intrnl_classify_statement(current_tokens,current_statement_stripped_no_comments)
+        matched = False
+        def apply_rule_(name):
+            nonlocal matched
+            if rule == name:
+                expression, parse_all = rules[rule]
+                matched = try_to_parse_string(rule,expression,parse_all)
+            return rule == name and matched
+        if "cuf" in SOURCE_DIALECTS:
+            apply_rule_("attributes")
+            if __CUDA_LIB_CALL.search(current_statement):
+                scan_string("cuda_lib_call",cuda_lib_call)
+            apply_rule_("cuf_kernel_call")
+            for comment_char in "!*c":
+                if current_tokens[0:2]==[comment_char+"$","cuf"]:
+                    CufLoopKernel()
+        if not apply_rule_("memcpy") and "=" in current_tokens and in_kernels_acc_region_and_not_recording():
+            try_to_parse_string("assignment",assignment_begin) # only has an effect in kernels regions
+        if "allocated" in current_tokens and __ALLOCATED.search(current_statement):
+            Allocated([])
+        if current_tokens[0] == "deallocate":
+            Deallocate([])
+        elif current_tokens[0] == "allocate":
+            Allocate([])
+        for name in ["function","subroutine","use","module","program"]:
+            apply_rule_(name)
+        _intrnl_count_statement(rule,matched)
+        #
+        if current_tokens[0] == "implicit":
+            PlaceHolder([])
+        elif current_tokens[0] == "return":
+            Return()
+        elif current_tokens[0] in __DATATYPES:
+            if __DATATYPE.match(current_statement_stripped_no_comments):
+                Declaration()
+            return True
+        elif current_tokens[0] == "type" and current_tokens[1] == "(":
+            if __DATATYPE.match(current_statement_stripped_no_comments):
+                Declaration()
+        return False
+    
     # parser loop
     for current_linemap in linemaps:
         condition1 = current_linemap["is_active"]
@@ -550,51 +712,15 @@ def parse_file(linemaps,index,fortran_filepath):
                                     AccDirective()
                                 elif current_tokens[0:2]==[comment_char+"$","gpufort"]:
                                     GpufortControl()
-                        if "cuf" in SOURCE_DIALECTS:
-                            if "attributes" in current_tokens:
-                                try_to_parse_string("attributes",attributes)
-                            if "cu" in current_statement_stripped_no_comments:
-                                scan_string("cuda_lib_call",cuda_lib_call)
-                            if "<<<" in current_tokens:
-                                try_to_parse_string("cuf_kernel_call",cuf_kernel_call)
-                            for comment_char in "!*c":
-                                if current_tokens[0:2]==[comment_char+"$","cuf"]:
-                                    CufLoopKernel()
-                        if "=" in current_tokens:
-                            if not try_to_parse_string("memcpy",memcpy,parseAll=True):
-                                try_to_parse_string("assignment",assignment_begin)
-                                scan_string("non_zero_check",non_zero_check)
-                        if "allocated" in current_tokens:
-                            scan_string("allocated",ALLOCATED)
-                        if "deallocate" in current_tokens:
-                            try_to_parse_string("deallocate",DEALLOCATE) 
-                        if "allocate" in current_tokens:
-                            try_to_parse_string("allocate",ALLOCATE) 
-                        if "function" in current_tokens:
-                            try_to_parse_string("function",function_start)
-                        if "subroutine" in current_tokens:
-                            try_to_parse_string("subroutine",subroutine_start)
-                        # 
-                        if current_tokens[0] == "use":
-                            try_to_parse_string("use",use)
-                        elif current_tokens[0] == "implicit":
-                            try_to_parse_string("implicit",IMPLICIT)
-                        elif current_tokens[0] == "module":
-                            try_to_parse_string("module",module_start)
-                        elif current_tokens[0] == "program":
-                            try_to_parse_string("program",program_start)
-                        elif current_tokens[0] == "return":
-                             Return()
-                        elif current_tokens[0] in ["character","integer","logical","real","complex","double"]:
-                            try_to_parse_string("declaration",datatype_reg)
+                        skip_remaining_statements = scan_statement_() if CLASSIFY_STATEMENTS else scan_statement_legacy_()
+                        if skip_remaining_statements:
                             break
-                        elif current_tokens[0] == "type" and current_tokens[1] == "(":
-                            try_to_parse_string("declaration",datatype_reg)
                     else:
                         current_node.add_linemap(current_linemap)
                         current_node._last_statement_index = current_statement_no
 
     assert type(current_node) is STRoot
+    utils.logging.log_debug(LOG_PREFIX,"parse_file","statement classifier statistics: {}".format(statement_classifier_statistics()))
     utils.logging.log_leave_function(LOG_PREFIX,"parse_file")
     return current_node
 
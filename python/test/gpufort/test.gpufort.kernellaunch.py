@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import time
+import shutil
+import subprocess
+import unittest
+
+import addtoplevelpath
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TMP_DIR  = os.path.join(TEST_DIR,"tmp")
+GPUFORT  = os.path.join(TEST_DIR,"../../gpufort.py")
+
+# kernel and loop kernel use arrays whose shape depends on the host's parameter 'n'
+VECTOR_ADD = """\
+program main
+  use cudafor
+  implicit none
+  integer, parameter :: n = 40000
+  real :: x(n), y(n), a
+  real, device :: x_d(n), y_d(n)
+  type(dim3) :: grid, tBlock
+  integer :: i
+
+  tBlock = dim3(256,1,1)
+  grid = dim3(ceiling(real(n)/tBlock%x),1,1)
+
+  x = 1.0; y = 2.0; a = 2.0
+  x_d = x
+  y_d = y
+
+  call gpuKernel<<<grid, tBlock>>>(a,x_d,y_d)
+
+  !$cuf kernel do(1) <<<grid, tBlock>>>
+  do i = 1, n
+    y_d(i) = y_d(i) + a*x_d(i)
+  end do
+
+  y = y_d
+contains
+
+  attributes(global) subroutine gpuKernel(a,x,y)
+    implicit none
+    integer :: i
+    real :: x(n), y(n), a
+    i = threadidx%x + (blockIdx%x-1)*blockDim%x
+    if (i <= n) then
+      y(i) = y(i) + a*x(i)
+    endif
+  end subroutine
+end program main
+"""
+
+def split_args(text):
+    """:return: The top-level arguments of a comma-separated argument list."""
+    args = []
+    depth = 0
+    current = ""
+    for char in text:
+        if char == "," and depth == 0:
+            args.append(current.strip())
+            current = ""
+            continue
+        depth += (char == "(") - (char == ")")
+        current += char
+    args.append(current.strip())
+    return args
+
+class TestKernelLaunch(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        os.makedirs(TMP_DIR)
+        self._started_at = time.time()
+    def tearDown(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_launch_calls_match_interfaces(self):
+        with open(os.path.join(TMP_DIR,"vector-add.f90"),"w") as outfile:
+            outfile.write(VECTOR_ADD)
+        subprocess.check_call([sys.executable,GPUFORT,"vector-add.f90","-E","hip","--working-dir",TMP_DIR],\
+          stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        with open(os.path.join(TMP_DIR,"vector-add.f90-gpufort.f08"),"r") as infile:
+            calls = re.findall(r"call\s+(launch_\w+)\s*\((.*)\)\s*$",infile.read(),re.IGNORECASE|re.MULTILINE)
+        with open(os.path.join(TMP_DIR,"vector-add.f90-fort2hip.f08"),"r") as infile:
+            interfaces = { name.lower(): args for name, args in\
+              re.findall(r"subroutine\s+(launch_\w+)\s*\(([^)]*)\)",infile.read().replace("&",""),re.IGNORECASE) }
+        self.assertEqual(len(calls),2) # kernel and loop kernel
+        for name, args in calls:
+            self.assertIn(name.lower(),interfaces)
+            self.assertEqual(len(split_args(args)),len(split_args(interfaces[name.lower()])),name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import json
+import shutil
+import socket
+import subprocess
+import unittest
+
+import addtoplevelpath
+import gpufort
+import indexer.indexer as indexer
+
+TEST_DIR    = os.path.dirname(os.path.abspath(__file__))
+TMP_DIR     = os.path.join(TEST_DIR,"tmp")
+SOCKET_PATH = os.path.join(TMP_DIR,"gpufort.sock")
+GPUFORT     = os.path.join(TEST_DIR,"../../gpufort.py")
+
+def send(data,read_response=True):
+    """Send raw data to the daemon; :return: The decoded response or None."""
+    with socket.socket(socket.AF_UNIX,socket.SOCK_STREAM) as client:
+        client.connect(SOCKET_PATH)
+        client.sendall(data.encode())
+        if not read_response:
+            return None
+        with client.makefile("r") as stream:
+            return json.loads(stream.readline())
+
+class TestServe(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        os.makedirs(TMP_DIR)
+        self._daemon = subprocess.Popen([sys.executable,GPUFORT,"--serve",SOCKET_PATH,"--working-dir",TMP_DIR],\
+          stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        for _ in range(600):
+            if os.path.exists(SOCKET_PATH):
+                break
+            time.sleep(0.1)
+        self._started_at = time.time()
+    def tearDown(self):
+        if self._daemon.poll() == None:
+            self._daemon.kill()
+        self._daemon.wait()
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_bad_requests_do_not_stop_daemon(self):
+        for data in ['{"command":"translate"}\n','{"command":"translate","input":""}\n','{"input":5}\n',
+                     '{"input":"x.f90","search_dirs":[""]}\n','[]\n','"ping"\n','no json\n']:
+            self.assertEqual(send(data)["status"],"failed",data)
+        send('{"command":"ping"}\n',read_response=False) # client disconnects before the response is written
+        self.assertEqual(send('{"command":"ping"}\n')["message"],"pong")
+        self.assertEqual(send('{"command":"shutdown"}\n')["status"],"ok")
+        self.assertEqual(self._daemon.wait(60),0)
+    def test_1_load_used_module_files_only(self):
+        def module_(name,used_modules=[]):
+            return { "kind": "module", "name": name, "types": [], "subprograms": [], "variables": [],
+                     "used_modules": [{ "name": used, "only": [] } for used in used_modules] }
+        indexer.write_gpufort_module_files([module_("a",["b"]),module_("b"),module_("unrelated")],TMP_DIR)
+        for names, expected in [(["a"],["a","b"]),(["b"],["b"]),(None,["a","b","unrelated"])]:
+            index = []
+            gpufort._intrnl_serve_load_gpufort_module_files([TMP_DIR],names,index)
+            self.assertEqual(sorted(mod["name"] for mod in index),expected)
+        self.assertEqual(send('{"command":"shutdown"}\n')["status"],"ok")
+
+if __name__ == '__main__':
+    unittest.main()
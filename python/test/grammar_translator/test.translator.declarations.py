@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+import addtoplevelpath
+import os,sys
+import re
+import time
+import unittest
+import pyparsing
+import translator.translator as translator
+import linemapper.linemapper as linemapper
+import utils.logging
+
+print("Running test '{}'".format(os.path.basename(__file__)),end="",file=sys.stderr)
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+ROOT_DIR    = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","..","..")
+DECLARATION = re.compile(r"\s*(integer|real|double\s+precision|logical|complex|character|type\s*\()[^:]*::",re.IGNORECASE)
+
+def collect_declarations():
+    """:return: Declaration statements of the Fortran test inputs and examples."""
+    statements = []
+    for search_dir in ["python/test","examples"]:
+        for root, dirs, files in os.walk(os.path.join(ROOT_DIR,search_dir)):
+            for filename in sorted(files):
+                if filename.lower().endswith((".f90",".f03",".cuf")):
+                    for linemap in linemapper.read_file(os.path.join(root,filename)):
+                        statements += [statement for statement in linemap["statements"] if DECLARATION.match(statement)]
+    return statements
+
+def dump(node):
+    """:return: Nested representation of a translator tree without parse locations."""
+    if isinstance(node,(pyparsing.ParseResults,list,tuple)):
+        return [dump(child) for child in node]
+    elif isinstance(node,translator.TTNode):
+        return [type(node).__name__,{ key: dump(value) for key, value in node.__dict__.items()\
+                                      if key not in ["_input","_location","parent"] }]
+    return node
+
+class TestTranslatorDeclarations(unittest.TestCase):
+    def setUp(self):
+        self._started_at = time.time()
+    def tearDown(self):
+        translator.FAST_DECLARATION_PARSER = True
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 9)))
+    def _parse(self,statement,fast):
+        """:return: Tree and index records or None if the statement cannot be parsed, e.g. 'logical :: l = .true.'."""
+        translator.FAST_DECLARATION_PARSER = fast
+        try:
+            ttdeclaration = translator.parse_declaration(statement)
+        except SystemExit:
+            return None
+        return dump(ttdeclaration), translator.create_index_records_from_declaration(ttdeclaration)
+    def test_0_fast_path_is_identical(self):
+        statements = collect_declarations() + [
+          "real(8), dimension(:,:), pointer :: x",
+          "integer, intent(in) :: n, m(n), k(-1:n), l(0:), u(:n), s(*)",
+          "integer, intent(inout) :: a(1:n,2), b(n:m)",
+          "real, parameter :: eps = 1.0e-5, two = 2.0_8, minus = -1, tiny = .5d0, alias = eps",
+          "double precision, dimension(n) :: y = 0",
+          # forms that are handled by pyparsing
+          "real :: x(n+1), y(0:n-1), z(1:n:2), w(size(x,1))",
+          "complex :: c = (1.0,2.0)",
+          "type(dim3), pointer :: p, q(:)",
+        ]
+        self.assertGreater(len(statements),20)
+        for statement in statements:
+            self.assertEqual(self._parse(statement,True),self._parse(statement,False),statement)
+
+if __name__ == '__main__':
+    unittest.main()
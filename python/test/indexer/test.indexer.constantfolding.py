@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import time
+import unittest
+
+import addtoplevelpath
+import indexer.constantfolding as constantfolding
+import utils.logging
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE    = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+CONSTANTS = { "n": 100, "dp": 8, "pi": 3.5 }
+
+class TestConstantFolding(unittest.TestCase):
+    def setUp(self):
+        self._started_at = time.time()
+    def tearDown(self):
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_integer_arithmetic(self):
+        for expression, value in [("2*n+1",201),("(n-1)/2",49),("-7/2",-3),("-2**2",-4),("2**3**2",512),
+                                  ("n - (-n) + 1",201),("mod(-7,3)",-1),("modulo(-7,3)",2),("max(n,3,2*n)",200)]:
+            self.assertEqual(constantfolding.fold(expression,CONSTANTS.get),value,expression)
+    def test_1_kinds_and_reals(self):
+        for expression, value in [("selected_real_kind(15, 307)",8),("selected_real_kind(p=6)",4),("selected_int_kind(9)",4),
+                                  ("kind(1.0d0)",8),("kind(1.0)",4),("kind(1_8)",8),("4_dp",4),("1.5_dp*2",3.0),("int(pi)",3)]:
+            self.assertEqual(constantfolding.fold(expression,CONSTANTS.get),value,expression)
+    def test_2_not_constant(self):
+        for expression in ["n*m","size(a,1)","2**-1","n/0","x%n","huge(1)"]:
+            self.assertIsNone(constantfolding.fold(expression,CONSTANTS.get),expression)
+    def test_3_substitute(self):
+        self.assertEqual(constantfolding.substitute("n*m + size(n)",CONSTANTS.get),"100*m + size(100)")
+        self.assertEqual(constantfolding.substitute("dp(1)",CONSTANTS.get),"dp(1)") # function call or array element
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import os
+import time
+import shutil
+import unittest
+
+import addtoplevelpath
+import indexer.indexer as indexer
+import indexer.declarationcache as declarationcache
+import linemapper.linemapper as linemapper
+import utils.logging
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE    = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+TMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),"tmp")
+
+class TestDeclarationCache(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        declarationcache.clear()
+        indexer.DECLARATION_CACHE_DIR = None
+        self._started_at = time.time()
+    def tearDown(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        indexer.DECLARATION_CACHE_ENABLE = True
+        indexer.DECLARATION_CACHE_DIR    = None
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def _create_index(self):
+        index = []
+        indexer.update_index_from_linemaps(linemapper.read_file("test_modules.f90","-DCUDA"),index)
+        return index
+    def test_0_normalize(self):
+        self.assertEqual(declarationcache.normalize("  REAL(rstd),  dimension(:,:),pointer :: X "),
+                         "real(rstd), dimension(:,:),pointer :: x")
+        self.assertEqual(declarationcache.normalize("character(len=5), parameter :: s = 'a  b' "),
+                         "character(len=5), parameter :: s = 'a  b'")
+    def test_1_lookup_returns_copies(self):
+        statement = "real(rstd), dimension(:,:), pointer :: x"
+        self.assertEqual(declarationcache.lookup(statement),None)
+        records = indexer._intrnl_create_index_records_from_declaration(statement)
+        hits = declarationcache.HITS
+        cached_records = indexer._intrnl_create_index_records_from_declaration("REAL(rstd),  dimension(:,:),   pointer :: X")
+        self.assertEqual(declarationcache.HITS-hits,1)
+        self.assertEqual(cached_records,records)
+        cached_records[0]["qualifiers"].append("device")
+        self.assertEqual(declarationcache.lookup(statement),records)
+    def test_2_index_does_not_change(self):
+        indexer.DECLARATION_CACHE_ENABLE = False
+        expected = self._create_index()
+        indexer.DECLARATION_CACHE_ENABLE = True
+        self.assertEqual(self._create_index(),expected)
+        hits = declarationcache.HITS
+        self.assertEqual(self._create_index(),expected)
+        self.assertGreater(declarationcache.HITS,hits)
+    def test_3_disk_tier(self):
+        indexer.DECLARATION_CACHE_DIR = TMP_DIR
+        expected = self._create_index()
+        declarationcache.clear()
+        misses = declarationcache.MISSES
+        self.assertEqual(self._create_index(),expected)
+        self.assertEqual(declarationcache.MISSES,misses)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import time
+import unittest
+
+import addtoplevelpath
+import indexer.dependencygraph as dependencygraph
+import linemapper.linemapper as linemapper
+import utils.logging
+
+utils.logging.VERBOSE = False
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+def scan_snippet(snippet):
+    linemaps = linemapper.preprocess_and_normalize(snippet.split("\n"),"dummy.f90",linemapper.init_macros(""))
+    return dependencygraph.scan_linemaps(linemaps)
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self._started_at = time.time()
+    def tearDown(self):
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_scan_linemaps(self):
+        modules = scan_snippet("""
+module a
+  use b
+  use, intrinsic :: iso_c_binding
+contains
+  module procedure f
+end module a
+module c
+  use a
+#ifdef UNDEFINED
+  use d
+#endif
+end module c""")
+        self.assertEqual(modules["defined"],["a","c"])
+        self.assertEqual(modules["used"],["b","iso_c_binding"])
+    def test_1_schedule_waves(self):
+        file_modules = {
+          "main.f90": { "defined": [],    "used": ["b","c","iso_c_binding","missing"] },
+          "b.f90":    { "defined": ["b"], "used": ["a"] },
+          "c.f90":    { "defined": ["c"], "used": ["a"] },
+          "a.f90":    { "defined": ["a"], "used": [] },
+        }
+        graph, missing = dependencygraph.create_dependency_graph(file_modules)
+        self.assertEqual(missing,{ "missing": ["main.f90"] })
+        waves, cycle = dependencygraph.schedule_waves(graph)
+        self.assertEqual(waves,[["a.f90"],["b.f90","c.f90"],["main.f90"]])
+        self.assertEqual(cycle,[])
+    def test_2_detect_cycle(self):
+        file_modules = {
+          "a.f90": { "defined": ["a"], "used": [] },
+          "b.f90": { "defined": ["b"], "used": ["a","c"] },
+          "c.f90": { "defined": ["c"], "used": ["b"] },
+          "d.f90": { "defined": ["d"], "used": ["c"] },
+        }
+        graph, _ = dependencygraph.create_dependency_graph(file_modules)
+        waves, cycle = dependencygraph.schedule_waves(graph)
+        self.assertEqual(waves,[["a.f90"]])
+        self.assertEqual(cycle,["b.f90","c.f90","b.f90"])
+
+if __name__ == '__main__':
+    unittest.main()
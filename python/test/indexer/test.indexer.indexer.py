@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
+import os
 import time
+import shutil
 import unittest
 import cProfile,pstats,io
 
 import addtoplevelpath
 import indexer.indexer as indexer
 import indexer.scoper as scoper
+import indexer.modulefile as modulefile
 import utils.logging
 import linemapper.linemapper as linemapper
 
@@ -155,6 +158,65 @@ class TestIndexer(unittest.TestCase):
         self.assertEqual(func4["result_name"],"func4")
         self.assertEqual(len(func4["subprograms"]),0)
         self.assertEqual(func4["attributes"],["host","device"])
+    def test_8_indexer_parse_declarations_in_worker_processes(self):
+        linemaps = linemapper.read_file("test_modules.f90",gfortran_options)
+        serial_index = []
+        indexer.update_index_from_linemaps(linemaps,serial_index)
+        pool_size, batch_size = indexer.PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE, indexer.PARSE_VARIABLE_DECLARATIONS_BATCH_SIZE
+        indexer.PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE = 2
+        indexer.PARSE_VARIABLE_DECLARATIONS_BATCH_SIZE       = 2
+        try:
+            parallel_index = []
+            indexer.update_index_from_linemaps(linemaps,parallel_index)
+        finally:
+            indexer.PARSE_VARIABLE_DECLARATIONS_WORKER_POOL_SIZE = pool_size
+            indexer.PARSE_VARIABLE_DECLARATIONS_BATCH_SIZE       = batch_size
+        self.assertEqual(parallel_index,serial_index)
+    def test_9_indexer_load_module_files_lazily(self):
+        linemaps = linemapper.read_file("test_modules.f90",gfortran_options)
+        written_index = []
+        indexer.update_index_from_linemaps(linemaps,written_index)
+        shutil.rmtree("tmp",ignore_errors=True)
+        os.makedirs("tmp/legacy")
+        pretty_print_index_file = indexer.PRETTY_PRINT_INDEX_FILE
+        try:
+            indexer.write_gpufort_module_files(written_index,"tmp")
+            indexer.PRETTY_PRINT_INDEX_FILE = True
+            indexer.write_gpufort_module_files(written_index,"tmp/legacy")
+            for input_dirs in [["tmp"],["tmp/legacy"],["tmp","tmp/legacy"]]:
+                loaded_index = []
+                indexer.load_gpufort_module_files(input_dirs,loaded_index)
+                self.assertEqual(sorted(mod["name"] for mod in loaded_index),sorted(mod["name"] for mod in written_index))
+                for mod in loaded_index:
+                    self.assertIsInstance(mod,modulefile.ModuleRecord)
+                    self.assertFalse(dict.__contains__(mod,"variables"))
+                    written = next(written for written in written_index if written["name"] == mod["name"])
+                    for variable in written["variables"]:
+                        self.assertEqual(mod.find_entries("variables",variable["name"]),[variable])
+                    self.assertEqual(mod.find_entries("variables","unknown"),[])
+                    self.assertEqual(mod,written)
+        finally:
+            indexer.PRETTY_PRINT_INDEX_FILE = pretty_print_index_file
+            shutil.rmtree("tmp",ignore_errors=True)
+    def test_10_indexer_load_used_module_files(self):
+        written_index = []
+        for filepath in ["test1.f90","test_modules.f90"]:
+            indexer.update_index_from_linemaps(linemapper.read_file(filepath,gfortran_options),written_index)
+        shutil.rmtree("tmp",ignore_errors=True)
+        os.makedirs("tmp")
+        try:
+            indexer.write_gpufort_module_files(written_index,"tmp")
+            for names, expected in [
+                (["simple"],["simple","simple_base","top_level_subroutine"]),
+                (["complex_types"],["complex_types","complex_types_base_2","complex_types_base_1","top_level_subroutine"]),
+                (["test1"],["test1","simple","simple_base","nested_subprograms","complex_types",
+                            "complex_types_base_2","complex_types_base_1","top_level_subroutine"]),
+                (["unknown"],["top_level_subroutine"])]:
+                loaded_index = []
+                indexer.load_used_gpufort_module_files(["tmp"],names,loaded_index)
+                self.assertEqual([mod["name"] for mod in loaded_index],expected)
+        finally:
+            shutil.rmtree("tmp",ignore_errors=True)
       
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
+import os
 import time
+import shutil
 import unittest
 
 import addtoplevelpath
@@ -22,6 +24,13 @@ USE_EXTERNAL_PREPROCESSOR = False
 # scan index
 index = []
 
+def create_module(name,variables,used_modules=[],subprograms=[]):
+    """:return: A module index record with the given variables; 'used_modules' is a list of (name,[(original,renamed)]) tuples."""
+    return { "kind": "module", "name": name, "types": [], "subprograms": subprograms,
+             "variables": [dict(scoper.EMPTY_VARIABLE,name=var_name,qualifiers=[]) for var_name in variables],
+             "used_modules": [{ "name": used, "only": [{ "original": original, "renamed": renamed } for original, renamed in only] }
+                              for used, only in used_modules] }
+
 # main file
 class TestScoper(unittest.TestCase):
     def setUp(self):
@@ -43,29 +52,133 @@ class TestScoper(unittest.TestCase):
             indexer.update_index_from_linemaps(linemapper.read_file("test1.f90",gfortran_options),self._index)
     def test_2_scoper_search_for_variables(self):
         c   = scoper.search_index_for_variable(index,"test1","c") # included from module 'simple'
-        scoper.SCOPES.clear()
+        scoper.invalidate_scopes()
         t_b = scoper.search_index_for_variable(index,"test1",\
           "t%b") # type of t included from module 'simple'
-        scoper.SCOPES.clear()
+        scoper.invalidate_scopes()
         tc_t1list_a = scoper.search_index_for_variable(index,"test1","tc%t1list(i)%a") # type of t included from module 'simple'
-        scoper.SCOPES.clear()
+        scoper.invalidate_scopes()
         tc_t2list_t1list_a = scoper.search_index_for_variable(index,"test1","tc%t2list(indexlist%j)%t1list(i)%a") 
-        scoper.SCOPES.clear()
+        scoper.invalidate_scopes()
     def test_3_scoper_search_for_variables_reuse_scope(self):
         c   = scoper.search_index_for_variable(index,"test1","c") # included from module 'simple'
         t_b = scoper.search_index_for_variable(index,"test1","t%b") # type of t included from module 'simple'
         tc_t1list_a = scoper.search_index_for_variable(index,"test1","tc%t1list(i)%a") # type of t included from module 'simple'
         tc_t2list_t1list_a = scoper.search_index_for_variable(index,"test1",\
           "tc%t2list(indexlist%j)%t1list(i)%a") 
-        scoper.SCOPES.clear()
+        scoper.invalidate_scopes()
     def test_4_scoper_search_for_subprograms(self):
         func2 = scoper.search_index_for_subprogram(index,"test1","func2")
         func3 = scoper.search_index_for_subprogram(index,"nested_subprograms:func2","func3")
         type1 = scoper.search_index_for_type(index,"complex_types","type1")
-        scoper.SCOPES.clear()
+        scoper.invalidate_scopes()
     def test_5_scoper_search_for_top_level_subprograms(self):
         func2 = scoper.search_index_for_subprogram(index,"test1","top_level_subroutine")
-        scoper.SCOPES.clear()
+        scoper.invalidate_scopes()
+    def test_6_scope_shadowing_and_list_view(self):
+        parent = scoper.create_scope(index,"nested_subprograms:func2")
+        scope  = scoper.create_scope(index,"nested_subprograms:func2:func3")
+        self.assertIsInstance(scope,scoper.Scope)
+        self.assertIs(scope.parent,parent)
+        a, found = scoper.search_scope_for_variable(scope,"a")
+        self.assertTrue(found)
+        self.assertEqual(a["f_type"],"real") # dummy argument of 'func3' shadows that of 'func2'
+        a, _ = scoper.search_scope_for_variable(scope.parent,"a")
+        self.assertEqual(a["f_type"],"integer")
+        variables = scope["variables"]
+        self.assertEqual(len(variables),len(list(variables)))
+        self.assertEqual(list(variables)[0:len(scope.parent["variables"])],list(scope.parent["variables"]))
+        self.assertIs(next(var for var in reversed(variables) if var["name"] == "a"),scope.find("variables","a"))
+        self.assertEqual(scoper.Scope.from_dict(scope.to_dict()).to_dict(),scope.to_dict())
+        scoper.invalidate_scopes()
+    def test_7_scope_cache(self):
+        scoper.invalidate_scopes()
+        max_entries = scoper.SCOPE_CACHE_MAX_ENTRIES
+        scoper.SCOPE_CACHE_MAX_ENTRIES = 2
+        try:
+            before = scoper.scope_cache_statistics()
+            simple = scoper.create_scope(index,"simple")
+            self.assertIs(scoper.create_scope(index,"simple"),simple)
+            scoper.create_scope(index,"complex_types")
+            scoper.create_scope(index,"nested_subprograms") # evicts 'simple'
+            self.assertIsNot(scoper.create_scope(index,"simple"),simple)
+            after = scoper.scope_cache_statistics()
+            self.assertEqual(after["hits"]-before["hits"],1)
+            self.assertEqual(after["misses"]-before["misses"],4)
+            self.assertEqual(after["evictions"]-before["evictions"],2)
+            self.assertEqual(after["entries"],2)
+            # scopes are not shared between indices and are renewed if the index changes
+            other_index = list(index)
+            self.assertIsNot(scoper.create_scope(other_index,"simple"),scoper.create_scope(index,"simple"))
+            simple = scoper.create_scope(other_index,"simple")
+            other_index.append(other_index[0])
+            self.assertIsNot(scoper.create_scope(other_index,"simple"),simple)
+        finally:
+            scoper.SCOPE_CACHE_MAX_ENTRIES = max_entries
+            scoper.invalidate_scopes()
+    def test_8_export_tables(self):
+        subprograms = [dict(create_module(name,[],[("right",[])]),kind="subroutine") for name in ["s1","s2"]]
+        diamond = [create_module("base",["x","y"]),
+                   create_module("left",["l"],[("base",[])]),
+                   create_module("right",["r"],[("base",[("x","rx")])]),
+                   create_module("top",[],[("left",[]),("right",[])],subprograms),
+                   create_module("c1",["a"],[("c2",[])]),
+                   create_module("c2",["b"],[("c1",[])])]
+        scope = scoper.create_scope(diamond,"top")
+        self.assertEqual([var["name"] for var in scope["variables"]],["x","y","l","rx","r"])
+        rx, found = scoper.search_scope_for_variable(scope,"rx")
+        self.assertTrue(found)
+        self.assertIsNot(rx,diamond[0]["variables"][0]) # renamed copy
+        with self.assertRaises(SystemExit): # 'only' applies to re-exports; strict error handling
+            scoper.search_scope_for_variable(scoper.create_scope(diamond,"right"),"y")
+        s1_rx, _ = scoper.search_scope_for_variable(scoper.create_scope(diamond,"top:s1"),"rx")
+        s2_rx, _ = scoper.search_scope_for_variable(scoper.create_scope(diamond,"top:s2"),"rx")
+        self.assertIs(s1_rx,s2_rx) # export table of 'right' is shared
+        self.assertTrue(scoper.search_scope_for_variable(scoper.create_scope(diamond,"c1"),"b")[1]) # cyclic use graph
+        scoper.invalidate_scopes()
+    def test_9_export_snapshots(self):
+        def load_(names):
+            loaded_index = []
+            indexer.load_used_gpufort_module_files(["tmp"],names,loaded_index)
+            return loaded_index
+        def variable_names_(scope):
+            return [var["name"] for var in scope["variables"]]
+        shutil.rmtree("tmp",ignore_errors=True)
+        os.makedirs("tmp")
+        chain = [create_module("prec",["dp"]),create_module("physics",["g"],[("prec",[])]),create_module("icosa",["n"],[("physics",[]),("cudafor",[])])]
+        indexer.WRITE_EXPORT_SNAPSHOTS = True
+        try:
+            indexer.write_gpufort_module_files(chain[0:2],"tmp")
+            indexer.write_gpufort_module_files(chain[2:],"tmp") # used modules are loaded from module files
+            self.assertTrue(os.path.exists("tmp/icosa.gpufort_exports"))
+            program = dict(create_module("main",["x"],[("icosa",[])]),kind="program")
+            loaded_index = load_(["icosa"]) + [program]
+            self.assertIsInstance(scoper._intrnl_get_export_table(loaded_index,loaded_index[0]),scoper._SnapshotExportTable)
+            self.assertEqual(variable_names_(scoper.create_scope(loaded_index,"main")),["dp","g","n","x"])
+            self.assertEqual(variable_names_(scoper.create_scope(loaded_index,"icosa")),["dp","g","n"])
+            scoper.invalidate_scopes()
+            indexer.WRITE_EXPORT_SNAPSHOTS = False
+            indexer.write_gpufort_module_files([create_module("prec",["dp","sp"])],"tmp") # snapshot of icosa is outdated
+            loaded_index = load_(["icosa"]) + [program]
+            self.assertNotIsInstance(scoper._intrnl_get_export_table(loaded_index,loaded_index[0]),scoper._SnapshotExportTable)
+            self.assertEqual(variable_names_(scoper.create_scope(loaded_index,"main")),["dp","sp","g","n","x"])
+        finally:
+            indexer.WRITE_EXPORT_SNAPSHOTS = False
+            scoper.invalidate_scopes()
+            shutil.rmtree("tmp",ignore_errors=True)
+    def test_10_resolve_parameters(self):
+        modules = []
+        indexer.update_index_from_linemaps(linemapper.read_file("test_modules.f90",gfortran_options),modules)
+        scope = scoper.create_scope(modules,"simple")
+        c, _  = scoper.search_scope_for_variable(scope,"c",resolve=True)
+        self.assertEqual((c["lbounds"],c["counts"],c["total_count"],c["total_bytes"]),(["1","1"],["100","100"],"10000","40000"))
+        self.assertEqual(c["index_macro"],"#undef _idx_c\n#define _idx_c(a,b) ((a-(1))+100*(b-(1)))")
+        self.assertIs(scoper.search_scope_for_variable(scope,"c",resolve=True)[0],c) # kept by the scope
+        self.assertEqual(scoper.search_scope_for_variable(scope,"c")[0]["counts"],["n","n"]) # index is not modified
+        e, _ = scoper.search_index_for_variable(modules,"nested_subprograms","e",resolve=True)
+        self.assertEqual((e["lbounds"],e["counts"]),(["(-1000)","(-1000)"],["2001","2001"]))
+        self.assertEqual(scoper.fold_constant_expression(scope,"selected_real_kind(15,307)*n"),800)
+        self.assertIsNone(scoper.fold_constant_expression(scope,"a*n")) # 'a' is no parameter
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import os
+import time
+import shutil
+import unittest
+
+import addtoplevelpath
+import indexer.indexer as indexer
+import indexer.scoper as scoper
+import indexer.symboldb as symboldb
+import linemapper.linemapper as linemapper
+import utils.logging
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE    = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+TMP_DIR  = os.path.join(os.path.dirname(os.path.abspath(__file__)),"tmp")
+DATABASE = os.path.join(TMP_DIR,"symbols.db")
+
+index = []
+for filepath in ["test1.f90","test_modules.f90"]:
+    indexer.update_index_from_linemaps(linemapper.read_file(filepath,"-DCUDA"),index)
+
+class TestSymbolDatabase(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        os.makedirs(TMP_DIR)
+        self._started_at = time.time()
+    def tearDown(self):
+        symboldb.close(DATABASE)
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        indexer.SYMBOL_DATABASE = None
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_upsert_is_incremental(self):
+        self.assertEqual(symboldb.upsert_records(DATABASE,index),len(index))
+        self.assertEqual(symboldb.upsert_records(DATABASE,index),0)
+        simple  = next(mod for mod in index if mod["name"] == "simple")
+        changed = dict(simple,variables=simple["variables"][1:])
+        self.assertEqual(symboldb.upsert_records(DATABASE,[changed]),1)
+        self.assertEqual(len(symboldb.find_variables(DATABASE,module=changed["name"],top_level=True)),len(changed["variables"]))
+        symboldb.delete_records(DATABASE,[changed["name"]])
+        self.assertEqual(sorted(name for name, _ in symboldb.list_records(DATABASE)),
+                         sorted(mod["name"] for mod in index if mod["name"] != "simple"))
+    def test_1_queries(self):
+        symboldb.upsert_records(DATABASE,index)
+        self.assertEqual(symboldb.find_defining_modules(DATABASE,"variables","n"),["nested_subprograms","simple"])
+        self.assertEqual(symboldb.find_defining_modules(DATABASE,"types","mytype"),["nested_subprograms","simple"])
+        device_arrays = symboldb.find_variables(DATABASE,f_type="real",qualifier="device",min_rank=1)
+        self.assertEqual([(result["parent_tag"],result["record"]["name"]) for result in device_arrays],[("simple","c")])
+        functions = symboldb.find_subprograms(DATABASE,kind="function")
+        self.assertIn("nested_subprograms:func2",[result["parent_tag"]+":"+result["record"]["name"] for result in functions])
+        self.assertEqual(symboldb.find_types(DATABASE,name="unknown"),[])
+    def test_2_database_records(self):
+        symboldb.upsert_records(DATABASE,index)
+        for mod in index:
+            record = symboldb.DatabaseRecord(DATABASE,mod["name"])
+            for variable in mod["variables"]:
+                self.assertEqual(record.find_entries("variables",variable["name"]),[variable])
+            self.assertFalse(dict.__contains__(record,"variables"))
+            self.assertEqual(record,mod)
+    def test_3_load_records_without_module_file(self):
+        indexer.SYMBOL_DATABASE = DATABASE
+        indexer.write_gpufort_module_files(index,TMP_DIR)
+        os.remove(os.path.join(TMP_DIR,"simple_base"+indexer.GPUFORT_MODULE_FILE_SUFFIX))
+        loaded_index = []
+        indexer.load_used_gpufort_module_files([TMP_DIR],["simple"],loaded_index)
+        self.assertEqual([mod["name"] for mod in loaded_index],["simple","simple_base","top_level_subroutine"])
+        self.assertIsInstance(loaded_index[1],symboldb.DatabaseRecord)
+        scope = scoper.create_scope(loaded_index,"simple")
+        self.assertIn("abc1",[variable["name"] for variable in scope["variables"]])
+
+if __name__ == '__main__':
+    unittest.main()
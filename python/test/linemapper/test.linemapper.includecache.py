@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import os
+import time
+import shutil
+import unittest
+
+import addtoplevelpath
+import linemapper.linemapper as linemapper
+import linemapper.includecache as includecache
+import utils.logging
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE    = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+TMP_DIR   = os.path.join(os.path.dirname(os.path.abspath(__file__)),"tmp")
+CACHE_DIR = os.path.join(TMP_DIR,"cache")
+
+class TestIncludeCache(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        os.makedirs(TMP_DIR)
+        includecache.clear()
+        linemapper.INCLUDE_CACHE_DIR = None
+        self._create_file("consts.h","#define N 8\n#include \"nested.h\"\n")
+        self._create_file("nested.h","#define M N*2\n")
+        self._create_file("main.f90","program main\n#include \"consts.h\"\nprint *, M\n#include \"consts.h\"\nend program\n")
+        self._started_at = time.time()
+    def tearDown(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        linemapper.INCLUDE_CACHE_DIR = None
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def _create_file(self,name,content):
+        with open(os.path.join(TMP_DIR,name),"w") as outfile:
+            outfile.write(content)
+    def _read_main(self):
+        linemaps = linemapper.read_file(os.path.join(TMP_DIR,"main.f90"))
+        return linemaps, linemapper.render_file(linemaps,stage="statements")
+    def test_0_replay_macros(self):
+        misses = includecache.MISSES
+        _, result1 = self._read_main()
+        hits = includecache.HITS
+        linemaps, result2 = self._read_main()
+        self.assertEqual(includecache.HITS-hits,2)
+        self.assertEqual(result1,result2)
+        self.assertIn("print *, 8*2",result2)
+        # cached linemaps must not be shared with the caller
+        linemaps[1]["included_linemaps"][0]["statements"].append("modified")
+        _, result3 = self._read_main()
+        self.assertEqual(result2,result3)
+    def test_1_invalidate_on_change_of_nested_file(self):
+        self._read_main()
+        time.sleep(0.01)
+        self._create_file("nested.h","#define M N*4\n")
+        _, result = self._read_main()
+        self.assertIn("print *, 8*4",result)
+    def test_2_disk_tier(self):
+        linemapper.INCLUDE_CACHE_DIR = CACHE_DIR
+        _, result1 = self._read_main()
+        includecache.clear()
+        hits = includecache.HITS
+        _, result2 = self._read_main()
+        self.assertEqual(includecache.HITS-hits,2)
+        self.assertEqual(result1,result2)
+
+if __name__ == '__main__':
+    unittest.main()
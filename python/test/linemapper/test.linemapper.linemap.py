@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import time
+import unittest
+
+import addtoplevelpath
+from linemapper.linemap import Linemap
+import utils.logging
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE    = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+def create_linemap():
+    return Linemap("test.f90",3,["a = N + &\n","  1\n"],["a = N + 1"],["a = 5 + 1"])
+
+class TestLinemap(unittest.TestCase):
+    def setUp(self):
+        self._started_at = time.time()
+    def tearDown(self):
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_dict_style_access(self):
+        linemap = create_linemap()
+        self.assertEqual(linemap["lineno"],3)
+        self.assertEqual(list(linemap["lines"]),["a = N + &\n","  1\n"])
+        self.assertEqual(len(linemap["included_linemaps"]),0)
+        self.assertFalse(linemap.has_prolog())
+        linemap["prolog"].append("! prolog")
+        self.assertTrue(linemap.has_prolog())
+        self.assertEqual(linemap.get("epilog"),[])
+        self.assertEqual(linemap.get("unknown","default"),"default")
+        with self.assertRaises(KeyError):
+            linemap["unknown"]
+        self.assertEqual(set(linemap.keys()),set(linemap.to_dict().keys()))
+    def test_1_raw_statements_are_kept_when_modified(self):
+        linemap = Linemap("test.f90",1,["a = 1\n"],["a = 1"],["a = 1"])
+        self.assertIs(linemap["raw_statements"],linemap["statements"])
+        linemap["modified"] = True
+        linemap["statements"][0] = "a = 2"
+        self.assertEqual(list(linemap["raw_statements"]),["a = 1"])
+        self.assertEqual(linemap["statements"],["a = 2"])
+    def test_2_copy_and_conversion(self):
+        linemap = create_linemap()
+        include = Linemap("test.f90",1,["#include \"a.h\"\n"],[],[],[create_linemap()],True)
+        copied  = include.copy()
+        self.assertEqual(copied,include)
+        copied["included_linemaps"][0]["statements"].append("modified")
+        self.assertNotEqual(copied,include)
+        self.assertEqual(Linemap.from_dict(include.to_dict()),include)
+        self.assertEqual(linemap,linemap.to_dict())
+
+if __name__ == '__main__':
+    unittest.main()
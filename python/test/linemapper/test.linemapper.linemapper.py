@@ -89,6 +89,22 @@ class TestIndexer(unittest.TestCase):
         self.assertEqual(clean_(result_lines),clean_(testdata_lines))
         self.assertEqual(clean_(result_raw_statements),clean_(testdata_raw_statements))
         self.assertEqual(clean_(result_statements),clean_(testdata_statements))
+    def test_2_stream(self):
+        options  = "-DCUDA -DCUDA2"
+        linemaps = linemapper.read_file("test1.f90",options)
+        stream   = linemapper.iterate_file("test1.f90",options)
+        self.assertEqual(next(stream),linemaps[0])
+        self.assertEqual([linemaps[0]]+list(stream),linemaps)
+        # rendering only needs the modified linemaps and those of blank lines
+        blank_linemaps = []
+        streamed = list(linemapper.iterate_file("test1.f90",options,blank_linemaps))
+        for linemaps_ in [linemaps,streamed]:
+            linemaps_[-1]["modified"] = True
+            linemaps_[-1]["statements"] = ["end program main ! modified"]
+        retained = sorted(blank_linemaps+[streamed[-1]],key=lambda linemap: linemap["lineno"])
+        self.assertTrue(all(linemapper.is_blank_linemap(linemap) for linemap in blank_linemaps))
+        self.assertEqual(linemapper.render_modified_file("test1.f90",retained),\
+          linemapper.render_modified_file("test1.f90",linemaps))
       
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
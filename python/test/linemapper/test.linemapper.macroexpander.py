@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import time
+import unittest
+
+import addtoplevelpath
+import linemapper.macroexpander as macroexpander
+import utils.logging
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE    = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+def create_macro_table(*definitions):
+    return macroexpander.MacroTable([{ "name": name, "args": args, "subst": subst } for name, args, subst in definitions])
+
+class TestMacroExpander(unittest.TestCase):
+    def setUp(self):
+        self._started_at = time.time()
+    def tearDown(self):
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_object_and_function_like_macros(self):
+        macros = create_macro_table(("b",[],"2"),("c",[],"5"),("size8",["x"],"8*(x)*b"),("add",["x","y"],"(x+y)"))
+        self.assertEqual(macroexpander.expand_macros("print *, size8(c)\n",macros),"print *, 8*(5)*2\n")
+        self.assertEqual(macroexpander.expand_macros("y = add(size8(1), add(b,c))",macros),"y = (8*(1)*2+(2+5))")
+        self.assertEqual(macroexpander.expand_macros("y = size8 + size8 (c)",macros),"y = size8 + 8*(5)*2")
+        self.assertEqual(macroexpander.expand_macros("y = bc + b_1 + 'b' + \"c\"",macros),"y = bc + b_1 + 'b' + \"c\"")
+    def test_1_blue_paint(self):
+        macros = create_macro_table(("n",[],"n+1"),("f",["x"],"g(x)"),("g",["x"],"f(x)*2"),("h",[],"f"))
+        self.assertEqual(macroexpander.expand_macros("a = n",macros),"a = n+1")
+        self.assertEqual(macroexpander.expand_macros("a = f(1)",macros),"a = f(1)*2")
+        # rescan of the substitution together with the rest of the statement
+        self.assertEqual(macroexpander.expand_macros("a = h(n)",macros),"a = f(n+1)*2")
+    def test_2_evaluate_condition(self):
+        macros = create_macro_table(("b",[],"5"),("a",["x"],"(5*x)"),("self",[],"defined(self)"))
+        testdata_true = [
+          "defined(a)",
+          "defined a && !defined x",
+          "a(b) > 4 .and. .not. undefined_name",
+          "self",
+          "7/2 == 3",
+        ]
+        testdata_false = [
+          "!defined(a) || defined(x) || a(5) < 1",
+          "undefined_name",
+          "a(b) != 25",
+        ]
+        for text in testdata_true:
+            self.assertTrue(macroexpander.evaluate_condition(text,macros),text)
+        for text in testdata_false:
+            self.assertFalse(macroexpander.evaluate_condition(text,macros),text)
+    def test_3_memoization_respects_macro_state(self):
+        macros = create_macro_table()
+        version = macros.version
+        self.assertFalse(macroexpander.evaluate_condition("defined(CUDA) && N > 2",macros))
+        macros.define("CUDA",[],None)
+        macros.define("N",[],"3")
+        self.assertNotEqual(macros.version,version)
+        self.assertTrue(macroexpander.evaluate_condition("defined(CUDA) && N > 2",macros))
+        macros.undefine("CUDA")
+        self.assertFalse(macroexpander.evaluate_condition("defined(CUDA) && N > 2",macros))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import os
+import time
+import unittest
+
+import addtoplevelpath
+import linemapper.linemapper as linemapper
+import indexer.indexer as indexer
+import scanner.scanner as scanner
+import utils.logging
+import utils.parsingutils
+
+LOG_FORMAT = "[%(levelname)s]\tgpufort:%(message)s"
+utils.logging.VERBOSE    = False
+utils.logging.init_logging("log.log",LOG_FORMAT,"warning")
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS   = [os.path.join(TEST_DIR,"../indexer",filename) for filename in ["test_modules.f90"]] +\
+           [os.path.join(TEST_DIR,"../../../examples",example) for example in ["cudafortran/vector-add/vector-add.f90",\
+             "cudafortran/vector-add-kernel/vector-add.f90","openacc/vector-add/vector-add.f90","openacc/vector-dot/vector-dot.f90"]]
+
+def classify(statement):
+    tokens = utils.parsingutils.tokenize(statement.lower(),padded_size=6)
+    return scanner._intrnl_classify_statement(tokens," ".join(tokens).split("!")[0])
+
+def describe(stnode,depth=0,result=None):
+    result = [] if result == None else result
+    result.append((depth,type(stnode).__name__,stnode.kind,stnode.name,[linemap["lineno"] for linemap in stnode._linemaps]))
+    for child in stnode._children:
+        describe(child,depth+1,result)
+    return result
+
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self._started_at = time.time()
+    def tearDown(self):
+        scanner.CLASSIFY_STATEMENTS = True
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def test_0_classify_statements(self):
+        for statement, rule in [("a(i)%b = c%d(j,k)","memcpy"),("istat = cudaMalloc(a, n)","memcpy"),("x = y + 1",None),
+                                ("p(1:n) = 1.0",None),("x_end = n",None),("if (x) a = b",None),("do i = 1, n",None),
+                                ("use cudafor, only: dim3","use"),("module procedure foo","module"),
+                                ("attributes(device) :: a, b","attributes"),("attributes(global) subroutine k(x) ! a :: b","subroutine"),
+                                ("attributes(device) function f(x)","function"),("double precision function f(x)","function"),
+                                ("integer :: n = 5",None),("real = x","memcpy"),("end function f",None),
+                                ("call k<<<grid, 64>>>(x)","cuf_kernel_call"),("call k(x)",None),("allocate(a(n), stat=i)",None)]:
+            self.assertEqual(classify(statement),rule,statement)
+    def test_1_same_tree_as_trying_all_rules(self):
+        statistics_before = scanner.statement_classifier_statistics()
+        for filepath in CORPUS:
+            linemaps = linemapper.read_file(filepath,"-DCUDA")
+            index = []
+            indexer.update_index_from_linemaps(linemaps,index)
+            trees = []
+            for classify_statements in [False,True]:
+                scanner.CLASSIFY_STATEMENTS = classify_statements
+                trees.append(describe(scanner.parse_file(linemaps,index,filepath)))
+            self.assertEqual(trees[0],trees[1],filepath)
+        statistics = scanner.statement_classifier_statistics()
+        for rule in ["memcpy","use","module","program","subroutine","cuf_kernel_call"]:
+            self.assertGreater(statistics[rule]["statements"],statistics_before.get(rule,{"statements":0})["statements"],rule)
+            self.assertEqual(statistics[rule]["statements"],statistics[rule]["matched"],rule)
+    def test_2_rename_cuda_symbols(self):
+        for statement, result in [("istat = cudaMemcpyAsync(a, b, n, cudaMemcpyHostToDevice, stream)","istat = hipMemcpyAsync(a, b, n, hipMemcpyHostToDevice, stream)"),
+                                  ("istat = CUDAMEMCPY2D(a, n, b, n, n, m)","istat = hipMemcpy2D(a, n, b, n, n, m)"),
+                                  ("call cublasSgemm('N','N',m,n,k,alpha,A,lda,B,ldb,beta,C,ldc)","call hipblasSgemm('N','N',m,n,k,alpha,A,lda,B,ldb,beta,C,ldc)"),
+                                  ("if (istat /= CUBLAS_STATUS_SUCCESS) x = ABS(y)","if (istat /= HIPBLAS_STATUS_SUCCESS) x = abs(y)"),
+                                  ("accumulate = current + occupancy","accumulate = current + occupancy")]:
+            self.assertEqual(scanner.rename_cuda_symbols(statement),result)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import os
+import time
+import shutil
+import unittest
+
+import addtoplevelpath
+import utils.fileutils
+import utils.filecache
+
+TMP_DIR   = os.path.join(os.path.dirname(os.path.abspath(__file__)),"tmp")
+CACHE_DIR = os.path.join(TMP_DIR,"cache")
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        os.makedirs(CACHE_DIR)
+        self._started_at = time.time()
+    def tearDown(self):
+        shutil.rmtree(TMP_DIR,ignore_errors=True)
+        elapsed = time.time() - self._started_at
+        print('{} ({}s)'.format(self.id(), round(elapsed, 6)))
+    def _create_file(self,name,content):
+        filepath = os.path.join(TMP_DIR,name)
+        with open(filepath,"w") as outfile:
+            outfile.write(content)
+        return filepath
+    def test_0_write_file_if_changed(self):
+        filepath = self._create_file("a.f90","program a\nend program")
+        os.utime(filepath,(0,0))
+        self.assertFalse(utils.fileutils.write_file_if_changed(filepath,"program a\nend program"))
+        self.assertEqual(os.path.getmtime(filepath),0)
+        self.assertTrue(utils.fileutils.write_file_if_changed(filepath,b"program b\nend program"))
+        with open(filepath,"r") as infile:
+            self.assertEqual(infile.read(),"program b\nend program")
+    def test_1_store_lookup_restore(self):
+        filepath1 = self._create_file("a.f90-gpufort.f08","program a\nend program")
+        filepath2 = self._create_file("a.f90-fort2hip.hip.cpp","// empty")
+        self.assertIsNone(utils.filecache.lookup(CACHE_DIR,"ab12"))
+        utils.filecache.store(CACHE_DIR,"ab12",[filepath1,filepath2],1024)
+        os.remove(filepath1)
+        outputs = utils.filecache.lookup(CACHE_DIR,"ab12")
+        self.assertEqual(outputs,[(filepath1,b"program a\nend program"),(filepath2,b"// empty")])
+        os.utime(filepath2,(0,0))
+        utils.filecache.restore(outputs)
+        self.assertTrue(os.path.exists(filepath1))
+        self.assertEqual(os.path.getmtime(filepath2),0)
+    def test_2_evict_least_recently_used(self):
+        filepath = self._create_file("a.f90-gpufort.f08","x"*100)
+        for i,key in enumerate(["aa01","aa02","aa03"]):
+            utils.filecache.store(CACHE_DIR,key,[filepath],1024)
+            manifest_filepath = os.path.join(CACHE_DIR,"aa",key,utils.filecache.MANIFEST_FILE)
+            os.utime(manifest_filepath,(i,i))
+        utils.filecache.lookup(CACHE_DIR,"aa01") # mark as recently used
+        entry_dir  = os.path.join(CACHE_DIR,"aa","aa01")
+        entry_size = sum(os.path.getsize(os.path.join(entry_dir,child)) for child in os.listdir(entry_dir))
+        self.assertEqual(utils.filecache.evict(CACHE_DIR,2*entry_size),1)
+        self.assertIsNotNone(utils.filecache.lookup(CACHE_DIR,"aa01"))
+        self.assertIsNone(utils.filecache.lookup(CACHE_DIR,"aa02"))
+        self.assertIsNotNone(utils.filecache.lookup(CACHE_DIR,"aa03"))
+    def test_3_write_chunks_if_changed(self):
+        filepath = self._create_file("a.f90","program a\nend program")
+        os.chmod(filepath,0o640)
+        os.utime(filepath,(0,0))
+        self.assertFalse(utils.fileutils.write_chunks_if_changed(filepath,["program a\n",b"end ","program"]))
+        self.assertEqual(os.path.getmtime(filepath),0)
+        self.assertTrue(utils.fileutils.write_chunks_if_changed(filepath,(chunk for chunk in ["program b\n","end program"])))
+        with open(filepath,"r") as infile:
+            self.assertEqual(infile.read(),"program b\nend program")
+        self.assertEqual(os.stat(filepath).st_mode & 0o777,0o640)
+        self.assertEqual(sorted(os.listdir(TMP_DIR)),["a.f90","cache"]) # no temporary files left
+    def test_4_evict_tiers(self):
+        def create_tier_file_(tier_dir,name,last_use):
+            filepath = os.path.join(tier_dir,name[0:2],name)
+            os.makedirs(os.path.dirname(filepath),exist_ok=True)
+            with open(filepath,"w") as outfile:
+                outfile.write("x"*100)
+            os.utime(filepath,(last_use,last_use))
+            return filepath
+        stale_dir = utils.filecache.use_tier(CACHE_DIR,"includes","fp0")
+        create_tier_file_(stale_dir,"aa01.json",0)
+        os.utime(stale_dir,(1,1))
+        tier_dir = utils.filecache.use_tier(CACHE_DIR,"includes","fp1")
+        old_file = create_tier_file_(tier_dir,"aa02.json",2)
+        new_file = create_tier_file_(tier_dir,"bb01.json",time.time())
+        self.assertEqual(utils.filecache.evict(CACHE_DIR,1000,{"includes":"fp1"}),0)
+        self.assertEqual(utils.filecache.evict(CACHE_DIR,150,{"includes":"fp1"}),2) # stale fingerprint, then least recently used file
+        self.assertEqual(os.listdir(os.path.join(CACHE_DIR,"includes")),["fp1"])
+        self.assertFalse(os.path.exists(old_file))
+        self.assertTrue(os.path.exists(new_file))
+        # tier files count towards the size limit of translation entries
+        filepath = self._create_file("a.f90-gpufort.f08","x"*100)
+        os.utime(new_file,(3,3))
+        utils.filecache.store(CACHE_DIR,"aa01",[filepath],1000,{"includes":"fp1"})
+        entry_dir  = os.path.join(CACHE_DIR,"aa","aa01")
+        entry_size = sum(os.path.getsize(os.path.join(entry_dir,child)) for child in os.listdir(entry_dir))
+        self.assertEqual(utils.filecache.evict(CACHE_DIR,entry_size,{"includes":"fp1"}),1)
+        self.assertFalse(os.path.exists(new_file))
+        self.assertIsNotNone(utils.filecache.lookup(CACHE_DIR,"aa01"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,11 +12,10 @@ import re
 import indexer.scoper as scoper
 import utils.logging
 import utils.pyparsingutils 
+import grammar.factory
 
-#from grammar import *
-CASELESS    = True
-GRAMMAR_DIR = os.path.join(os.path.dirname(__file__),"../grammar")
-exec(open("{0}/grammar.py".format(GRAMMAR_DIR)).read())
+# own grammar variant as parse actions are attached to the grammar elements
+globals().update(grammar.factory.get_grammar("translator",caseless=True))
 
 TRANSLATOR_DIR = os.path.dirname(os.path.abspath(__file__))
 exec(open(os.path.join(TRANSLATOR_DIR, "translator_options.py.in")).read())
@@ -0,0 +1,181 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Content-addressed on-disk cache for the output files of a translation.
+
+Layout:
+
+<cache_dir>/<key[0:2]>/<key>/manifest.json  -- list of output file paths and their blob names
+<cache_dir>/<key[0:2]>/<key>/<blob>         -- content of an output file, named by its SHA-256 digest
+
+The modification time of the manifest is the last time the entry has been used;
+entries are evicted in least-recently-used order once the cache exceeds its size limit.
+
+Other caches can store their on-disk tier in the cache directory too, see use_tier:
+
+<cache_dir>/<tier>/<fingerprint>/...        -- files of a tier, one directory per config fingerprint
+
+Such files count towards the size limit. The files in the directory of the fingerprint
+in use are evicted one by one, the directories of the other fingerprints as a whole.
+Entries are created in a temporary directory that is renamed into place;
+concurrent writers of the same entry are thus harmless.
+"""
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+
+import utils.fileutils
+
+MANIFEST_FILE = "manifest.json"
+
+def _intrnl_entry_dir(cache_dir,key):
+    return os.path.join(cache_dir,key[0:2],key)
+
+def lookup(cache_dir,key):
+    """
+    :return: List of tuples (output file path, content as bytes) or None if there is no entry for the key.
+    """
+    entry_dir = _intrnl_entry_dir(cache_dir,key)
+    manifest_filepath = os.path.join(entry_dir,MANIFEST_FILE)
+    try:
+        with open(manifest_filepath,"r") as infile:
+            manifest = json.load(infile)
+        result = []
+        for output in manifest["outputs"]:
+            with open(os.path.join(entry_dir,output["blob"]),"rb") as infile:
+                result.append((output["file"],infile.read()))
+        os.utime(manifest_filepath) # mark as recently used
+        return result
+    except (OSError,ValueError,KeyError):
+        return None
+
+def restore(outputs):
+    """
+    Write the output files of a cache entry. Files whose content did not change are not touched.
+    :param list outputs: Result of lookup.
+    """
+    for filepath, data in outputs:
+        utils.fileutils.write_file_if_changed(filepath,data)
+
+def use_tier(cache_dir,tier,fingerprint):
+    """
+    Create the directory of a tier for the given fingerprint if it does not exist and mark it as used.
+    :return: Path of the directory.
+    """
+    tier_dir = os.path.join(cache_dir,tier,fingerprint)
+    os.makedirs(tier_dir,exist_ok=True)
+    os.utime(tier_dir)
+    return tier_dir
+
+def store(cache_dir,key,filepaths,max_size,tiers={}):
+    """
+    Store the current content of the given files under the key and evict
+    least-recently-used entries if the cache exceeds the size limit.
+
+    :param list filepaths: Absolute paths of the output files.
+    :param int max_size: Maximum size of the cache in bytes.
+    :param dict tiers: Tiers in use, see evict.
+    """
+    entry_dir = _intrnl_entry_dir(cache_dir,key)
+    if os.path.exists(entry_dir):
+        return
+    os.makedirs(os.path.dirname(entry_dir),exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-",dir=os.path.dirname(entry_dir))
+    manifest = { "outputs": [] }
+    for filepath in filepaths:
+        with open(filepath,"rb") as infile:
+            data = infile.read()
+        blob = hashlib.sha256(data).hexdigest()
+        with open(os.path.join(tmp_dir,blob),"wb") as outfile:
+            outfile.write(data)
+        manifest["outputs"].append({ "file": filepath, "blob": blob })
+    with open(os.path.join(tmp_dir,MANIFEST_FILE),"w") as outfile:
+        json.dump(manifest,outfile)
+    try:
+        os.rename(tmp_dir,entry_dir)
+    except OSError: # entry has been created concurrently
+        shutil.rmtree(tmp_dir,ignore_errors=True)
+    evict(cache_dir,max_size,tiers)
+
+def _intrnl_tree_size(directory):
+    """:return: Total size of the files in the directory and its subdirectories."""
+    size = 0
+    for root, dirs, files in os.walk(directory):
+        for filename in files:
+            try:
+                size += os.path.getsize(os.path.join(root,filename))
+            except OSError: # concurrently removed
+                pass
+    return size
+
+def _intrnl_collect_tier_entries(cache_dir,tier,fingerprint,entries):
+    """
+    Append an entry per file of the directory in use and per directory of another fingerprint to entries.
+    :return: Total size of the entries.
+    """
+    total_size = 0
+    tier_dir = os.path.join(cache_dir,tier)
+    if not os.path.isdir(tier_dir):
+        return total_size
+    for name in os.listdir(tier_dir):
+        fingerprint_dir = os.path.join(tier_dir,name)
+        if name != fingerprint:
+            try:
+                last_use = os.stat(fingerprint_dir).st_mtime
+            except OSError: # concurrently removed
+                continue
+            size = _intrnl_tree_size(fingerprint_dir)
+            entries.append((last_use,size,fingerprint_dir))
+            total_size += size
+            continue
+        for root, dirs, files in os.walk(fingerprint_dir):
+            for filename in files:
+                try:
+                    stat = os.stat(os.path.join(root,filename))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime,stat.st_size,os.path.join(root,filename)))
+                total_size += stat.st_size
+    return total_size
+
+def evict(cache_dir,max_size,tiers={}):
+    """
+    Remove least-recently-used entries until the cache size is at most max_size bytes.
+    :param dict tiers: Maps the name of each tier stored in the cache directory, e.g. 'includes',
+                       to the fingerprint in use. Directories of other fingerprints are stale; their
+                       last use is the modification time of the directory, see use_tier.
+    :return: Number of removed entries.
+    """
+    entries = [] # (last use, size, entry dir or file)
+    total_size = 0
+    for tier, fingerprint in tiers.items():
+        total_size += _intrnl_collect_tier_entries(cache_dir,tier,fingerprint,entries)
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir,prefix)
+        if prefix in tiers or not os.path.isdir(prefix_dir):
+            continue
+        for key in os.listdir(prefix_dir):
+            entry_dir = os.path.join(prefix_dir,key)
+            try:
+                last_use = os.stat(os.path.join(entry_dir,MANIFEST_FILE)).st_mtime
+                size = sum(os.path.getsize(os.path.join(entry_dir,child)) for child in os.listdir(entry_dir))
+            except OSError: # incomplete or concurrently removed entry
+                continue
+            entries.append((last_use,size,entry_dir))
+            total_size += size
+    num_removed = 0
+    for last_use, size, entry_path in sorted(entries):
+        if total_size <= max_size:
+            break
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path,ignore_errors=True)
+        else:
+            try:
+                os.remove(entry_path)
+            except OSError: # concurrently removed
+                pass
+        total_size  -= size
+        num_removed += 1
+    return num_removed
@@ -1,9 +1,16 @@
 # SPDX-License-Identifier: MIT                                                
 # Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
 #!/usr/bin/env python3
+import os
+import hashlib
 import subprocess
 import logging
 import sys
+import tempfile
+
+import utils.tracing
+
+__RECORDED_FILEPATHS = None # list of output file paths if recording is active
 
 #CLANG_FORMAT_STYLE="\"{BasedOnStyle: llvm, ColumnLimit: 140}\""
 
@@ -74,4 +81,115 @@ def read_c_file(filepath,unifdef_args=""):
            raise cpe
        else:
            output = cpe.output.decode("UTF-8")
-    return output
\ No newline at end of file
+    return output
+
+def begin_recording_output_files():
+    """
+    Record the paths of all files passed to write_file_if_changed from now on.
+    """
+    global __RECORDED_FILEPATHS
+    __RECORDED_FILEPATHS = []
+
+def end_recording_output_files():
+    """
+    Stop recording.
+    :return: The recorded file paths in the order of first appearance.
+    """
+    global __RECORDED_FILEPATHS
+    result = list(dict.fromkeys(__RECORDED_FILEPATHS or []))
+    __RECORDED_FILEPATHS = None
+    return result
+
+def write_file_if_changed(filepath,content):
+    """
+    Write the content to the file unless the file already has exactly this content.
+    Unchanged files keep their modification time so that
+    build systems do not rebuild targets that depend on them.
+
+    :param content: str or bytes.
+    :return: If the file has been (re)written.
+    """
+    global __RECORDED_FILEPATHS
+    if __RECORDED_FILEPATHS != None:
+        __RECORDED_FILEPATHS.append(os.path.abspath(filepath))
+    span = utils.tracing.begin_span("write_file","fileutils",{"file":filepath})
+    data = content.encode("utf-8") if isinstance(content,str) else content
+    if os.path.isfile(filepath) and os.path.getsize(filepath) == len(data):
+        with open(filepath,"rb") as infile:
+            if infile.read() == data:
+                utils.tracing.end_span(span,{"changed":False,"bytes":len(data)})
+                return False
+    with open(filepath,"wb") as outfile:
+        outfile.write(data)
+    utils.tracing.end_span(span,{"changed":True,"bytes":len(data)})
+    return True
+
+def _intrnl_file_digest(filepath):
+    hasher = hashlib.sha256()
+    with open(filepath,"rb") as infile:
+        for data in iter(lambda: infile.read(1024**2),b""):
+            hasher.update(data)
+    return hasher.digest()
+
+def write_chunks_if_changed(filepath,chunks):
+    """
+    Streaming variant of write_file_if_changed for content that is produced piece by piece.
+    The chunks are written to a temporary file next to the output file while their digest is computed.
+    The temporary file only replaces the output file if the digest (or size) differs from that of the output file;
+    otherwise, the output file is not touched.
+
+    :param chunks: Iterable of str or bytes; consumed once.
+    :return: If the file has been (re)written.
+    """
+    global __RECORDED_FILEPATHS
+    if __RECORDED_FILEPATHS != None:
+        __RECORDED_FILEPATHS.append(os.path.abspath(filepath))
+    span   = utils.tracing.begin_span("write_file","fileutils",{"file":filepath})
+    hasher = hashlib.sha256()
+    size   = 0
+    fd, tmp_filepath = tempfile.mkstemp(prefix=".tmp-",dir=os.path.dirname(os.path.abspath(filepath)))
+    try:
+        with os.fdopen(fd,"wb") as outfile:
+            for chunk in chunks:
+                data = chunk.encode("utf-8") if isinstance(chunk,str) else chunk
+                hasher.update(data)
+                outfile.write(data)
+                size += len(data)
+        if os.path.isfile(filepath) and os.path.getsize(filepath) == size\
+           and _intrnl_file_digest(filepath) == hasher.digest():
+            os.remove(tmp_filepath)
+            utils.tracing.end_span(span,{"changed":False,"bytes":size})
+            return False
+        if os.path.isfile(filepath):
+            mode = os.stat(filepath).st_mode & 0o777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask # as for files created via open
+        os.chmod(tmp_filepath,mode)
+        os.replace(tmp_filepath,filepath)
+    except BaseException:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+    utils.tracing.end_span(span,{"changed":True,"bytes":size})
+    return True
+
+def transform_content_via_file(content,suffix,transform_file):
+    """
+    Apply a file transformation that works in-place, e.g. prettify_f_file,
+    to a string via a temporary file.
+
+    :param str suffix: Suffix of the temporary file, e.g. '.f90', as some tools consider the file extension.
+    :param transform_file: Callable that takes the file path as only argument.
+    :return: The transformed content.
+    """
+    fd, tmp_filepath = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd,"w") as outfile:
+            outfile.write(content)
+        transform_file(tmp_filepath)
+        with open(tmp_filepath,"r") as infile:
+            return infile.read()
+    finally:
+        os.remove(tmp_filepath)
@@ -21,6 +21,30 @@ def tokenize(statement,padded_size=0):
     else:
         return result
 
+def trie_regex(words):
+    """Creates a regular expression that matches any of the words; the longest one
+    if several words match at the same position. The words are arranged as a trie,
+    i.e. alternatives are grouped by their common prefix, so that matching does not
+    try the words one after another.
+    :param words: Iterable of non-empty strings.
+    :return: The regular expression as string.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char,{})
+        node[""] = {} # end of word
+    def pattern_(node):
+        branches = [re.escape(char)+pattern_(child) for char, child in sorted(node.items()) if char != ""]
+        if not len(branches):
+            return ""
+        result = branches[0] if len(branches) == 1 else "(?:"+"|".join(branches)+")"
+        if "" in node:
+            return ("(?:"+result+")?") if len(branches) == 1 else result+"?" # greedy: prefers the longer word
+        return result
+    return pattern_(trie)
+
 def next_tokens_till_open_bracket_is_closed(tokens,open_brackets=0):
     # ex:
     # input:  [  "kind","=","2","*","(","5","+","1",")",")",",","pointer",",","allocatable" ], open_brackets=1
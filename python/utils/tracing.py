@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 Advanced Micro Devices, Inc. All rights reserved.
+"""
+Records timed spans and writes them as Chrome trace event JSON,
+which can be viewed with chrome://tracing or https://ui.perfetto.dev.
+
+Usage:
+
+  with utils.tracing.span("scanning","gpufort",{"file":filepath}):
+      ...
+
+  span = utils.tracing.begin_span("kernel","fort2hip",{"name":name})
+  ...
+  utils.tracing.end_span(span)
+
+:note: Recording is disabled by default; all functions are then no-ops.
+"""
+import os
+import json
+import time
+import threading
+import contextlib
+
+__ENABLED = False
+__EVENTS  = []
+
+def enable():
+    global __ENABLED
+    __ENABLED = True
+
+def is_enabled():
+    global __ENABLED
+    return __ENABLED
+
+def _intrnl_now():
+    """:return: Wall-clock time in microseconds; comparable across processes."""
+    return int(time.time()*1e6)
+
+def begin_span(name,category="gpufort",args={}):
+    """
+    :param str name: Name of the span.
+    :param str category: Category of the span, e.g. the component.
+    :param dict args: JSON-serializable arguments shown with the span, e.g. kernel name and line number.
+    :return: A handle that must be passed to end_span, or None if recording is disabled.
+    """
+    global __ENABLED
+    if not __ENABLED:
+        return None
+    return { "name": name, "cat": category, "ph": "X", "ts": _intrnl_now(),
+             "pid": os.getpid(), "tid": threading.get_ident(), "args": dict(args) }
+
+def end_span(span,args={}):
+    """
+    :param span: Handle returned by begin_span.
+    :param dict args: Further arguments, e.g. results that are only known at the end.
+    """
+    global __EVENTS
+    if span != None:
+        span["dur"] = _intrnl_now() - span["ts"]
+        span["args"].update(args)
+        __EVENTS.append(span)
+
+@contextlib.contextmanager
+def span(name,category="gpufort",args={}):
+    """Context manager variant of begin_span/end_span. The span is recorded even if an exception is raised."""
+    handle = begin_span(name,category,args)
+    try:
+        yield handle
+    finally:
+        end_span(handle)
+
+def pop_events():
+    """:return: The events recorded so far; they are removed from this process' record."""
+    global __EVENTS
+    result   = __EVENTS
+    __EVENTS = []
+    return result
+
+def add_events(events):
+    """Add events recorded by another process, e.g. a worker process."""
+    global __EVENTS
+    __EVENTS += events
+
+def write_trace(filepath,process_name="gpufort"):
+    """
+    Write all recorded events as Chrome trace event JSON file.
+    Every process that recorded events is labelled with its name and process id.
+    """
+    global __EVENTS
+    metadata = []
+    for pid in dict.fromkeys(event["pid"] for event in __EVENTS):
+        label = process_name if pid == os.getpid() else "{}-worker".format(process_name)
+        metadata.append({ "name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                          "args": { "name": "{} ({})".format(label,pid) } })
+    with open(filepath,"w") as outfile:
+        json.dump({ "traceEvents": metadata + sorted(__EVENTS,key=lambda event: event["ts"]),
+                    "displayTimeUnit": "ms" },outfile)